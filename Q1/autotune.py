@@ -0,0 +1,134 @@
+"""
+擴展式的 Gurobi 參數自動調校
+
+d.py、g.py 的擴展式不論規模都用預設參數求解；情境數很大時，barrier（不做 crossover）
+與 dual simplex 的速度可以差到一個數量級。這裡針對一個模型規模
+（作物數、價格級距數、情境數級距）：
+  - 產生數個抽樣實例，逐一以候選的 Method / Crossover / Presolve / Threads 組合求解
+  - 每個組合取各實例的中位數時間，目標值必須和預設參數一致才算有效
+  - 最快的組合與相對於預設參數的加速寫入 solver_cache（solver_cache.json），
+    之後以 tuned=True 呼叫 build_rp_model、multicrop.build_model 建立同規模的模型時套用
+
+用法:
+  python autotune.py --scenarios 30 100 300
+  python autotune.py --crops 10 --tiers 3 --scenarios 50
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from farmer import MU, SIGMA, build_rp_model
+import multicrop
+from solver_cache import shape_key, save_entry, load_cache
+
+DEFAULT = {}
+CANDIDATES = [
+    DEFAULT,
+    {'Method': 0},
+    {'Method': 1},
+    {'Method': 2},
+    {'Method': 2, 'Crossover': 0},
+    {'Method': 1, 'Presolve': 0},
+    {'Method': 2, 'Crossover': 0, 'Presolve': 0},
+    {'Method': 1, 'Threads': 1},
+    {'Method': 2, 'Crossover': 0, 'Threads': 1},
+]
+
+
+def farmer_instances(num_scenarios, num_instances, rng):
+    for _ in range(num_instances):
+        yield build_rp_model(rng.normal(MU, SIGMA, num_scenarios))['model']
+
+
+def multicrop_instances(instance, num_scenarios, num_instances, rng):
+    num_crops = len(instance['crops'])
+    for _ in range(num_instances):
+        yield multicrop.build_model(instance, rng.normal(MU, SIGMA, (num_scenarios, num_crops)))['model']
+
+
+def time_solve(model, params, repeats):
+    """以給定參數從頭求解 repeats 次（每次 reset 清除暖啟動），回傳中位數時間與目標值"""
+    model.resetParams()
+    model.setParam('OutputFlag', 0)
+    for name, value in params.items():
+        model.setParam(name, value)
+    times = []
+    for _ in range(repeats):
+        model.reset()
+        start = time.perf_counter()
+        model.optimize()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), model.objVal
+
+
+def tune(models, candidates=CANDIDATES, repeats=3, rel_tol=1e-6):
+    """
+    對每個候選組合量測各實例的求解時間。回傳依總時間排序的結果清單，
+    每項含 params、seconds（各實例中位數時間的總和）、valid（目標值是否與預設一致）。
+    """
+    models = list(models)
+    reference = [time_solve(m, DEFAULT, 1)[1] for m in models]
+    results = []
+    for params in candidates:
+        total = 0.0
+        valid = True
+        for model, ref in zip(models, reference):
+            seconds, objective = time_solve(model, params, repeats)
+            total += seconds
+            valid &= abs(objective - ref) <= rel_tol * max(1.0, abs(ref))
+        results.append({'params': params, 'seconds': total, 'valid': valid})
+    for model in models:
+        model.dispose()
+    return sorted(results, key=lambda r: (not r['valid'], r['seconds']))
+
+
+def autotune(crops, tiers, num_scenarios, models, repeats=3, path=None, family='farmer'):
+    """調校一個規模並寫入快取，回傳快取項目"""
+    results = tune(models, repeats=repeats)
+    default_seconds = next(r['seconds'] for r in results if r['params'] == DEFAULT)
+    best = results[0]
+    entry = {
+        'params': best['params'],
+        'default_seconds': default_seconds,
+        'best_seconds': best['seconds'],
+        'speedup': default_seconds / best['seconds'],
+        'num_scenarios': num_scenarios,
+        'candidates': [{'params': r['params'], 'seconds': r['seconds'], 'valid': r['valid']} for r in results]
+    }
+    return save_entry(shape_key(crops, tiers, num_scenarios, family), entry, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="依模型規模調校 Gurobi 參數並寫入快取")
+    parser.add_argument('--scenarios', type=int, nargs='+', default=[30, 100, 300])
+    parser.add_argument('--crops', type=int, default=None, help="調校 multicrop 合成實例（省略時為三作物農夫問題）")
+    parser.add_argument('--tiers', type=int, default=2)
+    parser.add_argument('--instances', type=int, default=3, help="每個規模的抽樣實例數")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=34)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print("="*70)
+    print("Gurobi 參數自動調校")
+    print("="*70)
+    for S in args.scenarios:
+        if args.crops is None:
+            crops, tiers, family = 3, 2, 'farmer'
+            models = farmer_instances(S, args.instances, rng)
+        else:
+            crops, tiers, family = args.crops, args.tiers, 'multicrop'
+            instance = multicrop.parse_instance(multicrop.synthetic_instance(crops, tiers, seed=args.seed))
+            models = multicrop_instances(instance, S, args.instances, rng)
+        entry = autotune(crops, tiers, S, models, args.repeats, family=family)
+        key = shape_key(crops, tiers, S, family)
+        print(f"\n{key}（{S} 個情境 × {args.instances} 個實例）")
+        for c in entry['candidates']:
+            label = ', '.join(f"{k}={v}" for k, v in c['params'].items()) or '預設'
+            mark = '' if c['valid'] else '（目標值不一致，略過）'
+            print(f"  {label:<40} {c['seconds'] * 1000:9.2f} ms{mark}")
+        print(f"  → 採用 {entry['params'] or '預設'}，相對預設加速 {entry['speedup']:.2f}x")
+
+    print(f"\n快取中的規模: {', '.join(load_cache())}")
@@ -0,0 +1,151 @@
+"""
+連續產量 N(MU, SIGMA) 下最佳期望利潤的快速上下界
+
+固定種植面積時，第二階段淨收益對產量倍數 ξ 是凹的分段線性函數
+（不足時以購買價補、剩餘以較低的銷售價賣；甜菜超過配額後價格下降）。因此：
+  - Jensen：E[Q(x, ξ)] ≤ Q(x, E[ξ])，以條件平均值當情境 → 最佳期望利潤的上界
+    （只有一格時就是(a)小題的 EV 模型）
+  - Edmundson–Madansky：在 [a, b] 上 E[Q(x, ξ)] ≥ 端點的線性內插，
+    以端點為情境、保持條件平均值的兩點分佈 → 下界
+
+常態分佈的支撐集是無界的，這裡截斷在 MU ± TRUNCATION·SIGMA 並重新正規化；
+每次細分把缺口最大的一格在條件平均值處切開，只需再求解兩個小型擴展式。
+"""
+import time
+
+import numpy as np
+from scipy import stats
+
+from farmer import MU, SIGMA, build_rp_model, recourse_profit
+
+TRUNCATION = 4.0  # 截斷在平均值 ± 4 個標準差
+
+
+def cell_moments(edges, mu=MU, sigma=SIGMA, dist=None):
+    """
+    各格的機率質量（以截斷後的分佈正規化）與條件平均值。
+    dist 可為 distributions 登錄表中的任何分佈，以 cdf 與 partial_expectation 計算。
+    """
+    edges = np.asarray(edges, dtype=float)
+    if dist is not None:
+        mass = np.diff(dist.cdf(edges))
+        cond_mean = np.diff(dist.partial_expectation(edges)) / mass
+        return mass / mass.sum(), cond_mean
+    z = (edges - mu) / sigma
+    cdf = stats.norm.cdf(z)
+    pdf = stats.norm.pdf(z)
+    mass = np.diff(cdf)
+    cond_mean = mu + sigma * (pdf[:-1] - pdf[1:]) / mass
+    return mass / mass.sum(), cond_mean
+
+
+def jensen_scenarios(edges, dist=None):
+    probs, cond_mean = cell_moments(edges, dist=dist)
+    return cond_mean, probs
+
+
+def edmundson_madansky_scenarios(edges, dist=None):
+    """每格兩個端點，相鄰格共用的端點合併成同一個情境"""
+    edges = np.asarray(edges, dtype=float)
+    probs, cond_mean = cell_moments(edges, dist=dist)
+    a, b = edges[:-1], edges[1:]
+    point_probs = np.zeros(len(edges))
+    point_probs[:-1] += probs * (b - cond_mean) / (b - a)
+    point_probs[1:] += probs * (cond_mean - a) / (b - a)
+    return edges, point_probs
+
+
+def solve_scenarios(multipliers, probabilities, name):
+    rp = build_rp_model(multipliers, probabilities, name=name)
+    rp['model'].optimize()
+    return rp['model'].objVal, np.array([rp['x'][i].X for i in range(3)])
+
+
+def cell_gaps(edges, acres, dist=None):
+    """在給定種植面積下，每格 Jensen 與 EM 的期望淨收益差（用於挑選要細分的格）"""
+    edges = np.asarray(edges, dtype=float)
+    probs, cond_mean = cell_moments(edges, dist=dist)
+    a, b = edges[:-1], edges[1:]
+    q_mean = recourse_profit(acres, cond_mean)
+    q_a = recourse_profit(acres, a)
+    q_b = recourse_profit(acres, b)
+    q_em = (q_a * (b - cond_mean) + q_b * (cond_mean - a)) / (b - a)
+    return probs * (q_mean - q_em)
+
+
+def initial_edges(truncation=TRUNCATION, dist=None):
+    """支撐集的端點；無界的一側截斷在與常態 ±truncation·σ 相同的尾端機率處"""
+    if dist is None:
+        return np.array([MU - truncation * SIGMA, MU + truncation * SIGMA])
+    tail = stats.norm.sf(truncation)
+    low, high = dist.support
+    return np.array([low if np.isfinite(low) else float(dist.ppf(tail)),
+                     high if np.isfinite(high) else float(dist.ppf(1 - tail))])
+
+
+def bracket(max_partitions=20, tol=None, truncation=TRUNCATION, verbose=False, dist=None):
+    """
+    逐步細分支撐集並回傳每一步的 [下界, 上界]。
+    tol 為相對寬度門檻，寬度 ≤ tol·|上界| 時提前停止。
+    dist 省略時為 N(MU, SIGMA)，否則為 distributions 登錄表中的分佈。
+    """
+    edges = initial_edges(truncation, dist)
+    history = []
+    start = time.perf_counter()
+
+    for k in range(max_partitions + 1):
+        upper, upper_acres = solve_scenarios(*jensen_scenarios(edges, dist), name=f"Jensen_{k}")
+        lower, lower_acres = solve_scenarios(*edmundson_madansky_scenarios(edges, dist), name=f"EM_{k}")
+        width = upper - lower
+        history.append({
+            'partitions': k,
+            'cells': len(edges) - 1,
+            'lower': lower,
+            'upper': upper,
+            'width': width,
+            'relative_width': width / abs(upper),
+            'lower_acres': lower_acres,
+            'upper_acres': upper_acres,
+            'time': time.perf_counter() - start
+        })
+        if verbose:
+            print(f"  k={k:>3}  格數={len(edges)-1:>3}  下界=${lower:>12,.2f}  "
+                  f"上界=${upper:>12,.2f}  寬度=${width:>10,.2f}")
+
+        if tol is not None and width <= tol * abs(upper):
+            break
+        if k == max_partitions:
+            break
+
+        gaps = cell_gaps(edges, upper_acres, dist)
+        c = int(np.argmax(gaps))
+        _, cond_mean = cell_moments(edges[c:c + 2], dist=dist)
+        edges = np.insert(edges, c + 1, cond_mean[0])
+
+    return history
+
+
+def is_tight(history, tol):
+    """批次作業可據此判斷是否可以略過 SAA 抽樣"""
+    return history[-1]['relative_width'] <= tol
+
+
+if __name__ == "__main__":
+    print("="*70)
+    print(f"Jensen / Edmundson–Madansky 上下界（截斷於 MU ± {TRUNCATION}σ）")
+    print("="*70)
+    print()
+
+    history = bracket(max_partitions=15, verbose=True)
+
+    final = history[-1]
+    print(f"\n細分 {final['partitions']} 次後:")
+    print(f"  最佳期望利潤 ∈ [${final['lower']:,.2f}, ${final['upper']:,.2f}]")
+    print(f"  區間寬度: ${final['width']:,.2f}（相對 {final['relative_width']:.4%}）")
+    print(f"  下界解種植: 小麥={final['lower_acres'][0]:.2f}, "
+          f"玉米={final['lower_acres'][1]:.2f}, 甜菜={final['lower_acres'][2]:.2f}")
+    print(f"  總時間: {final['time']:.3f} 秒")
+    print(f"\n相對寬度 < 0.1%: {'是，可略過 SAA' if is_tight(history, 1e-3) else '否'}")
+
+    tail_mass = 2 * stats.norm.sf(TRUNCATION)
+    print(f"\n註：截斷掉的機率質量 {tail_mass:.2e}，上下界是針對截斷後的分佈")
@@ -0,0 +1,165 @@
+"""
+需求滿足機率限制（chance constraint）的兩階段隨機規劃
+
+要求小麥與玉米的需求「只靠自產」在至少 1-ε 的情境下被滿足：
+  P( Y_小麥·ξ_小麥·x1 ≥ 200  且  Y_玉米·ξ_玉米·x2 ≥ 240 ) ≥ 1-ε
+
+若三種作物共用同一個產量倍數 ξ（純量不確定性），且 x ≥ 0，
+兩個事件都等價於 ξ ≥ 某門檻，因此機率限制可精確改寫成在 ξ 的 ε 分位數 q_ε 下的確定性限制：
+  Y_小麥·q_ε·x1 ≥ 200,   Y_玉米·q_ε·x2 ≥ 240
+不需要任何二元變數。各作物倍數不同（多維）時則退回 big-M 混合整數模型。
+"""
+import time
+
+import gurobipy as gp
+from gurobipy import GRB
+import numpy as np
+from scipy import stats
+
+from farmer import AVG_YIELD, DEMAND, MU, SIGMA, scenarios, build_rp_model, crop_multipliers
+
+
+def is_scalar_uncertainty(multipliers):
+    """產量倍數為一維，或 (S, 3) 但各作物欄位完全相同時，視為純量不確定性"""
+    multipliers = np.asarray(multipliers, dtype=float)
+    if multipliers.ndim == 1:
+        return True
+    return bool(np.all(multipliers == multipliers[:, :1]))
+
+
+def lower_quantile(values, probabilities, eps):
+    """
+    使 P(ξ < t) ≤ ε 成立的最大 t（離散分佈），即 ξ ≥ t 的機率至少 1-ε。
+    t 越大，改寫後的限制越寬鬆。
+    """
+    order = np.argsort(values)
+    v_sorted = np.asarray(values)[order]
+    cum = np.cumsum(np.asarray(probabilities)[order])
+    k = int(np.searchsorted(cum, eps + 1e-12, side='right'))
+    return float(v_sorted[min(k, len(v_sorted) - 1)])
+
+
+def add_quantile_constraints(rp, q_eps):
+    model = rp['model']
+    x = rp['x']
+    model.addConstr(AVG_YIELD[0] * q_eps * x[0] >= DEMAND[0], "wheat_chance")
+    model.addConstr(AVG_YIELD[1] * q_eps * x[1] >= DEMAND[1], "corn_chance")
+
+
+def add_big_m_constraints(rp, eps):
+    """
+    z_s = 1 表示允許情境 s 的需求無法由自產滿足。
+    Big-M 取需求量即可，因為自產量 ≥ 0。
+    """
+    model = rp['model']
+    x = rp['x']
+    mults = crop_multipliers(rp['multipliers'])
+    probs = rp['probabilities']
+    num_scenarios = len(probs)
+
+    z = model.addVars(num_scenarios, vtype=GRB.BINARY, name="violate")
+    for s in range(num_scenarios):
+        model.addConstr(AVG_YIELD[0] * mults[s, 0] * x[0] >= DEMAND[0] * (1 - z[s]), f"wheat_chance_s{s}")
+        model.addConstr(AVG_YIELD[1] * mults[s, 1] * x[1] >= DEMAND[1] * (1 - z[s]), f"corn_chance_s{s}")
+    model.addConstr(gp.quicksum(probs[s] * z[s] for s in range(num_scenarios)) <= eps, "chance_budget")
+    rp['z'] = z
+
+
+def solve_chance_constrained(multipliers, eps, probabilities=None, method="auto", name="Chance_RP"):
+    """
+    method: "auto" 偵測結構（純量 → 分位數改寫，多維 → MIP），
+            "quantile" 或 "mip" 可強制指定（mip 用於驗證）。
+    """
+    rp = build_rp_model(multipliers, probabilities, name=name)
+    if method == "auto":
+        method = "quantile" if is_scalar_uncertainty(rp['multipliers']) else "mip"
+
+    if method == "quantile":
+        values = rp['multipliers'] if rp['multipliers'].ndim == 1 else rp['multipliers'][:, 0]
+        q_eps = lower_quantile(values, rp['probabilities'], eps)
+        add_quantile_constraints(rp, q_eps)
+    else:
+        q_eps = None
+        add_big_m_constraints(rp, eps)
+
+    model = rp['model']
+    start = time.perf_counter()
+    model.optimize()
+    elapsed = time.perf_counter() - start
+
+    result = {'method': method, 'eps': eps, 'status': model.status, 'quantile': q_eps, 'time': elapsed}
+    if model.status == GRB.OPTIMAL:
+        result['acres'] = [rp['x'][i].X for i in range(3)]
+        result['objective'] = model.objVal
+    return result
+
+
+def solve_chance_constrained_normal(eps, samples, probabilities=None):
+    """
+    連續 N(MU, SIGMA) 產量模型：分位數直接取 ppf(ε)，第二階段期望仍以樣本 samples 近似。
+    q_ε ≤ 0（例如 ε = 0）時需求無法以自產滿足，直接拒絕。
+    """
+    q_eps = stats.norm.ppf(eps, MU, SIGMA)
+    if not q_eps > 0:
+        raise ValueError(f"ε = {eps} 的分位數 q_ε = {q_eps} ≤ 0，需求無法以自產滿足")
+    rp = build_rp_model(samples, probabilities, name="Chance_SAA")
+    add_quantile_constraints(rp, q_eps)
+    rp['model'].optimize()
+    if rp['model'].status != GRB.OPTIMAL:
+        raise RuntimeError(f"ε = {eps} 的機率限制模型求解失敗，狀態碼: {rp['model'].status}")
+    return {
+        'method': "quantile",
+        'eps': eps,
+        'quantile': q_eps,
+        'status': rp['model'].status,
+        'acres': [rp['x'][i].X for i in range(3)],
+        'objective': rp['model'].objVal
+    }
+
+
+if __name__ == "__main__":
+    print("="*70)
+    print("機率限制 RP（三情境）")
+    print("="*70)
+
+    rp_mults = [sc['multiplier'] for sc in scenarios]
+    rp_probs = [sc['probability'] for sc in scenarios]
+
+    for eps in [0.0, 0.34, 0.67]:
+        r = solve_chance_constrained(rp_mults, eps, rp_probs)
+        print(f"\nε = {eps:.2f}（方法: {r['method']}，分位數 q_ε = {r['quantile']}）")
+        print(f"  種植決策: 小麥={r['acres'][0]:.2f}, 玉米={r['acres'][1]:.2f}, 甜菜={r['acres'][2]:.2f}")
+        print(f"  期望利潤: ${r['objective']:,.2f}")
+
+    print("\n" + "="*70)
+    print("SAA：分位數改寫 vs big-M MIP")
+    print("="*70)
+
+    N = 250
+    eps = 0.05
+    rng = np.random.default_rng(34)
+    samples = rng.normal(MU, SIGMA, N)
+
+    r_q = solve_chance_constrained(samples, eps, method="quantile")
+    r_m = solve_chance_constrained(samples, eps, method="mip")
+    print(f"\nN={N}, ε={eps}")
+    print(f"  分位數改寫: ${r_q['objective']:,.2f}，{r_q['time']:.3f} 秒")
+    print(f"  Big-M MIP:  ${r_m['objective']:,.2f}，{r_m['time']:.3f} 秒")
+    print(f"  差異: {abs(r_q['objective'] - r_m['objective']):.6f}")
+
+    r_n = solve_chance_constrained_normal(eps, samples)
+    print(f"\n連續 N({MU}, {SIGMA}) 分位數 q_ε = {r_n['quantile']:.4f}")
+    print(f"  種植決策: 小麥={r_n['acres'][0]:.2f}, 玉米={r_n['acres'][1]:.2f}, 甜菜={r_n['acres'][2]:.2f}")
+    print(f"  期望利潤（SAA）: ${r_n['objective']:,.2f}")
+
+    print("\n" + "="*70)
+    print("多維產量（各作物獨立倍數）：自動改用 MIP")
+    print("="*70)
+
+    N_multi = 100
+    multi = rng.normal(MU, SIGMA, (N_multi, 3))
+    r_multi = solve_chance_constrained(multi, eps)
+    print(f"\n方法: {r_multi['method']}，{r_multi['time']:.3f} 秒")
+    print(f"  種植決策: 小麥={r_multi['acres'][0]:.2f}, 玉米={r_multi['acres'][1]:.2f}, "
+          f"甜菜={r_multi['acres'][2]:.2f}")
+    print(f"  期望利潤: ${r_multi['objective']:,.2f}")
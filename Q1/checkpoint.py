@@ -0,0 +1,190 @@
+"""
+長時間 SAA / 驗證作業的檢查點與續跑
+
+(g)小題的結果只存在 saa_solutions / validation_objectives 兩個 list 裡，
+執行到一半中斷就全部重來。這裡把每個完成的訓練批次與驗證批次
+（連同其亂數串流狀態）附加寫入一個只增不改的 JSON Lines 記錄檔，每筆寫完就 fsync。
+
+亂數串流：SeedSequence(seed).spawn(M + T)，第 m 個訓練批次固定用第 m 個子串流，
+第 t 個驗證批次用第 M+t 個子串流，因此跳過已完成的批次不會改變其他批次的樣本。
+續跑（--resume）時讀回記錄檔、驗證參數與亂數狀態一致後只補做缺少的批次；
+數值以 JSON 的 repr 往返儲存，最終統計與不中斷執行完全相同。
+
+用法:
+  python checkpoint.py --log campaign.jsonl --M 200 --T 200
+  python checkpoint.py --log campaign.jsonl --M 200 --T 200 --resume
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+from scipy import stats
+
+from farmer import MU, SIGMA, build_rp_model, total_profit
+
+
+def batch_rng(seed, index, num_streams):
+    child = np.random.SeedSequence(seed).spawn(num_streams)[index]
+    return np.random.Generator(np.random.PCG64(child))
+
+
+class CampaignLog:
+    """只增不改的記錄檔；最後一行若因中斷而不完整會被捨棄"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        records = []
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, 'rb') as f:
+            lines = f.read().split(b'\n')
+        valid_bytes = 0
+        for line in lines:
+            if not line.strip():
+                valid_bytes += len(line) + 1
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+            valid_bytes += len(line) + 1
+        # 截掉不完整的尾巴，避免之後附加的資料接在半行後面
+        size = os.path.getsize(self.path)
+        if valid_bytes < size:
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_bytes)
+        return records
+
+    def append(self, record):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def solve_replication(samples, m):
+    rp = build_rp_model(samples, name=f"SAA_batch_{m+1}")
+    rp['model'].optimize()
+    return {
+        'acres': [rp['x'][i].X for i in range(3)],
+        'objective': rp['model'].objVal,
+        'samples_mean': float(np.mean(samples)),
+        'samples_std': float(np.std(samples))
+    }
+
+
+def run_campaign(log_path, M=15, N=30, T=15, N_bar=30, seed=34, resume=False, max_new_batches=None,
+                 verbose=True):
+    """
+    執行（或續跑）一次 SAA 訓練 + 驗證作業。max_new_batches 可限制本次最多完成的批次數，
+    用來模擬中途中斷。回傳統計結果；作業尚未完成時回傳 None。
+    """
+    log = CampaignLog(log_path)
+    params = {'M': M, 'N': N, 'T': T, 'N_bar': N_bar, 'seed': seed, 'MU': MU, 'SIGMA': SIGMA}
+    num_streams = M + T
+
+    records = log.load() if resume else []
+    if not resume and os.path.exists(log_path):
+        os.remove(log_path)
+    if records:
+        if records[0].get('type') != 'campaign' or records[0]['params'] != params:
+            raise ValueError(f"記錄檔 {log_path} 的參數與本次不同，無法續跑")
+    else:
+        log.append({'type': 'campaign', 'params': params})
+
+    replications = {r['index']: r for r in records if r.get('type') == 'replication'}
+    validations = {r['index']: r for r in records if r.get('type') == 'validation'}
+    if verbose and (replications or validations):
+        print(f"續跑：已完成訓練 {len(replications)}/{M}，驗證 {len(validations)}/{T}")
+
+    new_batches = 0
+
+    def budget_left():
+        return max_new_batches is None or new_batches < max_new_batches
+
+    for m in range(M):
+        rng = batch_rng(seed, m, num_streams)
+        if m in replications:
+            if replications[m]['rng_state'] != rng.bit_generator.state:
+                raise ValueError(f"訓練批次 {m+1} 的亂數狀態與記錄不符")
+            continue
+        if not budget_left():
+            return None
+        state = rng.bit_generator.state
+        result = solve_replication(rng.normal(MU, SIGMA, N), m)
+        record = {'type': 'replication', 'index': m, 'rng_state': state, **result}
+        log.append(record)
+        replications[m] = record
+        new_batches += 1
+        if verbose:
+            print(f"  訓練批次 {m+1}/{M}: 目標值 ${result['objective']:,.2f}")
+
+    saa_objectives = [replications[m]['objective'] for m in range(M)]
+    best_index = int(np.argmax(saa_objectives))
+    best_acres = replications[best_index]['acres']
+
+    for t in range(T):
+        rng = batch_rng(seed, M + t, num_streams)
+        if t in validations:
+            if validations[t]['rng_state'] != rng.bit_generator.state or validations[t]['acres'] != best_acres:
+                raise ValueError(f"驗證批次 {t+1} 的亂數狀態或評估解與記錄不符")
+            continue
+        if not budget_left():
+            return None
+        state = rng.bit_generator.state
+        batch_avg = float(np.mean(total_profit(best_acres, rng.normal(MU, SIGMA, N_bar))))
+        record = {'type': 'validation', 'index': t, 'rng_state': state, 'acres': best_acres,
+                  'batch_avg': batch_avg}
+        log.append(record)
+        validations[t] = record
+        new_batches += 1
+        if verbose:
+            print(f"  驗證批次 {t+1}/{T}: 平均利潤 ${batch_avg:,.2f}")
+
+    validation_objectives = [validations[t]['batch_avg'] for t in range(T)]
+    return summarize(saa_objectives, validation_objectives, best_index, best_acres)
+
+
+def summarize(saa_objectives, validation_objectives, best_index, best_acres, confidence_level=0.95):
+    alpha = 1 - confidence_level
+    summary = {'best_batch': best_index + 1, 'best_acres': best_acres}
+    for key, values in (('train', saa_objectives), ('validation', validation_objectives)):
+        values = np.asarray(values)
+        mean = float(np.mean(values))
+        se = float(np.std(values, ddof=1) / np.sqrt(len(values)))
+        t_value = stats.t.ppf(1 - alpha / 2, len(values) - 1)
+        summary[key] = {'mean': mean, 'se': se, 'ci': (mean - t_value * se, mean + t_value * se)}
+    return summary
+
+
+def print_summary(summary):
+    acres = summary['best_acres']
+    print(f"\n最佳解（批次 {summary['best_batch']}）: 小麥={acres[0]:.2f}, 玉米={acres[1]:.2f}, 甜菜={acres[2]:.2f}")
+    for key, label in (('train', '訓練目標值'), ('validation', '驗證期望利潤')):
+        s = summary[key]
+        print(f"{label}: ${s['mean']:,.2f}（標準誤 ${s['se']:,.2f}，"
+              f"95% CI [${s['ci'][0]:,.2f}, ${s['ci'][1]:,.2f}]）")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="可續跑的 SAA 訓練 + 驗證作業")
+    parser.add_argument('--log', default='saa_campaign.jsonl', help="檢查點記錄檔")
+    parser.add_argument('--resume', action='store_true', help="略過記錄檔中已完成的批次")
+    parser.add_argument('--M', type=int, default=15, help="訓練批次數")
+    parser.add_argument('--N', type=int, default=30, help="每批訓練樣本數")
+    parser.add_argument('--T', type=int, default=15, help="驗證批次數")
+    parser.add_argument('--N-bar', type=int, default=30, help="每批驗證樣本數")
+    parser.add_argument('--seed', type=int, default=34)
+    parser.add_argument('--max-new-batches', type=int, default=None,
+                        help="本次最多完成的批次數（模擬中斷）")
+    args = parser.parse_args()
+
+    summary = run_campaign(args.log, args.M, args.N, args.T, args.N_bar, args.seed,
+                           resume=args.resume, max_new_batches=args.max_new_batches)
+    if summary is None:
+        print(f"\n作業暫停，使用 --resume 從 {args.log} 繼續")
+    else:
+        print_summary(summary)
@@ -0,0 +1,160 @@
+"""
+相關的多作物產量情境（多變量常態、Gaussian copula）
+
+g.py 與 d.py 讓三種作物共用同一個產量倍數；實際上小麥、玉米、甜菜的產量相關但不相同。
+這裡的產量模型一次向量化產生 (S, 3) 的各作物倍數矩陣：
+  - MultivariateNormalYield：平均值向量 + 共變異數矩陣，事先做一次 Cholesky 分解，
+    抽樣只需一次標準常態抽樣與矩陣乘法
+  - GaussianCopulaYield：相關結構由常態 copula 決定，各作物的邊際分佈可任意指定
+    （scipy.stats 的凍結分佈，例如截斷常態、對數常態），以 Φ 與邊際的 ppf 轉換
+build_rp_model、total_profit 已接受 (S, 3) 的倍數，SAA 訓練、驗證與 RP 模型可直接使用。
+"""
+import time
+
+import numpy as np
+from scipy import stats
+from scipy.special import ndtr
+
+from farmer import MU, SIGMA, build_rp_model, total_profit
+
+CROPS = ['小麥', '玉米', '甜菜']
+CHUNK_SIZE = 1_000_000
+
+
+def correlation_matrix(rho, size=3):
+    """所有作物兩兩相關係數相同（rho）的相關矩陣"""
+    corr = np.full((size, size), float(rho))
+    np.fill_diagonal(corr, 1.0)
+    return corr
+
+
+def covariance_from(std, corr):
+    std = np.asarray(std, dtype=float)
+    return corr * np.outer(std, std)
+
+
+def _cholesky(matrix):
+    """半正定矩陣（例如完全相關）的 Cholesky 分解：必要時在對角線加上極小的擾動"""
+    matrix = np.asarray(matrix, dtype=float)
+    jitter = 0.0
+    for _ in range(6):
+        try:
+            return np.linalg.cholesky(matrix + jitter * np.eye(len(matrix)))
+        except np.linalg.LinAlgError:
+            jitter = max(jitter * 10, 1e-12)
+    raise ValueError("矩陣不是半正定")
+
+
+class MultivariateNormalYield:
+    def __init__(self, mean, cov):
+        self.mean = np.asarray(mean, dtype=float)
+        self.cov = np.asarray(cov, dtype=float)
+        self._chol = _cholesky(self.cov)
+
+    def sample(self, n, rng=None):
+        rng = np.random.default_rng(rng)
+        z = rng.standard_normal((n, len(self.mean)))
+        return z @ self._chol.T + self.mean
+
+
+class GaussianCopulaYield:
+    def __init__(self, corr, marginals):
+        self.corr = np.asarray(corr, dtype=float)
+        self.marginals = list(marginals)
+        self._chol = _cholesky(self.corr)
+
+    def sample(self, n, rng=None):
+        rng = np.random.default_rng(rng)
+        z = rng.standard_normal((n, len(self.marginals)))
+        u = ndtr(z @ self._chol.T)
+        out = np.empty_like(u)
+        for i, marginal in enumerate(self.marginals):
+            out[:, i] = marginal.ppf(u[:, i])
+        return out
+
+
+def equicorrelated_normal(rho, mean=MU, std=SIGMA):
+    """三種作物倍數皆為 N(mean, std)、兩兩相關係數皆為 rho；rho = 0 為各自獨立，rho = 1 即原本的共同倍數"""
+    return MultivariateNormalYield(np.full(3, mean), covariance_from(np.full(3, std), correlation_matrix(rho)))
+
+
+def default_copula(rho=0.5):
+    """非負且右偏的邊際分佈：小麥、玉米為截斷在 0 的常態，甜菜為對數常態（平均 1、標準差約 0.15）"""
+    a = (0 - MU) / SIGMA
+    sigma_log = np.sqrt(np.log(1 + 0.15 ** 2))
+    marginals = [
+        stats.truncnorm(a, np.inf, loc=MU, scale=SIGMA),
+        stats.truncnorm(a, np.inf, loc=MU, scale=SIGMA),
+        stats.lognorm(sigma_log, scale=np.exp(-sigma_log ** 2 / 2))
+    ]
+    return GaussianCopulaYield(correlation_matrix(rho), marginals)
+
+
+def saa(yield_model, M, N, N_bar, T, rng=None):
+    """
+    以 (S, 3) 的各作物倍數做 SAA 訓練與驗證（同 g.py 的流程）。
+    每批一次向量化抽樣；驗證以封閉解計算。
+    """
+    rng = np.random.default_rng(rng)
+    solutions = []
+    for m in range(M):
+        rp = build_rp_model(yield_model.sample(N, rng), name=f"SAA_batch_{m+1}")
+        rp['model'].optimize()
+        solutions.append({'acres': [rp['x'][i].X for i in range(3)], 'objective': rp['model'].objVal})
+    best = max(solutions, key=lambda s: s['objective'])
+    validation = np.array([total_profit(best['acres'], yield_model.sample(N_bar, rng)).mean() for _ in range(T)])
+    return {
+        'acres': best['acres'],
+        'train_mean': float(np.mean([s['objective'] for s in solutions])),
+        'validation_mean': float(validation.mean()),
+        'validation_se': float(validation.std(ddof=1) / np.sqrt(T))
+    }
+
+
+def throughput(yield_model, n, chunk_size=CHUNK_SIZE, seed=None):
+    """分段抽 n 個情境（每段直接計算平均，不保留），回傳每秒情境數"""
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    total = np.zeros(3)
+    for s in range(0, n, chunk_size):
+        total += yield_model.sample(min(chunk_size, n - s), rng).sum(axis=0)
+    elapsed = time.perf_counter() - start
+    return {'seconds': elapsed, 'per_second': n / elapsed, 'mean': total / n}
+
+
+def loop_throughput(yield_model, n, seed=None):
+    """對照組：逐情境呼叫 rng.multivariate_normal"""
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    for _ in range(n):
+        rng.multivariate_normal(yield_model.mean, yield_model.cov)
+    elapsed = time.perf_counter() - start
+    return {'seconds': elapsed, 'per_second': n / elapsed}
+
+
+if __name__ == "__main__":
+    print("="*70)
+    print("SAA：不同作物間相關係數下的最佳種植面積")
+    print("="*70)
+    print(f"\n{'模型':<22} {'小麥':>8} {'玉米':>8} {'甜菜':>8} {'驗證期望利潤':>16}")
+    cases = [(f"常態 ρ={rho}", equicorrelated_normal(rho)) for rho in (0.0, 0.5, 1.0)]
+    cases.append(("copula ρ=0.5（非常態邊際）", default_copula(0.5)))
+    for label, model in cases:
+        r = saa(model, M=15, N=30, N_bar=10_000, T=15, rng=34)
+        print(f"{label:<22} {r['acres'][0]:>8.2f} {r['acres'][1]:>8.2f} {r['acres'][2]:>8.2f} "
+              f"${r['validation_mean']:>12,.2f} ± {r['validation_se']:,.2f}")
+
+    sample = equicorrelated_normal(0.5).sample(1_000_000, 35)
+    print(f"\n樣本相關矩陣（ρ=0.5，10^6 個情境）:\n{np.round(np.corrcoef(sample.T), 3)}")
+
+    print("\n" + "="*70)
+    print("抽樣速度：10^7 個情境（分段 10^6）")
+    print("="*70)
+    n = 10_000_000
+    for label, model in (("多變量常態", equicorrelated_normal(0.5)), ("Gaussian copula", default_copula(0.5))):
+        r = throughput(model, n, seed=36)
+        print(f"{label:<16}: {r['seconds']:6.2f} 秒，{r['per_second']:>14,.0f} 情境/秒，"
+              f"平均倍數 {np.round(r['mean'], 4)}")
+    loop = loop_throughput(equicorrelated_normal(0.5), 20_000, seed=36)
+    print(f"{'逐情境迴圈':<16}: {loop['per_second']:>14,.0f} 情境/秒"
+          f"（估計 10^7 需 {n / loop['per_second']:,.0f} 秒）")
@@ -0,0 +1,275 @@
+"""
+候選種植計畫 × 評估分佈 的交叉評估矩陣（共同隨機數）
+
+b.py 評估 EV 解、e.py 評估 RP 解、g.py 評估最佳 SAA 批次解，每次只評一個計畫、一個分佈。
+這裡一次接受 P 個候選計畫 (P, 3) 與 D 個評估來源，算出完整的 P × D 利潤矩陣
+（平均、信賴區間、分位數）：
+  - 登錄表中的分佈（distributions.make）：所有分佈共用同一組均勻亂數 U，ξ = ppf(U)，
+    不同分佈之間與不同計畫之間都是共同隨機數（CRN），比較差異時變異數小很多
+  - 只提供 sample(n, rng) 的模型（例如 correlated 的各作物相關產量）：以相同種子抽樣
+  - 情境集合 {'values': (S,) 或 (S, 3), 'probabilities': (S,)}：依機率精確加權，不抽樣
+每個來源的樣本只產生一次，P 個計畫以廣播一次算完（farmer.total_profit 接受 (P, 1) 的面積欄）。
+"""
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import special
+
+from farmer import TOTAL_LAND, scenarios, build_rp_model, total_profit
+from distributions import DEMO_DISTRIBUTIONS, make, expected_profit
+
+QUANTILES = (0.05, 0.5, 0.95)
+PLAN_CHUNK = 256
+
+
+def plan_columns(plans):
+    """(P, 3) 的計畫矩陣轉成 total_profit 可廣播的三個 (P, 1) 欄"""
+    plans = np.atleast_2d(np.asarray(plans, dtype=float))
+    return [plans[:, i:i + 1] for i in range(3)]
+
+
+def profit_matrix(plans, multipliers, params=None):
+    """所有計畫在同一組樣本下的總利潤，形狀 (P, n)"""
+    return total_profit(plan_columns(plans), multipliers, params)
+
+
+def scenario_set(values, probabilities=None):
+    values = np.asarray(values, dtype=float)
+    if probabilities is None:
+        probabilities = np.full(len(values), 1 / len(values))
+    return {'values': values, 'probabilities': np.asarray(probabilities, dtype=float)}
+
+
+def draw(source, uniforms, seed):
+    """
+    來源的樣本與機率：情境集合回傳 (values, probabilities)；
+    有 ppf 的分佈以共同的 uniforms 反函數轉換；其他模型以固定種子抽樣。抽樣時機率為 None（等權重）。
+    """
+    if isinstance(source, dict):
+        return source['values'], source['probabilities']
+    if hasattr(source, 'ppf'):
+        return source.ppf(uniforms), None
+    return source.sample(len(uniforms), np.random.default_rng(seed)), None
+
+
+def _weighted_quantiles(profits, probabilities, levels):
+    order = np.argsort(profits, axis=1)
+    sorted_profits = np.take_along_axis(profits, order, axis=1)
+    cumulative = np.cumsum(probabilities[order], axis=1)
+    cumulative /= cumulative[:, -1:]
+    rows = np.arange(len(profits))
+    return np.stack([sorted_profits[rows, np.minimum((cumulative < q).sum(axis=1), profits.shape[1] - 1)]
+                     for q in levels], axis=-1)
+
+
+def _sorted_quantiles(profits, levels):
+    """每列已遞增排序時的分位數（與 np.quantile 預設的線性內插相同），不需再排序"""
+    position = np.asarray(levels) * (profits.shape[1] - 1)
+    low = np.floor(position).astype(int)
+    high = np.minimum(low + 1, profits.shape[1] - 1)
+    return profits[:, low] + (position - low) * (profits[:, high] - profits[:, low])
+
+
+def summarize(profits, probabilities=None, levels=QUANTILES, confidence=0.95, is_sorted=False):
+    """
+    一個來源下各計畫的 (平均, 標準差, 信賴區間半寬, 分位數)。
+    情境集合為精確期望值，半寬為 0；抽樣時以常態近似 mean ± z·std/√n。
+    is_sorted：每列利潤已遞增，分位數直接取位置。
+    """
+    if probabilities is None:
+        mean = profits.mean(axis=1)
+        std = profits.std(axis=1, ddof=1)
+        half = special.ndtri(1 - (1 - confidence) / 2) * std / np.sqrt(profits.shape[1])
+        if is_sorted:
+            quantiles = _sorted_quantiles(profits, levels)
+        else:
+            quantiles = np.quantile(profits, levels, axis=1).T
+    else:
+        mean = profits @ probabilities
+        std = np.sqrt(np.maximum((profits ** 2) @ probabilities - mean ** 2, 0.0))
+        half = np.zeros_like(mean)
+        quantiles = _weighted_quantiles(profits, probabilities, levels)
+    return mean, std, half, quantiles
+
+
+def cross_evaluate(plans, sources, n=20_000, seed=None, levels=QUANTILES, confidence=0.95,
+                   plan_chunk=PLAN_CHUNK, params=None):
+    """
+    plans (P, 3)；sources 為 {名稱: 分佈 / 抽樣模型 / 情境集合}。回傳 dict：
+      names、plans、mean / std / half_width (P, D)、quantiles (P, D, Q)、levels、exact (D,)、n
+    計畫分成每 plan_chunk 個一段，記憶體上限約 plan_chunk × n 個浮點數。
+    共同的 uniforms 先排序：預設參數下總利潤對產量乘數非遞減，經 ppf 轉換的來源每列利潤已排好，
+    分位數不必再排序。指定 params 時（價格可能為負）不保證單調，改回一般的分位數計算。
+    """
+    plans = np.atleast_2d(np.asarray(plans, dtype=float))
+    names = list(sources)
+    P, D = len(plans), len(names)
+    uniforms = np.sort(np.random.default_rng(seed).random(n))
+
+    mean, std, half = np.empty((P, D)), np.empty((P, D)), np.empty((P, D))
+    quantiles = np.empty((P, D, len(levels)))
+    exact = np.zeros(D, dtype=bool)
+    for d, name in enumerate(names):
+        values, probabilities = draw(sources[name], uniforms, seed)
+        exact[d] = probabilities is not None
+        is_sorted = params is None and hasattr(sources[name], 'ppf') and not isinstance(sources[name], dict)
+        for start in range(0, P, plan_chunk):
+            block = slice(start, min(start + plan_chunk, P))
+            profits = profit_matrix(plans[block], values, params)
+            mean[block, d], std[block, d], half[block, d], quantiles[block, d] = summarize(
+                profits, probabilities, levels, confidence, is_sorted)
+    return {'names': names, 'plans': plans, 'mean': mean, 'std': std, 'half_width': half,
+            'quantiles': quantiles, 'levels': tuple(levels), 'exact': exact, 'n': n}
+
+
+def regret(result):
+    """各來源下與最佳計畫的期望利潤差 (P, D)"""
+    return result['mean'].max(axis=0) - result['mean']
+
+
+def choose(result):
+    """各來源的最佳計畫，以及跨來源的最小化最大遺憾（minimax regret）與最大化最小期望利潤的計畫"""
+    r = regret(result)
+    return {
+        'best_by_source': dict(zip(result['names'], result['mean'].argmax(axis=0).tolist())),
+        'minimax_regret': int(r.max(axis=1).argmin()),
+        'maximin_mean': int(result['mean'].min(axis=1).argmax()),
+    }
+
+
+def to_frame(result):
+    """長格式 DataFrame：每列一個 (計畫, 來源)"""
+    P, D = result['mean'].shape
+    frame = pd.DataFrame({
+        'plan': np.repeat(np.arange(P), D),
+        'source': np.tile(result['names'], P),
+        'mean': result['mean'].ravel(),
+        'std': result['std'].ravel(),
+        'ci_low': (result['mean'] - result['half_width']).ravel(),
+        'ci_high': (result['mean'] + result['half_width']).ravel(),
+    })
+    for k, q in enumerate(result['levels']):
+        frame[f"q{q:g}"] = result['quantiles'][:, :, k].ravel()
+    return frame
+
+
+def candidate_plans(num_random=80, saa_batches=15, N=30, seed=None):
+    """EV、RP、三個 WS 情境解、SAA 各批解（同 g.py 的 N），其餘為隨機的土地分配"""
+    rng = np.random.default_rng(seed)
+    labels, plans = [], []
+
+    def solve(multipliers, probabilities=None, name="RP"):
+        rp = build_rp_model(multipliers, probabilities, name=name)
+        rp['model'].optimize()
+        return [rp['x'][i].X for i in range(3)]
+
+    labels.append('EV')
+    plans.append(solve([1.0], name="EV"))
+    labels.append('RP')
+    plans.append(solve([sc['multiplier'] for sc in scenarios], [sc['probability'] for sc in scenarios]))
+    for sc in scenarios:
+        labels.append(f"WS {sc['name']}")
+        plans.append(solve([sc['multiplier']], name="WS"))
+    for m in range(saa_batches):
+        labels.append(f"SAA 批次 {m + 1}")
+        plans.append(solve(rng.normal(1.0, 0.1, N), name=f"SAA_batch_{m+1}"))
+    shares = rng.dirichlet(np.ones(3), num_random) * rng.uniform(0.9, 1.0, (num_random, 1))
+    labels += [f"隨機 {k + 1}" for k in range(num_random)]
+    plans += list(shares * TOTAL_LAND)
+    return labels, np.array(plans)
+
+
+def demo_sources():
+    from correlated import default_copula
+    return {
+        **DEMO_DISTRIBUTIONS,
+        '常態 N(1, 0.2)': make('normal', std=0.2),
+        '三角 (0.5, 1.0, 1.3)': make('triangular', low=0.5, mode=1.0, high=1.3),
+        'd.py 三情境': scenario_set([sc['multiplier'] for sc in scenarios],
+                                   [sc['probability'] for sc in scenarios]),
+        '作物間相關（Gaussian copula, ρ=0.5）': default_copula(0.5),
+    }
+
+
+def pairwise_loop(plans, sources, n, seed=None, levels=QUANTILES):
+    """
+    對照組：逐一（計畫, 來源）各自重新抽樣，算平均、標準差與分位數，等同執行 P × D 次單一計畫的驗證。
+    回傳 mean、std (P, D) 與 quantiles (P, D, Q)；情境集合只算期望值（std、分位數為 nan）。
+    """
+    rng = np.random.default_rng(seed)
+    P, D = len(plans), len(sources)
+    mean, std = np.empty((P, D)), np.full((P, D), np.nan)
+    quantiles = np.full((P, D, len(levels)), np.nan)
+    for d, source in enumerate(sources.values()):
+        for p, acres in enumerate(plans):
+            if isinstance(source, dict):
+                mean[p, d] = total_profit(acres, source['values']) @ source['probabilities']
+            else:
+                profits = total_profit(acres, source.sample(n, rng))
+                mean[p, d] = profits.mean()
+                std[p, d] = profits.std(ddof=1)
+                quantiles[p, d] = np.quantile(profits, levels)
+    return {'mean': mean, 'std': std, 'quantiles': quantiles}
+
+
+if __name__ == "__main__":
+    n = 20_000
+    labels, plans = candidate_plans(seed=34)
+    sources = demo_sources()
+
+    print("="*70)
+    print(f"{len(plans)} 個計畫 × {len(sources)} 個評估來源，每個來源 {n:,} 個共同隨機樣本")
+    print("="*70)
+    start = time.perf_counter()
+    result = cross_evaluate(plans, sources, n=n, seed=34)
+    batch_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    looped = pairwise_loop(plans, sources, n, seed=34)
+    loop_seconds = time.perf_counter() - start
+    print(f"一次批次評估: {batch_seconds:.2f} 秒；逐對重新抽樣（{looped['mean'].size} 次）: {loop_seconds:.2f} 秒")
+
+    # 有解析期望值的分佈：檢查批次結果落在信賴區間內
+    z_scores = []
+    for d, name in enumerate(result['names']):
+        dist = sources[name]
+        if name in DEMO_DISTRIBUTIONS or hasattr(dist, 'partial_expectation'):
+            exact = np.array([expected_profit(p, dist) for p in plans])
+            z_scores.append(np.abs(result['mean'][:, d] - exact) / (result['half_width'][:, d] / 1.96))
+    print(f"與解析期望值比較：最大 |誤差| / 標準誤 = {np.max(z_scores):.2f}")
+
+    print("\n" + "="*70)
+    print("主要計畫的期望利潤（95% 信賴區間半寬）")
+    print("="*70)
+    for p in range(5):
+        print(f"\n{labels[p]}：面積 {np.round(plans[p], 1)}")
+        for d, name in enumerate(result['names']):
+            q = result['quantiles'][p, d]
+            ci = "精確" if result['exact'][d] else f"±{result['half_width'][p, d]:,.0f}"
+            print(f"  {name:<40} ${result['mean'][p, d]:>11,.0f} ({ci:>6})  "
+                  f"5%/50%/95%: {q[0]:>9,.0f} {q[1]:>9,.0f} {q[2]:>9,.0f}")
+
+    chosen = choose(result)
+    print("\n" + "="*70)
+    print("選擇")
+    print("="*70)
+    for name, p in chosen['best_by_source'].items():
+        print(f"  {name:<40} 最佳: {labels[p]}")
+    p = chosen['minimax_regret']
+    print(f"\n最小化最大遺憾: {labels[p]}（面積 {np.round(plans[p], 1)}，最大遺憾 ${regret(result)[p].max():,.2f}）")
+    p = chosen['maximin_mean']
+    print(f"最大化最差分佈期望利潤: {labels[p]}（${result['mean'][p].min():,.2f}）")
+
+    print("\n" + "="*70)
+    print("共同隨機數的效果：RP 與 EV 在常態 N(1, 0.1) 下的利潤差")
+    print("="*70)
+    dist = make('normal')
+    uniforms = np.random.default_rng(34).random(n)
+    crn = profit_matrix(plans[[1, 0]], dist.ppf(uniforms))
+    diff_crn = crn[0] - crn[1]
+    rng = np.random.default_rng(35)
+    diff_ind = total_profit(plans[1], dist.sample(n, rng)) - total_profit(plans[0], dist.sample(n, rng))
+    se_crn, se_ind = diff_crn.std(ddof=1) / np.sqrt(n), diff_ind.std(ddof=1) / np.sqrt(n)
+    print(f"  共同隨機數: ${diff_crn.mean():,.2f} ± {se_crn:,.2f}（標準誤）")
+    print(f"  獨立抽樣:   ${diff_ind.mean():,.2f} ± {se_ind:,.2f}（標準誤），"
+          f"變異數為共同隨機數的 {(se_ind / se_crn) ** 2:,.0f} 倍")
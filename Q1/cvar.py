@@ -0,0 +1,162 @@
+"""
+風險趨避的兩階段隨機規劃：期望利潤與 CVaR 的加權目標（Mean-CVaR）
+
+目標函數:  max (1-λ)·E[利潤] + λ·CVaR_α(利潤)
+CVaR 使用 Rockafellar–Uryasev 輔助變數:
+  CVaR_α = max η - (1/α) Σ p_s u_s,   u_s ≥ η - 利潤_s,  u_s ≥ 0
+其中 α 為左尾（低利潤）的機率水準，例如 α=0.05 代表最差 5% 情境的平均利潤。
+
+效率前緣模式只建一次模型，對每個 (λ, α) 只改目標係數後重新求解，
+以前一個基底（basis）暖啟動，避免每點都冷啟動。
+"""
+import time
+
+from gurobipy import GRB
+import numpy as np
+
+from farmer import MU, SIGMA, scenarios, build_rp_model
+
+
+def build_mean_cvar_model(multipliers, probabilities=None, name="Mean_CVaR"):
+    """
+    在 RP/SAA 擴展式上加入 η 與每個情境的 u_s。
+    回傳的 dict 額外包含 eta、u，以及設定 (λ, α) 時所需的基本目標係數。
+    """
+    rp = build_rp_model(multipliers, probabilities, name=name)
+    model = rp['model']
+    probs = rp['probabilities']
+    num_scenarios = len(probs)
+
+    model.update()
+    decision_vars = model.getVars()
+
+    eta = model.addVar(lb=-GRB.INFINITY, name="var_eta")
+    u = model.addVars(num_scenarios, lb=0, name="cvar_excess")
+
+    for s in range(num_scenarios):
+        model.addConstr(u[s] >= eta - rp['profit'][s], f"cvar_s{s}")
+
+    # 期望利潤部分的目標係數（即原本 RP 的目標），之後依 λ 縮放
+    rp['decision_vars'] = decision_vars
+    rp['base_obj'] = np.array(model.getAttr(GRB.Attr.Obj, decision_vars))
+    rp['u_vars'] = [u[s] for s in range(num_scenarios)]
+    rp['eta'] = eta
+    rp['u'] = u
+
+    model.setParam('Method', 0)  # 只改目標係數時原基底仍為原始可行，primal simplex 可直接暖啟動
+    return rp
+
+
+def set_risk_weights(cvar_model, lam, alpha):
+    """更新 (λ, α) 對應的目標係數，不重建模型"""
+    model = cvar_model['model']
+    probs = cvar_model['probabilities']
+
+    model.setAttr(GRB.Attr.Obj, cvar_model['decision_vars'], list((1 - lam) * cvar_model['base_obj']))
+    model.setAttr(GRB.Attr.Obj, [cvar_model['eta']], [lam])
+    model.setAttr(GRB.Attr.Obj, cvar_model['u_vars'], list(-lam * probs / alpha))
+
+
+def solve_mean_cvar(cvar_model, lam, alpha, cold_start=False):
+    """求解指定 (λ, α)，回傳種植決策、期望利潤、CVaR 與求解花費"""
+    model = cvar_model['model']
+    set_risk_weights(cvar_model, lam, alpha)
+    if cold_start:
+        model.reset()  # 丟棄前一個基底
+    model.optimize()
+
+    if model.status != GRB.OPTIMAL:
+        return {'lambda': lam, 'alpha': alpha, 'status': model.status}
+
+    probs = cvar_model['probabilities']
+    profits = np.array([cvar_model['profit'][s].getValue() for s in range(len(probs))])
+    expected = float(probs @ profits)
+    cvar = risk_measures(profits, probs, alpha)['cvar']
+
+    return {
+        'lambda': lam,
+        'alpha': alpha,
+        'status': model.status,
+        'acres': [cvar_model['x'][i].X for i in range(3)],
+        'objective': model.objVal,
+        'expected_profit': expected,
+        'cvar': cvar,
+        'iterations': model.IterCount,
+        'runtime': model.Runtime
+    }
+
+
+def risk_measures(profits, probabilities, alpha):
+    """離散分佈下利潤的 VaR_α（左尾分位數）與 CVaR_α（最差 α 機率質量的平均）"""
+    order = np.argsort(profits)
+    p_sorted = np.asarray(probabilities)[order]
+    v_sorted = np.asarray(profits)[order]
+    cum = np.cumsum(p_sorted)
+    k = int(np.searchsorted(cum, alpha - 1e-12))
+    var = v_sorted[k]
+    # 取到 VaR 為止的機率質量，最後一個點只取剩餘部分
+    mass = np.minimum(p_sorted, np.maximum(alpha - (cum - p_sorted), 0))
+    cvar = float(mass @ v_sorted) / alpha
+    return {'var': float(var), 'cvar': cvar}
+
+
+def efficient_frontier(multipliers, lambdas, alphas, probabilities=None, warm_start=True):
+    """
+    掃描 (λ, α) 網格。每個 α 內 λ 以蛇形順序走訪，相鄰兩點的目標係數變化最小，
+    前一個最佳基底離新的最佳解最近。
+    """
+    cvar_model = build_mean_cvar_model(multipliers, probabilities, name="Frontier")
+    results = []
+    start = time.perf_counter()
+    for i, alpha in enumerate(alphas):
+        lam_order = lambdas if i % 2 == 0 else lambdas[::-1]
+        for lam in lam_order:
+            results.append(solve_mean_cvar(cvar_model, lam, alpha, cold_start=not warm_start))
+    elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+if __name__ == "__main__":
+    print("="*70)
+    print("Mean-CVaR 隨機規劃（三情境 RP）")
+    print("="*70)
+
+    rp_mults = [sc['multiplier'] for sc in scenarios]
+    rp_probs = [sc['probability'] for sc in scenarios]
+    cvar_rp = build_mean_cvar_model(rp_mults, rp_probs, name="RP_CVaR")
+
+    print(f"\n{'λ':>6} {'α':>6} {'小麥':>10} {'玉米':>10} {'甜菜':>10} {'期望利潤':>14} {'CVaR':>14}")
+    for lam in [0.0, 0.25, 0.5, 0.75, 1.0]:
+        r = solve_mean_cvar(cvar_rp, lam, 1/3)
+        print(f"{lam:>6.2f} {1/3:>6.3f} {r['acres'][0]:>10.2f} {r['acres'][1]:>10.2f} "
+              f"{r['acres'][2]:>10.2f} ${r['expected_profit']:>13,.2f} ${r['cvar']:>13,.2f}")
+
+    print("\n" + "="*70)
+    print("SAA 效率前緣：50 點 (λ, α) 網格，暖啟動 vs 冷啟動")
+    print("="*70)
+
+    N = 200
+    rng = np.random.default_rng(34)
+    yield_multipliers = rng.normal(MU, SIGMA, N)
+
+    lambdas = list(np.linspace(0, 1, 10))
+    alphas = [0.01, 0.05, 0.1, 0.2, 0.3]
+
+    warm_results, warm_time = efficient_frontier(yield_multipliers, lambdas, alphas, warm_start=True)
+    cold_results, cold_time = efficient_frontier(yield_multipliers, lambdas, alphas, warm_start=False)
+
+    single = build_mean_cvar_model(yield_multipliers, name="Single")
+    one_cold = solve_mean_cvar(single, 0.5, 0.05, cold_start=True)
+
+    warm_iters = sum(r['iterations'] for r in warm_results)
+    cold_iters = sum(r['iterations'] for r in cold_results)
+
+    print(f"\n樣本數 N={N}，網格點數 {len(warm_results)}")
+    print(f"  暖啟動: 總迭代 {warm_iters:>8,.0f}，總時間 {warm_time:.3f} 秒")
+    print(f"  冷啟動: 總迭代 {cold_iters:>8,.0f}，總時間 {cold_time:.3f} 秒")
+    print(f"  單次冷啟動迭代數: {one_cold['iterations']:,.0f}")
+    print(f"  暖啟動前緣約等於 {warm_iters / max(one_cold['iterations'], 1):.1f} 次冷啟動")
+
+    print(f"\n{'α':>6} {'λ':>6} {'期望利潤':>14} {'CVaR':>14}")
+    for r in sorted(warm_results, key=lambda r: (r['alpha'], r['lambda'])):
+        print(f"{r['alpha']:>6.2f} {r['lambda']:>6.2f} ${r['expected_profit']:>13,.2f} ${r['cvar']:>13,.2f}")
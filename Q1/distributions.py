@@ -0,0 +1,343 @@
+"""
+產量倍數分佈的登錄表：向量化抽樣、CDF / PPF 與部分期望值
+
+g.py 固定使用 np.random.normal(MU, SIGMA, N)，σ 大時會抽到負產量，也無法表達偏斜的收成風險。
+這裡每個分佈都提供：
+  sample(n, rng)             向量化抽樣
+  cdf(t) / ppf(q)            分佈函數與分位數函數（陣列輸入）
+  partial_expectation(t)     部分期望值 E[ξ · 1{ξ ≤ t}]
+  support                    支撐集 (下界, 上界)
+以名稱登錄（make('lognormal', mean=1, std=0.1)），樣本產生、上下界（bounds.py）
+與 expected_recourse 的解析期望值都可以使用任何登錄的分佈。
+
+第二階段淨收益對共同產量倍數 ξ 是分段線性的，因此固定種植面積時
+E[Q(x, ξ)] 只需要在斷點上的 F(t) 與 partial_expectation(t)，不需要逐樣本計算。
+"""
+import numpy as np
+from scipy import special, stats
+
+from farmer import MU, SIGMA, AVG_YIELD, DEMAND, SELL_PRICE, BUY_PRICE, BEET_QUOTA, planting_cost, total_profit
+
+REGISTRY = {}
+
+
+def register(name):
+    def decorator(cls):
+        REGISTRY[name] = cls
+        cls.name = name
+        return cls
+    return decorator
+
+
+def make(name, **params):
+    if name not in REGISTRY:
+        raise KeyError(f"未登錄的分佈: {name}（可用: {', '.join(sorted(REGISTRY))}）")
+    return REGISTRY[name](**params)
+
+
+def from_spec(spec):
+    """{'name': 'beta', 'a': 2, 'b': 5, ...} → 分佈物件；mixture 的 components 也是 spec"""
+    spec = dict(spec)
+    return make(spec.pop('name'), **spec)
+
+
+class Distribution:
+    """預設實作：以 ppf 做反函數抽樣"""
+    support = (-np.inf, np.inf)
+
+    def sample(self, n, rng=None):
+        rng = np.random.default_rng(rng)
+        return self.ppf(rng.random(n))
+
+    @property
+    def mean(self):
+        return float(self.partial_expectation(np.inf))
+
+    def lower_partial_moment(self, t):
+        """E[(t - ξ)^+] = t·F(t) - E[ξ · 1{ξ ≤ t}]"""
+        t = np.asarray(t, dtype=float)
+        return t * self.cdf(t) - self.partial_expectation(t)
+
+
+@register('normal')
+class Normal(Distribution):
+    def __init__(self, mean=MU, std=SIGMA):
+        self.mu, self.sigma = float(mean), float(std)
+
+    def sample(self, n, rng=None):
+        return np.random.default_rng(rng).normal(self.mu, self.sigma, n)
+
+    def cdf(self, t):
+        return special.ndtr((np.asarray(t, dtype=float) - self.mu) / self.sigma)
+
+    def ppf(self, q):
+        return self.mu + self.sigma * special.ndtri(q)
+
+    def partial_expectation(self, t):
+        z = (np.asarray(t, dtype=float) - self.mu) / self.sigma
+        return self.mu * special.ndtr(z) - self.sigma * np.exp(-0.5 * z ** 2) / np.sqrt(2 * np.pi)
+
+
+@register('truncnorm')
+class TruncatedNormal(Distribution):
+    """截斷在 [low, high] 的常態（預設截斷在 0，不會產生負產量）"""
+
+    def __init__(self, mean=MU, std=SIGMA, low=0.0, high=np.inf):
+        self.mu, self.sigma = float(mean), float(std)
+        self.support = (float(low), float(high))
+        self._a = special.ndtr((low - self.mu) / self.sigma)
+        self._b = special.ndtr((high - self.mu) / self.sigma)
+        self._z = self._b - self._a
+
+    def _clip(self, t):
+        return np.clip(np.asarray(t, dtype=float), *self.support)
+
+    def cdf(self, t):
+        return (special.ndtr((self._clip(t) - self.mu) / self.sigma) - self._a) / self._z
+
+    def ppf(self, q):
+        return self.mu + self.sigma * special.ndtri(self._a + np.asarray(q, dtype=float) * self._z)
+
+    def partial_expectation(self, t):
+        base = Normal(self.mu, self.sigma)
+        t = self._clip(t)
+        return (base.partial_expectation(t) - base.partial_expectation(self.support[0])) / self._z
+
+
+@register('lognormal')
+class LogNormal(Distribution):
+    """以倍數本身的平均與標準差參數化：ln ξ ~ N(m, s²)"""
+    support = (0.0, np.inf)
+
+    def __init__(self, mean=MU, std=SIGMA):
+        self.s = np.sqrt(np.log(1 + (std / mean) ** 2))
+        self.m = np.log(mean) - self.s ** 2 / 2
+
+    def sample(self, n, rng=None):
+        return np.random.default_rng(rng).lognormal(self.m, self.s, n)
+
+    def _log(self, t):
+        t = np.asarray(t, dtype=float)
+        with np.errstate(divide='ignore'):
+            return np.where(t > 0, np.log(np.maximum(t, 0)), -np.inf)
+
+    def cdf(self, t):
+        return special.ndtr((self._log(t) - self.m) / self.s)
+
+    def ppf(self, q):
+        return np.exp(self.m + self.s * special.ndtri(q))
+
+    def partial_expectation(self, t):
+        return np.exp(self.m + self.s ** 2 / 2) * special.ndtr((self._log(t) - self.m - self.s ** 2) / self.s)
+
+
+@register('beta')
+class Beta(Distribution):
+    """[low, high] 上的 Beta(a, b)；a < b 時左偏的高產量機率較小"""
+
+    def __init__(self, a, b, low=0.5, high=1.5):
+        self.a, self.b = float(a), float(b)
+        self.support = (float(low), float(high))
+
+    def _z(self, t):
+        low, high = self.support
+        return np.clip((np.asarray(t, dtype=float) - low) / (high - low), 0, 1)
+
+    def sample(self, n, rng=None):
+        low, high = self.support
+        return low + (high - low) * np.random.default_rng(rng).beta(self.a, self.b, n)
+
+    def cdf(self, t):
+        return special.betainc(self.a, self.b, self._z(t))
+
+    def ppf(self, q):
+        low, high = self.support
+        return low + (high - low) * special.betaincinv(self.a, self.b, q)
+
+    def partial_expectation(self, t):
+        low, high = self.support
+        z = self._z(t)
+        return (low * special.betainc(self.a, self.b, z) +
+                (high - low) * self.a / (self.a + self.b) * special.betainc(self.a + 1, self.b, z))
+
+
+@register('triangular')
+class Triangular(Distribution):
+    def __init__(self, low=0.7, mode=1.0, high=1.2):
+        if not low <= mode <= high or low == high:
+            raise ValueError(f"三角分佈需要 low ≤ mode ≤ high 且 low < high: {(low, mode, high)}")
+        self.low, self.mode, self.high = float(low), float(mode), float(high)
+        self.support = (self.low, self.high)
+        self._fc = (self.mode - self.low) / (self.high - self.low)
+
+    def sample(self, n, rng=None):
+        return np.random.default_rng(rng).triangular(self.low, self.mode, self.high, n)
+
+    def cdf(self, t):
+        return stats.triang.cdf(t, self._fc, loc=self.low, scale=self.high - self.low)
+
+    def ppf(self, q):
+        return stats.triang.ppf(q, self._fc, loc=self.low, scale=self.high - self.low)
+
+    def partial_expectation(self, t):
+        lo, c, hi = self.low, self.mode, self.high
+        t = np.clip(np.asarray(t, dtype=float), lo, hi)
+        left = np.minimum(t, c)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # ∫ x f(x) dx 在上升段 [lo, min(t, c)] 與下降段 [c, max(t, c)] 的閉式解
+            rise = np.where(c > lo, 2 / ((hi - lo) * (c - lo)) *
+                            ((left ** 3 - lo ** 3) / 3 - lo * (left ** 2 - lo ** 2) / 2), 0.0)
+            right = np.maximum(t, c)
+            fall = np.where(hi > c, 2 / ((hi - lo) * (hi - c)) *
+                            (hi * (right ** 2 - c ** 2) / 2 - (right ** 3 - c ** 3) / 3), 0.0)
+        return rise + fall
+
+
+@register('empirical')
+class Empirical(Distribution):
+    """歷史資料的經驗分佈（每個觀測值機率相同）"""
+
+    def __init__(self, samples):
+        self.values = np.sort(np.asarray(samples, dtype=float))
+        self.support = (self.values[0], self.values[-1])
+        self._cumsum = np.concatenate(([0.0], np.cumsum(self.values)))
+
+    def sample(self, n, rng=None):
+        return np.random.default_rng(rng).choice(self.values, n)
+
+    def cdf(self, t):
+        return np.searchsorted(self.values, t, side='right') / len(self.values)
+
+    def ppf(self, q):
+        index = np.ceil(np.asarray(q, dtype=float) * len(self.values)).astype(int) - 1
+        return self.values[np.clip(index, 0, len(self.values) - 1)]
+
+    def partial_expectation(self, t):
+        return self._cumsum[np.searchsorted(self.values, t, side='right')] / len(self.values)
+
+
+@register('mixture')
+class Mixture(Distribution):
+    """有限混合分佈，例如「正常年 + 災害年」；components 為分佈物件或 spec"""
+
+    def __init__(self, components, weights):
+        self.components = [c if isinstance(c, Distribution) else from_spec(c) for c in components]
+        self.weights = np.asarray(weights, dtype=float) / np.sum(weights)
+        self.support = (min(c.support[0] for c in self.components), max(c.support[1] for c in self.components))
+
+    def sample(self, n, rng=None):
+        rng = np.random.default_rng(rng)
+        counts = rng.multinomial(n, self.weights)
+        out = np.concatenate([c.sample(k, rng) for c, k in zip(self.components, counts)])
+        return rng.permutation(out)
+
+    def cdf(self, t):
+        return sum(w * c.cdf(t) for w, c in zip(self.weights, self.components))
+
+    def partial_expectation(self, t):
+        return sum(w * c.partial_expectation(t) for w, c in zip(self.weights, self.components))
+
+    def ppf(self, q, iterations=60):
+        """各成分分位數的最小 / 最大值夾住解，向量化二分法"""
+        q = np.asarray(q, dtype=float)
+        candidates = np.array([c.ppf(q) for c in self.components])
+        lo, hi = candidates.min(axis=0), candidates.max(axis=0)
+        for _ in range(iterations):
+            mid = (lo + hi) / 2
+            below = self.cdf(mid) < q
+            lo = np.where(below, mid, lo)
+            hi = np.where(below, hi, mid)
+        return (lo + hi) / 2
+
+
+def _piecewise_expectation(dist, slope, breakpoint, low_price, high_price, offset):
+    """E[g(ξ)]，g(ξ) = price · (slope·ξ - offset)，ξ ≤ breakpoint 用 low_price，否則 high_price"""
+    F = dist.cdf(breakpoint)
+    pe = dist.partial_expectation(breakpoint)
+    below = slope * pe - offset * F
+    above = slope * (dist.mean - pe) - offset * (1 - F)
+    return low_price * below + high_price * above
+
+
+def expected_recourse(acres, dist, params=None):
+    """
+    共同產量倍數 ξ ~ dist 時，固定種植面積的第二階段期望淨收益（解析解）。
+    小麥、玉米：不足時以購買價補、剩餘以銷售價賣；甜菜：配額內高價、超額低價。
+    """
+    p = params or {}
+    avg_yield = p.get('AVG_YIELD', AVG_YIELD)
+    demand = p.get('DEMAND', DEMAND)
+    sell, buy = p.get('SELL_PRICE', SELL_PRICE), p.get('BUY_PRICE', BUY_PRICE)
+    quota = p.get('BEET_QUOTA', BEET_QUOTA)
+    mean = dist.mean
+
+    total = 0.0
+    for i in range(2):
+        slope = avg_yield[i] * acres[i]
+        if slope <= 0:
+            total += -buy[i] * demand[i]
+            continue
+        total += _piecewise_expectation(dist, slope, demand[i] / slope, buy[i], sell[i], demand[i])
+
+    slope = avg_yield[2] * acres[2]
+    if slope > 0:
+        t = quota / slope
+        beet_low = slope * dist.partial_expectation(t) + quota * (1 - dist.cdf(t))
+        total += sell[2] * beet_low + sell[3] * (slope * mean - beet_low)
+    return float(total)
+
+
+def expected_profit(acres, dist, params=None):
+    return expected_recourse(acres, dist, params) - planting_cost(acres, params)
+
+
+DEMO_DISTRIBUTIONS = {
+    '常態 N(1, 0.1)': make('normal'),
+    '截斷常態 N(1, 0.4) ≥ 0': make('truncnorm', std=0.4),
+    '對數常態（平均 1、標準差 0.1）': make('lognormal'),
+    'Beta(5, 3) 於 [0.5, 1.3]': make('beta', a=5, b=3, low=0.5, high=1.3),
+    '三角 (0.7, 1.0, 1.2)': make('triangular'),
+    '混合：90% N(1.05, 0.08) + 10% 災害 N(0.6, 0.1)': make('mixture', components=[
+        {'name': 'normal', 'mean': 1.05, 'std': 0.08}, {'name': 'truncnorm', 'mean': 0.6, 'std': 0.1}],
+        weights=[0.9, 0.1]),
+}
+
+
+if __name__ == "__main__":
+    import time
+    from bounds import bracket
+
+    acres = [170, 80, 250]
+    rng = np.random.default_rng(34)
+    historical = make('normal').sample(40, rng)
+    distributions = {**DEMO_DISTRIBUTIONS, '經驗分佈（40 年歷史）': make('empirical', samples=historical)}
+
+    print("="*70)
+    print("RP 種植面積（170, 80, 250）在不同產量分佈下的期望利潤")
+    print("="*70)
+    print(f"\n{'分佈':<40} {'解析解':>14} {'蒙地卡羅 10^6':>16} {'P(ξ<0)':>8}")
+    for label, dist in distributions.items():
+        exact = expected_profit(acres, dist)
+        samples = dist.sample(1_000_000, rng)
+        mc = total_profit(acres, samples).mean()
+        print(f"{label:<40} ${exact:>12,.2f} ${mc:>14,.2f} {np.mean(samples < 0):>8.4f}")
+
+    print("\n" + "="*70)
+    print("抽樣與解析評估速度（對數常態）")
+    print("="*70)
+    dist = make('lognormal')
+    start = time.perf_counter()
+    dist.sample(10_000_000, rng)
+    sample_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(1000):
+        expected_profit(acres, dist)
+    print(f"抽樣 10^7 個: {sample_time:.2f} 秒；解析期望值: {(time.perf_counter() - start):.3f} ms / 次")
+
+    print("\n" + "="*70)
+    print("Jensen / Edmundson–Madansky 上下界（Beta(5, 3) 與混合分佈）")
+    print("="*70)
+    for label in ['Beta(5, 3) 於 [0.5, 1.3]', '混合：90% N(1.05, 0.08) + 10% 災害 N(0.6, 0.1)']:
+        history = bracket(max_partitions=15, dist=distributions[label])
+        final = history[-1]
+        print(f"{label}: [${final['lower']:,.2f}, ${final['upper']:,.2f}]（相對寬度 {final['relative_width']:.4%}）")
@@ -0,0 +1,235 @@
+"""
+Wasserstein 分佈穩健（DRO）農夫問題
+
+g.py 的 SAA 以 N 個樣本的經驗分佈 P̂_N 當作真實分佈，N 小時解會過度配合樣本，
+訓練目標值高於驗證利潤。這裡改為最大化以 P̂_N 為中心、半徑 ε 的 1-Wasserstein 球內最差分佈的期望利潤：
+  max_x  inf_{W(P, P̂_N) ≤ ε}  E_P[利潤(x, ξ)]，  ξ 為共同產量倍數，支撐集 ξ ≥ 0
+
+固定面積時第二階段淨收益對 ξ 是凹的分段線性函數（每種作物兩段：不足時以購買價、剩餘時以銷售價；
+甜菜在配額內外兩段），總利潤是 K = 2×2×2 = 8 個仿射函數的最小值：
+  利潤(x, ξ) = min_k  c_k(x)·ξ + d_k(x)，   c_k、d_k 對 x 為線性，且 c_k ≥ 0
+依 Mohajerin Esfahani & Kuhn 的對偶，最差期望利潤等於
+  max  (1/N) Σ_i t_i - ε·λ
+  s.t. t_i ≤ c_k(x)·ξ̂_i + d_k(x) - g_k·ξ̂_i    （每個樣本 i、每段 k）
+       g_k ≥ c_k(x) - λ,  g_k ≥ 0,  λ ≥ 0
+g_k 是支撐集 ξ ≥ 0 的乘數：斜率超過 λ 的段，最差分佈把質量一路移到 ξ = 0，
+此時的最佳乘數與樣本無關，所以每段只需要一個 g_k。
+模型有 N + 12 個變數、8N + 9 條限制式，隨 N 線性成長（擴展式 SAA 為 6N + 3 個變數、4N + 1 條）。
+ε 只出現在 λ 的目標係數，交叉驗證的 ε 掃描只改這一個係數後以前一個基底暖啟動。
+"""
+import time
+
+import gurobipy as gp
+from gurobipy import GRB
+import numpy as np
+
+from farmer import MU, SIGMA, default_params, build_rp_model, total_profit
+from distributions import make, expected_profit
+
+EPSILONS = np.concatenate([[0.0], np.geomspace(1e-3, 0.2, 12)])
+
+
+def profit_pieces(params=None):
+    """
+    各仿射段的係數：利潤_k = ξ·(slope[k] @ x) + intercept[k] - PLANT_COST @ x
+    slope (K, 3)、intercept (K,)，K = 8
+    """
+    p = {**default_params(), **params} if params else default_params()
+    avg_yield, demand = p['AVG_YIELD'], p['DEMAND']
+    sell, buy = p['SELL_PRICE'], p['BUY_PRICE']
+    wheat = [(sell[0], demand[0]), (buy[0], demand[0])]
+    corn = [(sell[1], demand[1]), (buy[1], demand[1])]
+    # 甜菜：配額內 36·產量；超過配額 10·產量 + (36 - 10)·配額
+    beet = [(sell[2], 0.0), (sell[3], (sell[2] - sell[3]) * p['BEET_QUOTA'])]
+
+    slope, intercept = [], []
+    for pw, dw in wheat:
+        for pc, dc in corn:
+            for pb, db in beet:
+                slope.append([pw * avg_yield[0], pc * avg_yield[1], pb * avg_yield[2]])
+                intercept.append(-pw * dw - pc * dc + db)
+    return np.array(slope), np.array(intercept)
+
+
+def build_dro_model(samples, epsilon=0.0, params=None, name="DRO"):
+    """
+    建立 Wasserstein DRO 的線性規劃。samples 為 N 個共同產量倍數（負值截到 0，以符合支撐集）。
+    回傳 dict：model、x、lam、t、g、samples、params；目標值即最差分佈下的期望利潤。
+    """
+    p = {**default_params(), **params} if params else default_params()
+    samples = np.maximum(np.asarray(samples, dtype=float), 0.0)
+    num_samples = len(samples)
+    slope, intercept = profit_pieces(params)
+    num_pieces = len(slope)
+
+    model = gp.Model(name)
+    model.setParam('OutputFlag', 0)
+    model.setParam('Method', 0)  # 掃描 ε 時只改目標係數，原基底仍為原始可行
+
+    x = model.addVars(3, name="acres", lb=0)
+    lam = model.addVar(lb=0, name="wasserstein_lambda")
+    t = model.addVars(num_samples, lb=-GRB.INFINITY, name="worst_profit")
+    g = model.addVars(num_pieces, lb=0, name="support_gamma")
+
+    model.addConstr(x[0] + x[1] + x[2] <= p['TOTAL_LAND'], "land")
+    first_stage = gp.quicksum(p['PLANT_COST'][i] * x[i] for i in range(3))
+    for k in range(num_pieces):
+        c_k = gp.quicksum(slope[k, i] * x[i] for i in range(3))
+        model.addConstr(g[k] >= c_k - lam, f"support_k{k}")
+        d_k = intercept[k] - first_stage
+        for s in range(num_samples):
+            model.addConstr(t[s] <= samples[s] * (c_k - g[k]) + d_k, f"piece_k{k}_s{s}")
+
+    model.setObjective(t.sum() / num_samples - epsilon * lam, GRB.MAXIMIZE)
+
+    return {
+        'model': model,
+        'x': x,
+        'lam': lam,
+        't': t,
+        'g': g,
+        'samples': samples,
+        'params': params,
+        'epsilon': epsilon
+    }
+
+
+def solve_dro(dro, epsilon=None):
+    """以半徑 epsilon 求解（省略時沿用目前半徑），回傳種植面積、最差期望利潤與 λ"""
+    model = dro['model']
+    if epsilon is not None:
+        dro['lam'].Obj = -epsilon
+        dro['epsilon'] = epsilon
+    model.optimize()
+    acres = [dro['x'][i].X for i in range(3)]
+    return {
+        'epsilon': dro['epsilon'],
+        'acres': acres,
+        'objective': model.objVal,
+        'empirical_profit': float(total_profit(acres, dro['samples'], dro['params']).mean()),
+        'lambda': dro['lam'].X,
+        'iterations': model.IterCount
+    }
+
+
+def worst_case_profit(acres, samples, epsilon, params=None):
+    """固定種植面積時，Wasserstein 球內最差分佈的期望利潤（可用來評估 SAA 解的穩健保證）"""
+    dro = build_dro_model(samples, epsilon, params, name="DRO_Fixed")
+    for i in range(3):
+        dro['x'][i].LB = dro['x'][i].UB = acres[i]
+    dro['model'].optimize()
+    return dro['model'].objVal
+
+
+def cross_validate(samples, epsilons=EPSILONS, folds=5, seed=None, params=None):
+    """
+    k 折交叉驗證選 ε：每折只建一個模型，依序掃描 ε（只改 λ 的目標係數），
+    以留出樣本的平均總利潤（封閉解）評分。回傳最佳 ε、各 ε 的平均驗證利潤與全部樣本下的 DRO 解。
+    """
+    samples = np.asarray(samples, dtype=float)
+    if len(samples) < 2:
+        raise ValueError(f"交叉驗證至少需要 2 個樣本，收到 {len(samples)} 個")
+    # 至少 2 折，每折的訓練集才不會是空的
+    folds = max(2, min(folds, len(samples)))
+    order = np.random.default_rng(seed).permutation(len(samples))
+    scores = np.zeros(len(epsilons))
+    for held_out in np.array_split(order, folds):
+        train = np.setdiff1d(order, held_out)
+        dro = build_dro_model(samples[train], params=params, name="DRO_CV")
+        for j, eps in enumerate(epsilons):
+            acres = solve_dro(dro, eps)['acres']
+            scores[j] += total_profit(acres, samples[held_out], params).mean() / folds
+    # 分數相同時取較大的半徑（較保守）
+    best = len(scores) - 1 - int(np.argmax(scores[::-1]))
+    final = solve_dro(build_dro_model(samples, epsilons[best], params), epsilons[best])
+    return {'epsilon': float(epsilons[best]), 'scores': scores, 'epsilons': np.asarray(epsilons), 'solution': final}
+
+
+def saa_solution(samples):
+    rp = build_rp_model(samples, name="SAA")
+    rp['model'].optimize()
+    return {'acres': [rp['x'][i].X for i in range(3)], 'objective': rp['model'].objVal}
+
+
+def replications(N, R=40, seed=None, epsilons=EPSILONS):
+    """
+    R 組大小 N 的樣本，各自求 SAA 與交叉驗證 DRO 解，並以常態分佈的解析期望利潤評估真實表現。
+    回傳各方法的 (訓練目標值, 真實期望利潤) 陣列與選到的 ε。
+    """
+    dist = make('normal', mean=MU, std=SIGMA)
+    rng = np.random.default_rng(seed)
+    out = {'saa_train': [], 'saa_true': [], 'dro_train': [], 'dro_true': [], 'epsilon': []}
+    for r in range(R):
+        samples = rng.normal(MU, SIGMA, N)
+        saa = saa_solution(samples)
+        cv = cross_validate(samples, epsilons, seed=r)
+        out['saa_train'].append(saa['objective'])
+        out['saa_true'].append(expected_profit(saa['acres'], dist))
+        out['dro_train'].append(cv['solution']['objective'])
+        out['dro_true'].append(expected_profit(cv['solution']['acres'], dist))
+        out['epsilon'].append(cv['epsilon'])
+    return {k: np.array(v) for k, v in out.items()}
+
+
+if __name__ == "__main__":
+    dist = make('normal', mean=MU, std=SIGMA)
+
+    print("="*70)
+    print("模型規模（隨 N 線性成長）與 ε = 0 時和 SAA 擴展式一致")
+    print("="*70)
+    rng = np.random.default_rng(34)
+    for N in (10, 30, 100, 200):
+        samples = rng.normal(MU, SIGMA, N)
+        dro = build_dro_model(samples)
+        result = solve_dro(dro, 0.0)
+        saa = saa_solution(samples)
+        print(f"  N = {N:>4}: {dro['model'].NumVars:>4} 個變數、{dro['model'].NumConstrs:>5} 條限制式；"
+              f"DRO(ε=0) ${result['objective']:,.2f}，SAA ${saa['objective']:,.2f}")
+
+    print("\n" + "="*70)
+    print("單一組 N = 10 的樣本：掃描半徑 ε（同一個模型，只改 λ 的目標係數）")
+    print("="*70)
+    samples = np.random.default_rng(34).normal(MU, SIGMA, 10)
+    dro = build_dro_model(samples)
+    print(f"{'ε':>8} {'最差期望利潤':>14} {'λ':>10} {'小麥':>8} {'玉米':>8} {'甜菜':>8} {'真實期望利潤':>14}")
+    for eps in EPSILONS:
+        r = solve_dro(dro, eps)
+        print(f"{eps:>8.4f} {r['objective']:>14,.2f} {r['lambda']:>10,.0f} "
+              f"{r['acres'][0]:>8.1f} {r['acres'][1]:>8.1f} {r['acres'][2]:>8.1f} "
+              f"{expected_profit(r['acres'], dist):>14,.2f}")
+
+    start = time.perf_counter()
+    dro = build_dro_model(samples)
+    for eps in EPSILONS:
+        solve_dro(dro, eps)
+    reuse = time.perf_counter() - start
+    start = time.perf_counter()
+    for eps in EPSILONS:
+        solve_dro(build_dro_model(samples, eps))
+    rebuild = time.perf_counter() - start
+    print(f"\n掃描 {len(EPSILONS)} 個半徑：重用模型 {reuse * 1000:.1f} ms，每個半徑重建 {rebuild * 1000:.1f} ms")
+
+    cv = cross_validate(samples, seed=34)
+    saa = saa_solution(samples)
+    print(f"\n交叉驗證選到 ε = {cv['epsilon']:.4f}")
+    print(f"  SAA: 訓練目標 ${saa['objective']:,.2f}，真實期望利潤 ${expected_profit(saa['acres'], dist):,.2f}，"
+          f"ε 球內最差 ${worst_case_profit(saa['acres'], samples, cv['epsilon']):,.2f}")
+    print(f"  DRO: 最差期望利潤 ${cv['solution']['objective']:,.2f}，"
+          f"真實期望利潤 ${expected_profit(cv['solution']['acres'], dist):,.2f}")
+
+    print("\n" + "="*70)
+    print("重複實驗：小樣本 SAA 與交叉驗證 DRO 的真實期望利潤（常態 N(1, 0.1) 解析期望）")
+    print("="*70)
+    reference = saa_solution(np.random.default_rng(0).normal(MU, SIGMA, 300))
+    print(f"參考：N = 300 的 SAA，真實期望利潤 ${expected_profit(reference['acres'], dist):,.2f}")
+    for N in (5, 10, 30):
+        start = time.perf_counter()
+        rep = replications(N, seed=34)
+        elapsed = time.perf_counter() - start
+        print(f"\nN = {N}（{len(rep['saa_true'])} 組，{elapsed:.1f} 秒）")
+        for method in ('saa', 'dro'):
+            train, true = rep[f'{method}_train'], rep[f'{method}_true']
+            print(f"  {method.upper()}: 真實期望利潤 ${true.mean():,.2f}（最差組 ${true.min():,.2f}），"
+                  f"訓練目標 ${train.mean():,.2f}，高估 ${np.mean(train - true):,.2f}，"
+                  f"訓練目標 ≤ 真實的比例 {np.mean(train <= true):.0%}")
+        print(f"  選到的 ε 中位數 {np.median(rep['epsilon']):.4f}")
@@ -0,0 +1,217 @@
+"""
+農夫問題共用模組：參數、三情境定義、兩階段模型建構與第二階段利潤的封閉解
+"""
+import gurobipy as gp
+from gurobipy import GRB
+import numpy as np
+
+from solver_cache import apply_tuned_params
+
+TOTAL_LAND = 500
+PLANT_COST = [150, 230, 260]
+DEMAND = [200, 240]
+SELL_PRICE = [170, 150, 36, 10]
+BUY_PRICE = [238, 210]
+AVG_YIELD = [2.5, 3, 20]
+BEET_QUOTA = 6000  # 甜菜高價配額（噸）
+
+# 常態分佈參數（(g)小題）
+MU = 1.0
+SIGMA = 0.1
+
+scenarios = [
+    {'name': '低產量 (-20%)', 'multiplier': 0.8, 'probability': 1/3},
+    {'name': '平均產量 (0%)', 'multiplier': 1.0, 'probability': 1/3},
+    {'name': '高產量 (+20%)', 'multiplier': 1.2, 'probability': 1/3}
+]
+
+
+def build_rp_model(multipliers, probabilities=None, name="RP", tuned=False):
+    """
+    建立兩階段隨機規劃的擴展式（extensive form），每個情境一組交易變數。
+    multipliers 可為長度 S 的共同產量倍數，或 (S, 3) 的各作物產量倍數。
+    回傳 dict：model、x、w、y，以及 profit[s]（情境 s 的總利潤線性式）。
+    目標函數設為期望總利潤。
+    tuned=True 時套用 solver_cache 中同規模的調校參數（只適合求解一次、不再暖啟動的模型）。
+    """
+    multipliers = np.asarray(multipliers, dtype=float)
+    num_scenarios = len(multipliers)
+    crop_mults = crop_multipliers(multipliers)
+    if probabilities is None:
+        probabilities = np.full(num_scenarios, 1 / num_scenarios)
+
+    model = gp.Model(name)
+    model.setParam('OutputFlag', 0)
+    if tuned:
+        apply_tuned_params(model, 3, 2, num_scenarios)
+
+    x = model.addVars(3, name="acres", lb=0)
+    w = {}
+    y = {}
+    for s in range(num_scenarios):
+        w[s] = model.addVars(2, name=f"buy_s{s}", lb=0)
+        y[s] = model.addVars(4, name=f"sell_s{s}", lb=0)
+
+    first_stage = gp.quicksum(PLANT_COST[i] * x[i] for i in range(3))
+    profit = {}
+    for s in range(num_scenarios):
+        second = (SELL_PRICE[0]*y[s][0] + SELL_PRICE[1]*y[s][1] +
+                  SELL_PRICE[2]*y[s][2] + SELL_PRICE[3]*y[s][3] -
+                  BUY_PRICE[0]*w[s][0] - BUY_PRICE[1]*w[s][1])
+        profit[s] = second - first_stage
+
+    model.setObjective(
+        gp.quicksum(probabilities[s] * profit[s] for s in range(num_scenarios)),
+        GRB.MAXIMIZE
+    )
+
+    land = model.addConstr(x[0] + x[1] + x[2] <= TOTAL_LAND, "land")
+
+    balance = {}
+    threshold = {}
+    for s in range(num_scenarios):
+        yield_s = [AVG_YIELD[i] * crop_mults[s, i] for i in range(3)]
+        balance[s] = [
+            model.addConstr(yield_s[0]*x[0] + w[s][0] - y[s][0] >= DEMAND[0], f"wheat_s{s}"),
+            model.addConstr(yield_s[1]*x[1] + w[s][1] - y[s][1] >= DEMAND[1], f"corn_s{s}"),
+            model.addConstr(yield_s[2]*x[2] == y[s][2] + y[s][3], f"beet_s{s}")
+        ]
+        threshold[s] = model.addConstr(y[s][2] <= BEET_QUOTA, f"beet_threshold_s{s}")
+
+    return {
+        'model': model,
+        'x': x,
+        'w': w,
+        'y': y,
+        'profit': profit,
+        'land': land,
+        'balance': balance,
+        'threshold': threshold,
+        'multipliers': multipliers,
+        'probabilities': np.asarray(probabilities, dtype=float)
+    }
+
+
+def default_params():
+    """可在模型上就地修改的參數（apply_params 的預設值）"""
+    return {
+        'TOTAL_LAND': TOTAL_LAND,
+        'PLANT_COST': list(PLANT_COST),
+        'DEMAND': list(DEMAND),
+        'SELL_PRICE': list(SELL_PRICE),
+        'BUY_PRICE': list(BUY_PRICE),
+        'AVG_YIELD': list(AVG_YIELD),
+        'BEET_QUOTA': BEET_QUOTA
+    }
+
+
+def apply_params(rp, params):
+    """
+    就地更新 build_rp_model 建立的模型係數（目標係數、右手邊、產量係數），
+    不重建模型，下一次 optimize 會從目前的基底暖啟動。
+    未指定的參數回到預設值；rp['profit'] 的線性式仍是建構時的係數。
+    """
+    p = {**default_params(), **params}
+    model = rp['model']
+    if model.Params.Crossover == 0:
+        model.setParam('Crossover', -1)  # 調校參數若關掉 crossover 就沒有基底可暖啟動
+    x, w, y = rp['x'], rp['w'], rp['y']
+    probs = rp['probabilities']
+    crop_mults = crop_multipliers(rp['multipliers'])
+    num_scenarios = len(probs)
+
+    obj_vars = [x[i] for i in range(3)]
+    obj_vals = [-p['PLANT_COST'][i] for i in range(3)]
+    for s in range(num_scenarios):
+        obj_vars += [w[s][0], w[s][1], y[s][0], y[s][1], y[s][2], y[s][3]]
+        obj_vals += list(probs[s] * np.array([-p['BUY_PRICE'][0], -p['BUY_PRICE'][1],
+                                              p['SELL_PRICE'][0], p['SELL_PRICE'][1],
+                                              p['SELL_PRICE'][2], p['SELL_PRICE'][3]]))
+    model.setAttr(GRB.Attr.Obj, obj_vars, obj_vals)
+
+    rp['land'].RHS = p['TOTAL_LAND']
+    rhs_constrs = []
+    rhs_vals = []
+    for s in range(num_scenarios):
+        rhs_constrs += [rp['balance'][s][0], rp['balance'][s][1], rp['threshold'][s]]
+        rhs_vals += [p['DEMAND'][0], p['DEMAND'][1], p['BEET_QUOTA']]
+        for i in range(3):
+            model.chgCoeff(rp['balance'][s][i], x[i], p['AVG_YIELD'][i] * crop_mults[s, i])
+    model.setAttr(GRB.Attr.RHS, rhs_constrs, rhs_vals)
+
+
+def crop_multipliers(multipliers):
+    """把共同產量倍數 (S,) 展開成各作物倍數 (S, 3)；已是 (S, 3) 則原樣回傳"""
+    multipliers = np.asarray(multipliers, dtype=float)
+    if multipliers.ndim == 1:
+        return np.repeat(multipliers[:, None], 3, axis=1)
+    return multipliers
+
+
+def recourse_profit(acres, multipliers, params=None):
+    """
+    固定種植面積下的第二階段最佳淨收益（不含種植成本），以封閉解向量化計算。
+    第二階段LP可分解：不足量以購買價補足、剩餘量以銷售價賣出，
+    甜菜在配額內賣高價、超出部分賣低價，因此不需要逐樣本求解LP。
+    multipliers 形狀同 build_rp_model：(S,) 共同倍數或 (S, 3) 各作物倍數。
+    params 可覆寫價格等參數（同 apply_params），省略時使用模組常數。
+    """
+    p = {**default_params(), **params} if params else default_params()
+    avg_yield, demand = p['AVG_YIELD'], p['DEMAND']
+    sell, buy = p['SELL_PRICE'], p['BUY_PRICE']
+
+    acres = np.asarray(acres, dtype=float)
+    mult = np.asarray(multipliers, dtype=float)
+    if mult.ndim == 2:
+        mult = [mult[:, 0], mult[:, 1], mult[:, 2]]
+    else:
+        mult = [mult, mult, mult]
+
+    wheat_net = avg_yield[0] * acres[0] * mult[0] - demand[0]
+    corn_net = avg_yield[1] * acres[1] * mult[1] - demand[1]
+    beet_prod = avg_yield[2] * acres[2] * mult[2]
+
+    wheat = np.where(wheat_net >= 0, sell[0] * wheat_net, buy[0] * wheat_net)
+    corn = np.where(corn_net >= 0, sell[1] * corn_net, buy[1] * corn_net)
+    beet_low = np.minimum(beet_prod, p['BEET_QUOTA'])
+    beet = sell[2] * beet_low + sell[3] * (beet_prod - beet_low)
+
+    return wheat + corn + beet
+
+
+# recourse_decisions 各欄對第二階段淨收益的係數
+DECISION_PRICES = np.array([-BUY_PRICE[0], -BUY_PRICE[1], SELL_PRICE[0], SELL_PRICE[1],
+                            SELL_PRICE[2], SELL_PRICE[3]], dtype=float)
+
+
+def recourse_decisions(acres, multipliers):
+    """
+    封閉解對應的第二階段決策，形狀 (S, 6)：
+    購買小麥、購買玉米、銷售小麥、銷售玉米、銷售甜菜（配額內）、銷售甜菜（超額）
+    """
+    acres = np.asarray(acres, dtype=float)
+    mult = crop_multipliers(np.atleast_1d(multipliers))
+
+    wheat_net = AVG_YIELD[0] * acres[0] * mult[:, 0] - DEMAND[0]
+    corn_net = AVG_YIELD[1] * acres[1] * mult[:, 1] - DEMAND[1]
+    beet_prod = AVG_YIELD[2] * acres[2] * mult[:, 2]
+    beet_low = np.minimum(beet_prod, BEET_QUOTA)
+
+    return np.column_stack([
+        np.maximum(-wheat_net, 0),
+        np.maximum(-corn_net, 0),
+        np.maximum(wheat_net, 0),
+        np.maximum(corn_net, 0),
+        beet_low,
+        beet_prod - beet_low
+    ])
+
+
+def planting_cost(acres, params=None):
+    cost = params.get('PLANT_COST', PLANT_COST) if params else PLANT_COST
+    return sum(cost[i] * acres[i] for i in range(3))
+
+
+def total_profit(acres, multipliers, params=None):
+    """固定種植面積下，各樣本的總利潤（第二階段淨收益 - 種植成本）"""
+    return recourse_profit(acres, multipliers, params) - planting_cost(acres, params)
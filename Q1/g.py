@@ -1,7 +1,7 @@
 import gurobipy as gp
 from gurobipy import GRB
 import numpy as np
-from scipy import stats
+from scipy.special import stdtrit  # t 分佈分位數；比 scipy.stats 少載入約一半的模組
 
 TOTAL_LAND = 500
 PLANT_COST = [150, 230, 260]
@@ -137,7 +137,7 @@ print(f"  最大值: ${np.max(saa_objectives):,.2f}")
 confidence_level = 0.95
 alpha = 1 - confidence_level
 df = M - 1  # 自由度
-t_value = stats.t.ppf(1 - alpha/2, df)
+t_value = stdtrit(df, 1 - alpha/2)
 
 ci_lower_train = saa_mean - t_value * saa_se
 ci_upper_train = saa_mean + t_value * saa_se
@@ -250,7 +250,7 @@ print(f"  最大值: ${np.max(validation_objectives):,.2f}")
 
 # 計算95%信賴區間
 df_val = T - 1
-t_value_val = stats.t.ppf(1 - alpha/2, df_val)
+t_value_val = stdtrit(df_val, 1 - alpha/2)
 
 ci_lower_val = val_mean - t_value_val * val_se
 ci_upper_val = val_mean + t_value_val * val_se
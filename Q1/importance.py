@@ -0,0 +1,131 @@
+"""
+低產量尾端的重要性抽樣（importance sampling）驗證
+
+(g)小題的驗證階段直接從 N(1, 0.1) 抽樣，歉收（需要以 BUY_PRICE 買小麥 / 玉米）的尾端樣本很少。
+這裡改從平移 / 放大的提議分佈 N(μ_q, s·σ) 抽樣，以似然比權重
+  w(ξ) = φ(ξ; MU, SIGMA) / φ(ξ; μ_q, s·σ)
+修正回原分佈，並估計期望利潤、低分位數（VaR）與尾端期望（CVaR）。
+固定種植面積時利潤對 ξ 單調遞增，因此低利潤尾端就是低產量尾端，
+提議分佈的中心放在 ξ 的 α 分位數附近效果最好。
+"""
+import numpy as np
+from scipy import stats
+
+from farmer import MU, SIGMA, scenarios, build_rp_model, total_profit
+from cvar import risk_measures
+
+
+def tail_proposal(alpha, scale=1.0):
+    """中心移到 ξ 的 α 分位數的提議分佈參數 (mean, std)"""
+    return MU + SIGMA * stats.norm.ppf(alpha), SIGMA * scale
+
+
+def likelihood_ratio(samples, proposal_mean, proposal_std):
+    log_w = (stats.norm.logpdf(samples, MU, SIGMA) -
+             stats.norm.logpdf(samples, proposal_mean, proposal_std))
+    return np.exp(log_w)
+
+
+def effective_sample_size(weights):
+    """Kish 有效樣本數 (Σw)² / Σw²"""
+    return weights.sum() ** 2 / np.sum(weights ** 2)
+
+
+def importance_validate(acres, n, proposal_mean, proposal_std, alphas=(0.01, 0.05), rng=None):
+    """
+    從提議分佈抽 n 個樣本評估固定種植面積（第二階段利潤用封閉解，不逐樣本求解LP）。
+    期望利潤給出無偏估計 mean(w·f) 與自我正規化估計 Σwf/Σw。
+    分位數與尾端期望以未正規化權重 w/n 建立左尾的經驗分佈函數：
+    左尾的質量由落在尾端的樣本直接估計，不受上尾大權重樣本影響。
+    """
+    rng = np.random.default_rng(rng)
+    samples = rng.normal(proposal_mean, proposal_std, n)
+    weights = likelihood_ratio(samples, proposal_mean, proposal_std)
+    profits = total_profit(acres, samples)
+
+    wf = weights * profits
+    probs = weights / weights.sum()
+    result = {
+        'n': n,
+        'mean': float(wf.mean()),
+        'mean_se': float(wf.std(ddof=1) / np.sqrt(n)),
+        'self_normalized_mean': float(probs @ profits),
+        'ess': float(effective_sample_size(weights)),
+        'weight_max_share': float(probs.max()),
+        'tail': {}
+    }
+    for alpha in alphas:
+        result['tail'][alpha] = risk_measures(profits, weights / n, alpha)
+    return result
+
+
+def plain_validate(acres, n, alphas=(0.01, 0.05), rng=None):
+    """直接從 N(MU, SIGMA) 抽樣的對照組"""
+    return importance_validate(acres, n, MU, SIGMA, alphas, rng)
+
+
+def compare_estimators(acres, n, alpha, replications=200, scale=1.0, seed=None):
+    """
+    重複估計 VaR_α 與 CVaR_α，比較一般抽樣與重要性抽樣的變異數。
+    變異數比約等於同精度下一般抽樣需要多出的樣本倍數。
+    """
+    rng = np.random.default_rng(seed)
+    proposal = tail_proposal(alpha, scale)
+    plain = {'var': [], 'cvar': []}
+    weighted = {'var': [], 'cvar': []}
+    for _ in range(replications):
+        p = plain_validate(acres, n, (alpha,), rng)['tail'][alpha]
+        w = importance_validate(acres, n, *proposal, (alpha,), rng)['tail'][alpha]
+        for key in ('var', 'cvar'):
+            plain[key].append(p[key])
+            weighted[key].append(w[key])
+    return {
+        key: {
+            'plain_mean': float(np.mean(plain[key])),
+            'plain_std': float(np.std(plain[key], ddof=1)),
+            'is_mean': float(np.mean(weighted[key])),
+            'is_std': float(np.std(weighted[key], ddof=1)),
+            'variance_ratio': float(np.var(plain[key], ddof=1) / np.var(weighted[key], ddof=1))
+        }
+        for key in ('var', 'cvar')
+    }
+
+
+if __name__ == "__main__":
+    rp = build_rp_model([sc['multiplier'] for sc in scenarios],
+                        [sc['probability'] for sc in scenarios])
+    rp['model'].optimize()
+    acres = [rp['x'][i].X for i in range(3)]
+
+    print("="*70)
+    print("重要性抽樣驗證：低產量尾端")
+    print("="*70)
+    print(f"評估種植決策（RP解）: 小麥={acres[0]:.2f}, 玉米={acres[1]:.2f}, 甜菜={acres[2]:.2f}")
+
+    alpha = 0.01
+    n = 2000
+    proposal = tail_proposal(alpha, scale=1.0)
+    print(f"\n提議分佈: N({proposal[0]:.4f}, {proposal[1]:.4f})，樣本數 n={n}")
+
+    r_is = importance_validate(acres, n, *proposal, alphas=(0.01, 0.05), rng=34)
+    r_plain = plain_validate(acres, n, alphas=(0.01, 0.05), rng=34)
+
+    print(f"\n{'':<22}{'一般抽樣':>16}{'重要性抽樣':>16}")
+    print(f"{'期望利潤':<22}${r_plain['mean']:>15,.2f}${r_is['mean']:>15,.2f}")
+    print(f"{'  標準誤':<22}${r_plain['mean_se']:>15,.2f}${r_is['mean_se']:>15,.2f}")
+    print(f"{'有效樣本數 ESS':<22}{r_plain['ess']:>16,.1f}{r_is['ess']:>16,.1f}")
+    for a in (0.01, 0.05):
+        print(f"{f'VaR {a:.0%}':<22}${r_plain['tail'][a]['var']:>15,.2f}${r_is['tail'][a]['var']:>15,.2f}")
+        print(f"{f'CVaR {a:.0%}':<22}${r_plain['tail'][a]['cvar']:>15,.2f}${r_is['tail'][a]['cvar']:>15,.2f}")
+    print("\n註：提議分佈集中在尾端，期望利潤的估計變異較大，應以一般抽樣估計平均值")
+
+    print("\n" + "="*70)
+    print(f"重複 200 次估計 α={alpha:.0%} 尾端（每次 n={n}）")
+    print("="*70)
+    comparison = compare_estimators(acres, n, alpha, replications=200, seed=35)
+    for key, label in (('var', 'VaR'), ('cvar', 'CVaR')):
+        c = comparison[key]
+        print(f"\n{label}:")
+        print(f"  一般抽樣:   ${c['plain_mean']:,.2f} ± {c['plain_std']:,.2f}")
+        print(f"  重要性抽樣: ${c['is_mean']:,.2f} ± {c['is_std']:,.2f}")
+        print(f"  變異數比: {c['variance_ratio']:.1f}（同精度約可少用 {c['variance_ratio']:.0f} 倍樣本）")
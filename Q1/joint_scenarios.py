@@ -0,0 +1,296 @@
+"""
+產量與價格的聯合不確定性：惰性（lazy）笛卡兒積情境產生器
+
+Q1 各小題的 SELL_PRICE、BUY_PRICE 都是常數，但市場價格和產量一樣不確定。
+產量情境與價格情境交叉後情境數會爆炸（例如 100 × 20 × 20 × 25 = 10^6），
+這裡把每個獨立的不確定來源分開表示，乘積只以迭代器逐段產生：
+  - DiscreteSource：有限個水準與機率，可列舉也可抽樣
+  - SampledSource：連續分佈，只能抽樣（例如 N(1, 0.1) 的產量倍數）
+  - ScenarioProduct.chunks()：以 np.unravel_index 把一段連續的情境編號換算成各來源的水準，
+    每段只配置 chunk_size 列的陣列，從不建立完整情境清單
+  - ScenarioProduct.sample()：各來源獨立抽樣，同樣分段產生
+
+每段是一個 dict：'yield' (n, 3)、'SELL_PRICE' (n, 4)、'BUY_PRICE' (n, 2)、'probability' (n,)；
+未指定的欄位使用 farmer 的常數。validate_stream 與 build_joint_rp 逐段消耗這些資料。
+
+小麥、玉米的售價若高於購買價，模型可以無限「買進再賣出」套利（LP 無界），
+chunk_profit 的封閉解也不再成立。各來源獨立取值時水準可能交錯，
+因此每段產生時把這兩種作物的售價截到不超過同情境的購買價。
+"""
+import time
+import tracemalloc
+
+import gurobipy as gp
+from gurobipy import GRB
+import numpy as np
+from scipy import stats
+
+from farmer import (TOTAL_LAND, PLANT_COST, DEMAND, SELL_PRICE, BUY_PRICE, AVG_YIELD, BEET_QUOTA,
+                    MU, SIGMA, scenarios, total_profit)
+from solver_cache import apply_tuned_params
+
+CHUNK_SIZE = 65_536
+DEFAULTS = {
+    'yield': np.ones(3),
+    'SELL_PRICE': np.asarray(SELL_PRICE, dtype=float),
+    'BUY_PRICE': np.asarray(BUY_PRICE, dtype=float)
+}
+
+
+def _source_values(field, values, columns):
+    """整理成 (L, 分量數)；(L,) 視為所有分量共用同一個值（例如三種作物的共同產量倍數）"""
+    columns = list(range(len(DEFAULTS[field]))) if columns is None else list(columns)
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = np.repeat(values[:, None], len(columns), axis=1)
+    if values.shape[1] != len(columns):
+        raise ValueError(f"{field} 的水準寬度 {values.shape[1]} 與欄位 {columns} 不符")
+    return values, list(columns)
+
+
+class DiscreteSource:
+    """
+    一個不確定來源的有限個水準。field 為設定的欄位（'yield'、'SELL_PRICE' 或 'BUY_PRICE'），
+    columns 為設定的分量（例如 SELL_PRICE 的 [1] 只改玉米售價，省略時為整個欄位），
+    values 每列是一個水準。
+    """
+
+    def __init__(self, field, values, probabilities=None, columns=None):
+        self.field = field
+        self.values, self.columns = _source_values(field, values, columns)
+        self.probabilities = (np.full(len(values), 1 / len(values)) if probabilities is None
+                              else np.asarray(probabilities, dtype=float))
+
+    def __len__(self):
+        return len(self.values)
+
+    def sample(self, n, rng):
+        return self.values[rng.choice(len(self.values), size=n, p=self.probabilities)]
+
+
+class SampledSource:
+    """連續分佈的來源；sampler(rng, n) 回傳 (n,) 或 (n, len(columns))"""
+
+    def __init__(self, field, sampler, columns=None):
+        self.field = field
+        self.sampler = sampler
+        self.columns = _source_values(field, np.zeros(0), columns)[1]
+
+    def __len__(self):
+        raise TypeError(f"{self.field} 是連續分佈，無法列舉")
+
+    def sample(self, n, rng):
+        return _source_values(self.field, self.sampler(rng, n), self.columns)[0]
+
+
+class ScenarioProduct:
+    """多個獨立來源的笛卡兒積；情境 k 對應各來源水準的 C 順序（最後一個來源變化最快）"""
+
+    def __init__(self, sources):
+        targets = [(s.field, c) for s in sources for c in s.columns]
+        if len(set(targets)) != len(targets):
+            raise ValueError(f"每個欄位分量只能由一個來源設定: {targets}")
+        self.sources = list(sources)
+
+    @property
+    def shape(self):
+        return tuple(len(s) for s in self.sources)
+
+    def __len__(self):
+        return int(np.prod(self.shape, dtype=np.int64))
+
+    def _chunk(self, values, probability):
+        n = len(probability)
+        chunk = {field: np.broadcast_to(default, (n, len(default))) for field, default in DEFAULTS.items()}
+        for src, value in zip(self.sources, values):
+            if not chunk[src.field].flags.writeable:
+                chunk[src.field] = chunk[src.field].copy()
+            chunk[src.field][:, src.columns] = value
+        buy = chunk['BUY_PRICE']
+        sell = chunk['SELL_PRICE']
+        if (sell[:, :buy.shape[1]] > buy).any():
+            # 售價不得高於購買價，否則買進再賣出可以無限獲利
+            sell = sell.copy() if not sell.flags.writeable else sell
+            np.minimum(sell[:, :buy.shape[1]], buy, out=sell[:, :buy.shape[1]])
+            chunk['SELL_PRICE'] = sell
+        chunk['probability'] = probability
+        return chunk
+
+    def chunks(self, chunk_size=CHUNK_SIZE, start=0, stop=None):
+        """依序列舉情境 [start, stop)，每次產生最多 chunk_size 個"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for s in range(start, stop, chunk_size):
+            index = np.unravel_index(np.arange(s, min(s + chunk_size, stop)), self.shape)
+            values = [src.values[idx] for src, idx in zip(self.sources, index)]
+            probability = np.prod([src.probabilities[idx] for src, idx in zip(self.sources, index)], axis=0)
+            yield self._chunk(values, probability)
+
+    def sample(self, n, rng=None, chunk_size=CHUNK_SIZE):
+        """各來源獨立抽樣 n 個情境（每個機率 1/n），分段產生"""
+        rng = np.random.default_rng(rng)
+        for s in range(0, n, chunk_size):
+            size = min(chunk_size, n - s)
+            values = [src.sample(size, rng) for src in self.sources]
+            yield self._chunk(values, np.full(size, 1 / n))
+
+    def materialize(self, chunk_size=CHUNK_SIZE):
+        """對照組：傳統做法，把所有情境展開成 scenarios 風格的 dict 清單"""
+        result = []
+        for chunk in self.chunks(chunk_size):
+            for k in range(len(chunk['probability'])):
+                result.append({'multiplier': chunk['yield'][k], 'sell_price': chunk['SELL_PRICE'][k],
+                               'buy_price': chunk['BUY_PRICE'][k], 'probability': chunk['probability'][k]})
+        return result
+
+
+def chunk_profit(acres, chunk):
+    """一段情境的總利潤；各價格欄以 (n,) 陣列傳入 total_profit，逐情境廣播"""
+    params = {'SELL_PRICE': list(chunk['SELL_PRICE'].T), 'BUY_PRICE': list(chunk['BUY_PRICE'].T)}
+    return total_profit(acres, chunk['yield'], params)
+
+
+def validate_stream(acres, chunks):
+    """逐段累加期望利潤與二階動差；記憶體只和單段大小有關"""
+    total_prob = 0.0
+    mean = 0.0
+    second = 0.0
+    count = 0
+    for chunk in chunks:
+        profit = chunk_profit(acres, chunk)
+        p = chunk['probability']
+        total_prob += p.sum()
+        mean += p @ profit
+        second += p @ profit ** 2
+        count += len(p)
+    mean /= total_prob
+    return {'scenarios': count, 'mean': mean, 'std': np.sqrt(max(second / total_prob - mean ** 2, 0.0)),
+            'probability': total_prob}
+
+
+def build_joint_rp(chunks, name="Joint_RP", tuned=False):
+    """
+    逐段把情境加入擴展式：每個情境一組交易變數，價格直接寫進該情境變數的目標係數。
+    結構與 build_rp_model 相同（x、w、y、land、balance、threshold），目標為最大化期望利潤。
+    tuned=True 時套用 solver_cache 的調校參數。
+    """
+    model = gp.Model(name)
+    model.setParam('OutputFlag', 0)
+    model.ModelSense = GRB.MAXIMIZE
+
+    x = model.addVars(3, name="acres", lb=0, obj=[-c for c in PLANT_COST])
+    land = model.addConstr(x[0] + x[1] + x[2] <= TOTAL_LAND, "land")
+    w, y, balance, threshold, probabilities = {}, {}, {}, {}, []
+
+    s = 0
+    for chunk in chunks:
+        for k in range(len(chunk['probability'])):
+            p = chunk['probability'][k]
+            sell, buy, mult = chunk['SELL_PRICE'][k], chunk['BUY_PRICE'][k], chunk['yield'][k]
+            w[s] = model.addVars(2, name=f"buy_s{s}", lb=0, obj=list(-p * buy))
+            y[s] = model.addVars(4, name=f"sell_s{s}", lb=0, obj=list(p * sell))
+            yield_s = [AVG_YIELD[i] * mult[i] for i in range(3)]
+            balance[s] = [
+                model.addConstr(yield_s[0]*x[0] + w[s][0] - y[s][0] >= DEMAND[0], f"wheat_s{s}"),
+                model.addConstr(yield_s[1]*x[1] + w[s][1] - y[s][1] >= DEMAND[1], f"corn_s{s}"),
+                model.addConstr(yield_s[2]*x[2] == y[s][2] + y[s][3], f"beet_s{s}")
+            ]
+            threshold[s] = model.addConstr(y[s][2] <= BEET_QUOTA, f"beet_threshold_s{s}")
+            probabilities.append(p)
+            s += 1
+
+    if tuned:
+        apply_tuned_params(model, 3, 2, s)
+    return {
+        'model': model,
+        'x': x,
+        'w': w,
+        'y': y,
+        'land': land,
+        'balance': balance,
+        'threshold': threshold,
+        'probabilities': np.array(probabilities)
+    }
+
+
+def solve_joint_rp(chunks, name="Joint_RP"):
+    rp = build_joint_rp(chunks, name, tuned=True)
+    rp['model'].optimize()
+    return {'acres': [rp['x'][i].X for i in range(3)], 'objective': rp['model'].objVal,
+            'scenarios': len(rp['probabilities'])}
+
+
+def normal_levels(num_levels, mean, std):
+    """常態分佈的等機率離散化：各格的中位數"""
+    q = (np.arange(num_levels) + 0.5) / num_levels
+    return mean + std * stats.norm.ppf(q)
+
+
+def memory_benchmark(product, acres, chunk_size=CHUNK_SIZE):
+    """比較串流驗證與先展開成清單再驗證的時間與尖峰記憶體（tracemalloc）"""
+    results = {}
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    streamed = validate_stream(acres, product.chunks(chunk_size))
+    results['stream'] = {'seconds': time.perf_counter() - start, 'peak': tracemalloc.get_traced_memory()[1],
+                         'mean': streamed['mean']}
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    full = product.materialize(chunk_size)
+    chunk = {'yield': np.array([sc['multiplier'] for sc in full]),
+             'SELL_PRICE': np.array([sc['sell_price'] for sc in full]),
+             'BUY_PRICE': np.array([sc['buy_price'] for sc in full])}
+    mean = np.array([sc['probability'] for sc in full]) @ chunk_profit(acres, chunk)
+    results['list'] = {'seconds': time.perf_counter() - start, 'peak': tracemalloc.get_traced_memory()[1],
+                       'mean': mean}
+    tracemalloc.stop()
+    del full
+    return results
+
+
+if __name__ == "__main__":
+    yields = DiscreteSource('yield', [sc['multiplier'] for sc in scenarios],
+                            [sc['probability'] for sc in scenarios])
+    wheat_price = DiscreteSource('SELL_PRICE', [150, 170, 190], columns=[0])
+    corn_price = DiscreteSource('SELL_PRICE', [120, 135, 150, 165, 180], columns=[1])
+    buy_price = DiscreteSource('BUY_PRICE', [[238, 210], [260, 230]], [0.7, 0.3])
+    product = ScenarioProduct([yields, wheat_price, corn_price, buy_price])
+
+    print("="*70)
+    print(f"產量 × 價格 RP：{' × '.join(map(str, product.shape))} = {len(product)} 個情境")
+    print("="*70)
+    joint = solve_joint_rp(product.chunks())
+    fixed = solve_joint_rp(ScenarioProduct([yields]).chunks())
+    print(f"聯合不確定性 RP: 小麥={joint['acres'][0]:.2f}, 玉米={joint['acres'][1]:.2f}, "
+          f"甜菜={joint['acres'][2]:.2f}，期望利潤 ${joint['objective']:,.2f}")
+    print(f"固定價格 RP:     小麥={fixed['acres'][0]:.2f}, 玉米={fixed['acres'][1]:.2f}, "
+          f"甜菜={fixed['acres'][2]:.2f}，期望利潤 ${fixed['objective']:,.2f}")
+    print(f"固定價格 RP 的解在聯合情境下: ${validate_stream(fixed['acres'], product.chunks())['mean']:,.2f}")
+
+    print("\n" + "="*70)
+    print("SAA：N(1, 0.1) 產量 × 離散價格，逐段抽樣")
+    print("="*70)
+    sampled = ScenarioProduct([SampledSource('yield', lambda rng, n: rng.normal(MU, SIGMA, n)),
+                               wheat_price, corn_price, buy_price])
+    rng = np.random.default_rng(34)
+    batches = [solve_joint_rp(sampled.sample(200, rng, chunk_size=64), name=f"SAA_batch_{m+1}") for m in range(10)]
+    best = max(batches, key=lambda b: b['objective'])
+    validation = validate_stream(best['acres'], sampled.sample(2_000_000, rng))
+    print(f"最佳解: 小麥={best['acres'][0]:.2f}, 玉米={best['acres'][1]:.2f}, 甜菜={best['acres'][2]:.2f}")
+    print(f"驗證（{validation['scenarios']:,} 個抽樣情境）: ${validation['mean']:,.2f}（標準差 ${validation['std']:,.2f}）")
+
+    print("\n" + "="*70)
+    print("記憶體：10^6 個列舉情境（100 產量 × 20 小麥價 × 20 玉米價 × 25 購買價）")
+    print("="*70)
+    big = ScenarioProduct([
+        DiscreteSource('yield', normal_levels(100, MU, SIGMA)),
+        DiscreteSource('SELL_PRICE', normal_levels(20, 170, 15), columns=[0]),
+        DiscreteSource('SELL_PRICE', normal_levels(20, 150, 15), columns=[1]),
+        DiscreteSource('BUY_PRICE', np.column_stack([normal_levels(25, 238, 20), normal_levels(25, 210, 20)]))
+    ])
+    r = memory_benchmark(big, best['acres'])
+    for key, label in (('stream', '串流（分段列舉）'), ('list', '展開成清單')):
+        print(f"{label:<12}: {r[key]['seconds']:6.2f} 秒，尖峰記憶體 {r[key]['peak'] / 2**20:8.1f} MiB，"
+              f"期望利潤 ${r[key]['mean']:,.2f}")
@@ -0,0 +1,315 @@
+"""
+資料驅動的 N 種作物、K 段價格級距農夫問題
+
+a.py ~ g.py 的模型寫死三種作物與一個甜菜價格斷點（x1, x2, x3、y[s,0..3]）。
+這裡從 JSON 資料檔讀入每種作物的種植成本、產量、需求、購買價與分段銷售級距，
+EV、EEV、RP、WS、SAA 都以向量化方式一次組出 scipy.sparse 限制矩陣，再用 addMVar / addMConstr 建模，
+建構時間與「作物數 × 級距數 × 情境數」成線性關係（不逐一呼叫 addVar / addConstr）。
+
+資料檔格式（見 data/farmer3.json）：
+  {"total_land": 500,
+   "crops": [{"name": "beet", "plant_cost": 260, "yield": 20, "demand": 0, "buy_price": null,
+              "sell_tiers": [{"price": 36, "limit": 6000}, {"price": 10, "limit": null}]}, ...]}
+buy_price 為 null 表示不能購買；sell_tiers 的 limit 是該級距可銷售的數量，null 表示無上限，
+價格須逐段遞減（超過配額的部分只能以較低價格賣出）。
+
+變數順序 z = [x, w_1, y_1, ..., w_S, y_S]（WS 模型則每個情境各有自己的 x）：
+  x (N)：種植面積，w_s (N)：購買量，y_s (N, K)：各級距銷售量
+"""
+import json
+import os
+import time
+
+import gurobipy as gp
+from gurobipy import GRB
+import numpy as np
+import scipy.sparse as sp
+from scipy import stats
+
+from farmer import MU, SIGMA, scenarios
+from solver_cache import apply_tuned_params
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def load_instance(path):
+    with open(path, encoding='utf-8') as f:
+        return parse_instance(json.load(f))
+
+
+def parse_instance(data):
+    """JSON 資料轉成陣列；級距不足 K 段的作物補上寬度 0 的級距"""
+    crops = data['crops']
+    num_tiers = max(len(c['sell_tiers']) for c in crops)
+    tier_price = np.zeros((len(crops), num_tiers))
+    tier_width = np.zeros((len(crops), num_tiers))
+    for i, crop in enumerate(crops):
+        prices = [t['price'] for t in crop['sell_tiers']]
+        if any(b > a for a, b in zip(prices, prices[1:])):
+            raise ValueError(f"作物 {crop['name']} 的級距價格必須逐段遞減: {prices}")
+        for k, tier in enumerate(crop['sell_tiers']):
+            tier_price[i, k] = tier['price']
+            tier_width[i, k] = np.inf if tier['limit'] is None else tier['limit']
+    return {
+        'name': data.get('name', ''),
+        'total_land': float(data['total_land']),
+        'crops': [c['name'] for c in crops],
+        'plant_cost': np.array([c['plant_cost'] for c in crops], dtype=float),
+        'yield': np.array([c['yield'] for c in crops], dtype=float),
+        'demand': np.array([c.get('demand', 0) for c in crops], dtype=float),
+        'buy_price': np.array([np.nan if c.get('buy_price') is None else c['buy_price'] for c in crops]),
+        'tier_price': tier_price,
+        'tier_width': tier_width
+    }
+
+
+def synthetic_instance(num_crops, num_tiers, seed=None):
+    """隨機產生的 N 作物、K 級距實例（格式同資料檔），用於規模測試"""
+    rng = np.random.default_rng(seed)
+    crops = []
+    for i in range(num_crops):
+        yield_i = rng.uniform(2, 25)
+        cost = rng.uniform(100, 300)
+        base_price = cost / yield_i * rng.uniform(1.2, 2.0)
+        prices = base_price * np.cumprod(np.r_[1.0, rng.uniform(0.4, 0.9, num_tiers - 1)])
+        limits = rng.uniform(50, 400, num_tiers - 1) * yield_i
+        # 有需求（飼料）的作物一定可以購買，否則產量不足時第二階段不可行
+        purchasable = rng.random() < 0.7
+        crops.append({
+            'name': f"crop{i + 1}",
+            'plant_cost': round(cost, 2),
+            'yield': round(yield_i, 3),
+            'demand': round(rng.uniform(0, 80) * yield_i, 1) if purchasable and rng.random() < 0.7 else 0,
+            'buy_price': round(base_price * rng.uniform(1.2, 1.6), 2) if purchasable else None,
+            'sell_tiers': [{'price': round(p, 2), 'limit': None if k == num_tiers - 1 else round(limits[k], 1)}
+                           for k, p in enumerate(prices)]
+        })
+    return {'name': f"synthetic {num_crops}x{num_tiers}", 'total_land': 50 * num_crops, 'crops': crops}
+
+
+def crop_multipliers(instance, multipliers):
+    """(S,) 共同倍數或 (S, N) 各作物倍數 → (S, N)"""
+    multipliers = np.asarray(multipliers, dtype=float)
+    if multipliers.ndim == 1:
+        return np.repeat(multipliers[:, None], len(instance['crops']), axis=1)
+    return multipliers
+
+
+def build_model(instance, multipliers, probabilities=None, shared_first_stage=True, fixed_acres=None,
+                name="RP", tuned=False):
+    """
+    向量化組出擴展式。shared_first_stage=False 時每個情境各有自己的 x（WS 模型，
+    目標值即 Σ p_s × 情境 s 的最佳利潤）；fixed_acres 固定種植面積（EEV）。
+    回傳 dict：model、z（MVar）、x_idx / w_idx / y_idx（z 中的索引）、multipliers、probabilities。
+    tuned=True 時套用 solver_cache 中 multicrop 同規模的調校參數。
+    """
+    mults = crop_multipliers(instance, multipliers)
+    S, N = mults.shape
+    K = instance['tier_price'].shape[1]
+    if probabilities is None:
+        probabilities = np.full(S, 1 / S)
+    probabilities = np.asarray(probabilities, dtype=float)
+
+    num_x = N if shared_first_stage else S * N
+    per_scenario = N + N * K
+    num_vars = num_x + S * per_scenario
+
+    # 變數索引
+    x_idx = np.arange(num_x).reshape(-1, N)                    # (1 或 S, N)
+    base = num_x + np.arange(S)[:, None] * per_scenario         # (S, 1)
+    w_idx = base + np.arange(N)                                 # (S, N)
+    y_idx = (base + N + np.arange(N * K)).reshape(S, N, K)      # (S, N, K)
+
+    # 目標函數（最大化）
+    c = np.zeros(num_vars)
+    x_weight = np.ones((1, 1)) if shared_first_stage else probabilities[:, None]
+    c[x_idx] = -instance['plant_cost'] * x_weight
+    buy = np.nan_to_num(instance['buy_price'], nan=0.0)
+    c[w_idx] = -probabilities[:, None] * buy
+    c[y_idx] = probabilities[:, None, None] * instance['tier_price']
+
+    # 上下界：不能購買的作物 w = 0；銷售量不超過級距寬度
+    lb = np.zeros(num_vars)
+    ub = np.full(num_vars, np.inf)
+    ub[w_idx] = np.where(np.isnan(instance['buy_price']), 0.0, np.inf)
+    ub[y_idx] = instance['tier_width']
+    if fixed_acres is not None:
+        lb[x_idx] = ub[x_idx] = np.asarray(fixed_acres, dtype=float)
+
+    # 平衡限制式（每情境每作物一列）：yield·ξ·x + w - Σ_k y ≥ demand
+    bal_rows = np.arange(S * N).reshape(S, N)
+    x_cols = np.broadcast_to(x_idx, (S, N))
+    rows = np.concatenate([bal_rows.ravel(), bal_rows.ravel(), np.repeat(bal_rows.ravel(), K)])
+    cols = np.concatenate([x_cols.ravel(), w_idx.ravel(), y_idx.ravel()])
+    vals = np.concatenate([(instance['yield'] * mults).ravel(), np.ones(S * N), -np.ones(S * N * K)])
+    sense = np.full(S * N, '>')
+    rhs = np.tile(instance['demand'], S)
+
+    # 土地限制式（共用 x 時一列，WS 時每情境一列）
+    land_rows = S * N + np.arange(x_idx.shape[0])
+    rows = np.concatenate([rows, np.repeat(land_rows, N)])
+    cols = np.concatenate([cols, x_idx.ravel()])
+    vals = np.concatenate([vals, np.ones(x_idx.size)])
+    sense = np.concatenate([sense, np.full(len(land_rows), '<')])
+    rhs = np.concatenate([rhs, np.full(len(land_rows), instance['total_land'])])
+
+    A = sp.csr_matrix((vals, (rows, cols)), shape=(len(rhs), num_vars))
+
+    model = gp.Model(name)
+    model.setParam('OutputFlag', 0)
+    if tuned:
+        apply_tuned_params(model, N, K, S, family='multicrop')
+    z = model.addMVar(num_vars, lb=lb, ub=ub, name="z")
+    model.addMConstr(A, z, sense, rhs)
+    model.setObjective(c @ z, GRB.MAXIMIZE)
+
+    return {
+        'model': model,
+        'z': z,
+        'x_idx': x_idx,
+        'w_idx': w_idx,
+        'y_idx': y_idx,
+        'multipliers': mults,
+        'probabilities': probabilities
+    }
+
+
+def solve(built):
+    built['model'].optimize()
+    z = built['z'].X
+    return {
+        'objective': built['model'].objVal,
+        'acres': z[built['x_idx']].squeeze(0) if built['x_idx'].shape[0] == 1 else z[built['x_idx']],
+        'buy': z[built['w_idx']],
+        'sell': z[built['y_idx']]
+    }
+
+
+def recourse_profit(instance, acres, multipliers):
+    """
+    固定種植面積下的第二階段最佳淨收益，(S,)。每種作物可分開處理：
+    不足量以購買價補足（不能購買時為 -inf，表示不可行），剩餘量依級距由高價往低價賣出。
+    """
+    mults = crop_multipliers(instance, multipliers)
+    net = instance['yield'] * np.asarray(acres, dtype=float) * mults - instance['demand']   # (S, N)
+    deficit = np.maximum(-net, 0)
+    buy = np.where(np.isnan(instance['buy_price']), np.inf, instance['buy_price'])
+    with np.errstate(invalid='ignore'):
+        buy_cost = np.where(deficit > 0, deficit * buy, 0.0)
+
+    surplus = np.maximum(net, 0)[:, :, None]
+    width = instance['tier_width']
+    start = np.concatenate([np.zeros((width.shape[0], 1)), np.cumsum(width, axis=1)[:, :-1]], axis=1)
+    sold = np.clip(surplus - start, 0, width)
+    revenue = np.einsum('snk,nk->s', sold, instance['tier_price'])
+    return revenue - buy_cost.sum(axis=1)
+
+
+def total_profit(instance, acres, multipliers):
+    return recourse_profit(instance, acres, multipliers) - instance['plant_cost'] @ np.asarray(acres, dtype=float)
+
+
+def ev_solution(instance, mean=1.0):
+    return solve(build_model(instance, [mean], name="EV"))
+
+
+def eev(instance, acres, multipliers, probabilities=None):
+    """以 LP 評估固定的種植面積（與封閉解 total_profit 相同）"""
+    return solve(build_model(instance, multipliers, probabilities, fixed_acres=acres, name="EEV"))['objective']
+
+
+def rp_solution(instance, multipliers, probabilities=None, tuned=False):
+    return solve(build_model(instance, multipliers, probabilities, name="RP", tuned=tuned))
+
+
+def ws_value(instance, multipliers, probabilities=None):
+    return solve(build_model(instance, multipliers, probabilities, shared_first_stage=False, name="WS"))['objective']
+
+
+def saa(instance, M, N, N_bar, T, rng=None, mean=MU, std=SIGMA, tuned=False):
+    """
+    SAA：M 批 N 個樣本各求解一次，以最佳目標值的解做 T 批 N_bar 個樣本的封閉解驗證。
+    回傳最佳解、訓練 / 驗證的平均與 95% 信賴區間。tuned 同 build_model。
+    """
+    rng = np.random.default_rng(rng)
+    num_crops = len(instance['crops'])
+    batches = [solve(build_model(instance, rng.normal(mean, std, (N, num_crops)), name=f"SAA_batch_{m+1}",
+                                 tuned=tuned))
+               for m in range(M)]
+    objectives = np.array([b['objective'] for b in batches])
+    best = batches[int(np.argmax(objectives))]
+    validation = np.array([total_profit(instance, best['acres'], rng.normal(mean, std, (N_bar, num_crops))).mean()
+                           for _ in range(T)])
+
+    def interval(values):
+        se = values.std(ddof=1) / np.sqrt(len(values))
+        t = stats.t.ppf(0.975, len(values) - 1)
+        return values.mean(), (values.mean() - t * se, values.mean() + t * se)
+
+    return {'acres': best['acres'], 'train': interval(objectives), 'validation': interval(validation)}
+
+
+def build_benchmark(sizes, seed=None):
+    """只建構模型（不求解），量測建構時間與「作物 × 級距 × 情境」的比例"""
+    rng = np.random.default_rng(seed)
+    results = []
+    for N, K, S in sizes:
+        instance = parse_instance(synthetic_instance(N, K, seed=seed))
+        mults = rng.normal(MU, SIGMA, (S, N))
+        start = time.perf_counter()
+        built = build_model(instance, mults)
+        built['model'].update()
+        elapsed = time.perf_counter() - start
+        results.append({'crops': N, 'tiers': K, 'scenarios': S, 'vars': built['model'].NumVars,
+                        'seconds': elapsed, 'us_per_cell': elapsed / (N * K * S) * 1e6})
+        built['model'].dispose()
+    return results
+
+
+if __name__ == "__main__":
+    instance = load_instance(os.path.join(DATA_DIR, "farmer3.json"))
+    mults = [sc['multiplier'] for sc in scenarios]
+    probs = [sc['probability'] for sc in scenarios]
+
+    print("="*70)
+    print(f"資料檔實例：{instance['name']}")
+    print("="*70)
+    ev = ev_solution(instance)
+    rp = rp_solution(instance, mults, probs, tuned=True)
+    EEV = eev(instance, ev['acres'], mults, probs)
+    WS = ws_value(instance, mults, probs)
+    for label, acres in (('EV', ev['acres']), ('RP', rp['acres'])):
+        print(f"{label} 解: " + ", ".join(f"{n}={a:.2f}" for n, a in zip(instance['crops'], acres)))
+    print(f"EV = ${ev['objective']:,.2f}")
+    print(f"EEV = ${EEV:,.2f}（封閉解 ${np.dot(probs, total_profit(instance, ev['acres'], mults)):,.2f}）")
+    print(f"RP = ${rp['objective']:,.2f}")
+    print(f"WS = ${WS:,.2f}")
+    print(f"EVPI = ${WS - rp['objective']:,.2f}，VSS = ${rp['objective'] - EEV:,.2f}")
+
+    print("\n" + "="*70)
+    print("SAA（各作物產量獨立 N(1, 0.1)）")
+    print("="*70)
+    result = saa(instance, M=15, N=30, N_bar=1000, T=15, rng=34, tuned=True)
+    print("最佳解: " + ", ".join(f"{n}={a:.2f}" for n, a in zip(instance['crops'], result['acres'])))
+    for key, label in (('train', '訓練目標值'), ('validation', '驗證期望利潤')):
+        mean, ci = result[key]
+        print(f"{label}: ${mean:,.2f}（95% CI [${ci[0]:,.2f}, ${ci[1]:,.2f}]）")
+
+    print("\n" + "="*70)
+    print("合成實例：30 種作物、3 段級距")
+    print("="*70)
+    big = parse_instance(synthetic_instance(30, 3, seed=34))
+    samples = np.random.default_rng(35).normal(MU, SIGMA, (12, 30))
+    rp = rp_solution(big, samples, tuned=True)
+    EEV = eev(big, ev_solution(big)['acres'], samples)
+    print(f"RP = ${rp['objective']:,.2f}，EEV = ${EEV:,.2f}，VSS = ${rp['objective'] - EEV:,.2f}，"
+          f"種植 {np.sum(rp['acres'] > 1e-6)} 種作物")
+
+    print("\n" + "="*70)
+    print("建構時間（向量化組裝，不求解）")
+    print("="*70)
+    print(f"\n{'作物':>6} {'級距':>6} {'情境':>8} {'變數數':>12} {'秒':>8} {'μs/(N·K·S)':>12}")
+    for r in build_benchmark([(10, 3, 1000), (20, 3, 1000), (40, 3, 1000), (40, 5, 1000), (40, 5, 4000)],
+                             seed=34):
+        print(f"{r['crops']:>6} {r['tiers']:>6} {r['scenarios']:>8,} {r['vars']:>12,} "
+              f"{r['seconds']:>8.3f} {r['us_per_cell']:>12.3f}")
@@ -0,0 +1,399 @@
+"""
+共享市場的多農場 RP 與價格分解（Lagrangian 對偶）
+
+d.py 的模型只有一個農場。實際上數百個農場共用同一個小麥、玉米市場與甜菜高價配額：
+每個農場有自己的土地、種植成本、產量與飼料需求，但在每個情境 s 下
+  Σ_f 小麥銷售量 ≤ wheat_cap、Σ_f 玉米銷售量 ≤ corn_cap、Σ_f 配額內甜菜 ≤ quota
+（超過市場容量的剩餘作物賣不掉；農場之間不互相調撥）。
+
+價格分解：對上面三組連結限制放寬，乘數 λ[s, k] ≥ 0 相當於市場容量的「影子價格」，
+每個農場以 (銷售價 - λ) 各自求解 d.py 形式的小模型，彼此獨立、可分散到 worker 平行求解。
+對偶函數 L(λ) = Σ_f V_f(λ) + Σ_s p_s Σ_k λ[s, k]·cap_k 是原問題的上界，
+以近端 bundle 法（proximal bundle，主問題為小型 QP）將 L(λ) 最小化。
+主問題中切平面的對偶權重給出各次農場解的凸組合，作為原問題的種植面積；
+固定面積後第二階段在農場總量上有封閉解（見 primal_value），得到下界與對偶間隙。
+
+每個 worker 是只有一個行程的 ProcessPoolExecutor（同 whatif_service），
+負責固定的一組農場並常駐其模型，每次迭代只改銷售變數的目標係數後暖啟動。
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import gurobipy as gp
+from gurobipy import GRB
+import numpy as np
+
+from farmer import (TOTAL_LAND, PLANT_COST, DEMAND, SELL_PRICE, BUY_PRICE, AVG_YIELD, BEET_QUOTA,
+                    scenarios)
+
+RESOURCES = ['wheat_cap', 'corn_cap', 'quota']
+# λ 的上界：超過銷售價（甜菜為兩段價差）後，放寬的銷售變數已經不會被使用
+LAMBDA_UB = np.array([SELL_PRICE[0], SELL_PRICE[1], SELL_PRICE[2] - SELL_PRICE[3]], dtype=float)
+
+
+def synthetic_farms(num_farms, seed=None, spread=0.15):
+    """
+    產生 num_farms 個異質農場：土地 250~750 英畝，種植成本與平均產量各 ±spread，
+    飼料需求與土地面積成正比（500 英畝的農場需求同 d.py）
+    """
+    rng = np.random.default_rng(seed)
+    land = rng.uniform(0.5, 1.5, num_farms) * TOTAL_LAND
+    return {
+        'land': land,
+        'plant_cost': np.asarray(PLANT_COST, dtype=float) * rng.uniform(1 - spread, 1 + spread, (num_farms, 3)),
+        'yield': np.asarray(AVG_YIELD, dtype=float) * rng.uniform(1 - spread, 1 + spread, (num_farms, 3)),
+        'demand': np.asarray(DEMAND, dtype=float) * (land / TOTAL_LAND)[:, None],
+    }
+
+
+def farm_multipliers(num_farms, common=None, noise=0.05, seed=None):
+    """
+    各農場在各情境的產量倍數 (S, F, 3)：共同天氣倍數（預設 d.py 的三情境）乘上農場自身的雜訊
+    """
+    common = np.asarray([sc['multiplier'] for sc in scenarios] if common is None else common, dtype=float)
+    rng = np.random.default_rng(seed)
+    local = rng.normal(1.0, noise, (len(common), num_farms, 3))
+    return np.maximum(common[:, None, None] * local, 0.0)
+
+
+def default_market(num_farms, wheat_per_farm=150, corn_per_farm=60, quota=None):
+    """
+    市場容量：小麥、玉米按農場數給每農場平均的可銷售量；
+    甜菜配額預設為 d.py 的 6000 噸由每兩個農場共用一份
+    """
+    return {
+        'wheat_cap': wheat_per_farm * num_farms,
+        'corn_cap': corn_per_farm * num_farms,
+        'quota': BEET_QUOTA * num_farms / 2 if quota is None else quota,
+    }
+
+
+def _capacity(market):
+    return np.array([market[k] for k in RESOURCES], dtype=float)
+
+
+# ============================================================================
+# 單一農場子問題
+# ============================================================================
+def build_farm_model(land, plant_cost, crop_yield, demand, multipliers, probabilities, name="Farm"):
+    """
+    d.py 形式的單一農場 RP，但不含甜菜配額（已放寬到市場層級）。
+    multipliers 為 (S, 3)；y[s] 為小麥、玉米、配額內甜菜、超額甜菜的銷售量。
+    """
+    S = len(multipliers)
+    model = gp.Model(name)
+    model.setParam('OutputFlag', 0)
+    x = model.addVars(3, name="acres", lb=0)
+    w = {s: model.addVars(2, name=f"buy_s{s}", lb=0) for s in range(S)}
+    y = {s: model.addVars(4, name=f"sell_s{s}", lb=0) for s in range(S)}
+
+    model.setObjective(
+        gp.quicksum(probabilities[s] * (gp.quicksum(SELL_PRICE[k] * y[s][k] for k in range(4)) -
+                                        BUY_PRICE[0] * w[s][0] - BUY_PRICE[1] * w[s][1])
+                    for s in range(S)) -
+        gp.quicksum(plant_cost[i] * x[i] for i in range(3)),
+        GRB.MAXIMIZE
+    )
+    model.addConstr(x[0] + x[1] + x[2] <= land, "land")
+    for s in range(S):
+        yield_s = [crop_yield[i] * multipliers[s][i] for i in range(3)]
+        model.addConstr(yield_s[0] * x[0] + w[s][0] - y[s][0] >= demand[0], f"wheat_s{s}")
+        model.addConstr(yield_s[1] * x[1] + w[s][1] - y[s][1] >= demand[1], f"corn_s{s}")
+        model.addConstr(yield_s[2] * x[2] == y[s][2] + y[s][3], f"beet_s{s}")
+
+    linked = [y[s][k] for s in range(S) for k in range(3)]
+    return {'model': model, 'x': x, 'linked': linked,
+            'base_obj': np.repeat(probabilities, 3) * np.tile(SELL_PRICE[:3], S),
+            'probabilities': np.asarray(probabilities, dtype=float)}
+
+
+def solve_farm(farm, lam):
+    """以 λ 調整銷售變數的目標係數後暖啟動；回傳 (V_f(λ), 種植面積, 市場使用量 (S, 3))"""
+    prob = np.repeat(farm['probabilities'], 3)
+    farm['model'].setAttr('Obj', farm['linked'], (farm['base_obj'] - prob * lam.ravel()).tolist())
+    farm['model'].optimize()
+    usage = np.array(farm['model'].getAttr('X', farm['linked'])).reshape(-1, 3)
+    return farm['model'].objVal, [farm['x'][i].X for i in range(3)], usage
+
+
+def build_farm_models(farms, multipliers, probabilities, index=None):
+    index = range(len(farms['land'])) if index is None else index
+    return [build_farm_model(farms['land'][f], farms['plant_cost'][f], farms['yield'][f], farms['demand'][f],
+                             multipliers[:, f, :], probabilities, name=f"Farm_{f}") for f in index]
+
+
+def solve_farms(models, lam):
+    """一組農場：回傳 (Σ V_f, 各農場面積 (n, 3), Σ 使用量 (S, 3))"""
+    total = 0.0
+    acres = np.empty((len(models), 3))
+    usage = 0.0
+    for i, farm in enumerate(models):
+        value, acres[i], used = solve_farm(farm, lam)
+        total += value
+        usage = usage + used
+    return total, acres, usage
+
+
+# worker 行程內常駐的農場模型
+_worker_models = []
+
+
+def _init_worker(farms, multipliers, probabilities, index):
+    _worker_models.extend(build_farm_models(farms, multipliers, probabilities, index))
+
+
+def _solve_worker(lam):
+    return solve_farms(_worker_models, lam)
+
+
+class FarmPool:
+    """
+    把農場平均分給 num_workers 個常駐 worker；num_workers=0 時在本行程內求解。
+    evaluate(λ) 回傳 (Σ_f V_f(λ), 全部農場面積 (F, 3), 總使用量 (S, 3))。
+    """
+    def __init__(self, farms, multipliers, probabilities, num_workers=0):
+        num_farms = len(farms['land'])
+        self.chunks = [c for c in np.array_split(np.arange(num_farms), max(num_workers, 1)) if len(c)]
+        if num_workers:
+            self.executors = []
+            for chunk in self.chunks:
+                part = {k: v[chunk] for k, v in farms.items()}
+                self.executors.append(ProcessPoolExecutor(
+                    1, initializer=_init_worker,
+                    initargs=(part, multipliers[:, chunk, :], probabilities, None)))
+            self.models = None
+        else:
+            self.executors = []
+            self.models = build_farm_models(farms, multipliers, probabilities)
+
+    def evaluate(self, lam):
+        if self.models is not None:
+            return solve_farms(self.models, lam)
+        futures = [ex.submit(_solve_worker, lam) for ex in self.executors]
+        parts = [f.result() for f in futures]
+        return (sum(p[0] for p in parts), np.vstack([p[1] for p in parts]), sum(p[2] for p in parts))
+
+    def close(self):
+        for ex in self.executors:
+            ex.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ============================================================================
+# 原問題：固定面積後的封閉解、擴展式
+# ============================================================================
+def primal_value(farms, acres, multipliers, probabilities, market):
+    """
+    固定各農場面積 (F, 3) 時的期望總利潤。農場各自以購買補足需求，
+    剩餘的小麥、玉米合計最多賣到市場容量，甜菜合計最多 quota 以高價賣出、其餘以低價賣出。
+    """
+    acres = np.asarray(acres, dtype=float)
+    production = farms['yield'] * acres * multipliers                  # (S, F, 3)
+    net = production[:, :, :2] - farms['demand']                        # (S, F, 2)
+    buy = np.maximum(-net, 0).sum(axis=1) @ np.asarray(BUY_PRICE, dtype=float)
+    surplus = np.maximum(net, 0).sum(axis=1)                            # (S, 2)
+    sold = np.minimum(surplus, [market['wheat_cap'], market['corn_cap']])
+    beet = production[:, :, 2].sum(axis=1)
+    beet_low = np.minimum(beet, market['quota'])
+    second = (sold @ np.asarray(SELL_PRICE[:2], dtype=float) - buy +
+              SELL_PRICE[2] * beet_low + SELL_PRICE[3] * (beet - beet_low))
+    return float(np.asarray(probabilities) @ second - np.sum(farms['plant_cost'] * acres))
+
+
+def build_multifarm_model(farms, multipliers, probabilities, market, name="MultiFarm_RP"):
+    """連結限制不放寬的擴展式，用來驗證分解結果（農場數多時會超過 Gurobi 受限授權的規模）"""
+    S, F = multipliers.shape[:2]
+    model = gp.Model(name)
+    model.setParam('OutputFlag', 0)
+    x = model.addVars(F, 3, name="acres", lb=0)
+    w = model.addVars(S, F, 2, name="buy", lb=0)
+    y = model.addVars(S, F, 4, name="sell", lb=0)
+    model.setObjective(
+        gp.quicksum(probabilities[s] * (gp.quicksum(SELL_PRICE[k] * y[s, f, k] for f in range(F) for k in range(4)) -
+                                        gp.quicksum(BUY_PRICE[k] * w[s, f, k] for f in range(F) for k in range(2)))
+                    for s in range(S)) -
+        gp.quicksum(farms['plant_cost'][f, i] * x[f, i] for f in range(F) for i in range(3)),
+        GRB.MAXIMIZE
+    )
+    for f in range(F):
+        model.addConstr(x.sum(f, '*') <= farms['land'][f], f"land_{f}")
+        for s in range(S):
+            yield_s = farms['yield'][f] * multipliers[s, f]
+            model.addConstr(yield_s[0] * x[f, 0] + w[s, f, 0] - y[s, f, 0] >= farms['demand'][f, 0])
+            model.addConstr(yield_s[1] * x[f, 1] + w[s, f, 1] - y[s, f, 1] >= farms['demand'][f, 1])
+            model.addConstr(yield_s[2] * x[f, 2] == y[s, f, 2] + y[s, f, 3])
+    for s in range(S):
+        for k, resource in enumerate(RESOURCES):
+            model.addConstr(y.sum(s, '*', k) <= market[resource], f"{resource}_s{s}")
+    return {'model': model, 'x': x}
+
+
+def solve_monolithic(farms, multipliers, probabilities, market):
+    """直接求解擴展式；超過授權規模時回傳 None"""
+    mf = build_multifarm_model(farms, multipliers, probabilities, market)
+    try:
+        mf['model'].optimize()
+    except gp.GurobiError:
+        return None
+    F = len(farms['land'])
+    return mf['model'].objVal, np.array([[mf['x'][f, i].X for i in range(3)] for f in range(F)])
+
+
+# ============================================================================
+# 價格分解
+# ============================================================================
+def _master(num_prices, ub):
+    model = gp.Model("Bundle_Master")
+    model.setParam('OutputFlag', 0)
+    lam = model.addMVar(num_prices, lb=0, ub=ub, name="lambda")
+    theta = model.addVar(lb=-GRB.INFINITY, name="theta")
+    return model, lam, theta
+
+
+def decompose(farms, multipliers, probabilities, market, num_workers=0, gap_tol=1e-5, tol=1e-9, max_iter=200,
+              weight=None, descent=0.1, verbose=False):
+    """
+    近端 bundle 法最小化 L(λ)。停止條件是上下界的相對間隙 ≤ gap_tol；
+    預期下降 ≤ tol·|L| 只是對偶已收斂、原問題解卻無法再改善時的保險。回傳 dict：
+      upper_bound（最佳的 L(λ)）、lower_bound（凸組合面積的原問題值）、gap、
+      acres (F, 3)、prices (S, 3)（市場容量的影子價格）、iterations、oracle_calls、oracle_seconds、seconds
+    """
+    start = time.perf_counter()
+    S = len(probabilities)
+    probabilities = np.asarray(probabilities, dtype=float)
+    cap = np.tile(_capacity(market), S)
+    pcap = np.repeat(probabilities, 3) * cap
+    ub = np.tile(LAMBDA_UB, S)
+    oracle_seconds = 0.0
+    oracle_calls = 0
+
+    with FarmPool(farms, multipliers, probabilities, num_workers) as pool:
+        def oracle(lam):
+            nonlocal oracle_seconds, oracle_calls
+            oracle_calls += 1
+            t0 = time.perf_counter()
+            value, acres, usage = pool.evaluate(lam.reshape(S, 3))
+            oracle_seconds += time.perf_counter() - t0
+            grad = np.repeat(probabilities, 3) * (cap - usage.ravel())
+            return value + pcap @ lam, grad, acres
+
+        center = np.zeros(3 * S)
+        center_value, grad, acres = oracle(center)
+        cuts = [(center_value, grad, center.copy(), acres)]
+        # 近端權重：讓第一步的長度約為 λ 上界的 1/10
+        weight = weight or max(np.linalg.norm(grad) / (0.1 * np.linalg.norm(ub)), 1e-9)
+
+        master, lam, theta = _master(3 * S, ub)
+        constrs = [master.addConstr(theta >= center_value + grad @ (lam - center))]
+        best_lower, best_acres = primal_value(farms, acres, multipliers, probabilities, market), acres
+        iterations = 1
+        for iterations in range(2, max_iter + 1):
+            master.setObjective(theta + 0.5 * weight * ((lam - center) @ (lam - center)), GRB.MINIMIZE)
+            master.optimize()
+            candidate = lam.X.copy()
+            predicted = center_value - theta.X
+            # 切平面權重（主問題對偶值）給出面積的凸組合
+            alpha = np.maximum(np.concatenate([np.atleast_1d(c.Pi) for c in constrs]), 0)
+            combined = sum(a * c[3] for a, c in zip(alpha, cuts)) / max(alpha.sum(), 1e-12)
+            lower = primal_value(farms, combined, multipliers, probabilities, market)
+            if lower > best_lower:
+                best_lower, best_acres = lower, combined
+            if center_value - best_lower <= gap_tol * abs(center_value) or predicted <= tol * abs(center_value):
+                break
+
+            value, grad, acres = oracle(candidate)
+            lower = primal_value(farms, acres, multipliers, probabilities, market)
+            if lower > best_lower:
+                best_lower, best_acres = lower, acres
+            # 實際下降接近預期時放大步長（降低近端權重），空步（null step）時縮小步長
+            ratio = (center_value - value) / predicted
+            if ratio >= descent:
+                center, center_value = candidate, value
+                if ratio >= 0.5:
+                    weight *= 0.5
+            else:
+                weight *= 1.5
+            cuts.append((value, grad, candidate, acres))
+            constrs.append(master.addConstr(theta >= value + grad @ (lam - candidate)))
+            if verbose:
+                print(f"  {iterations:4d}  L={center_value:,.2f}  下界={best_lower:,.2f}  預期下降={predicted:,.4f}")
+
+    return {
+        'upper_bound': center_value,
+        'lower_bound': best_lower,
+        'gap': (center_value - best_lower) / abs(center_value),
+        'acres': best_acres,
+        'prices': center.reshape(S, 3),
+        'iterations': iterations,
+        'oracle_calls': oracle_calls,
+        'oracle_seconds': oracle_seconds,
+        'seconds': time.perf_counter() - start
+    }
+
+
+def scaling_benchmark(sizes=(10, 30, 100, 300, 1000), num_workers=0, seed=34):
+    rows = []
+    for F in sizes:
+        farms = synthetic_farms(F, seed=seed)
+        mults = farm_multipliers(F, seed=seed)
+        probs = np.full(len(mults), 1 / len(mults))
+        market = default_market(F)
+        result = decompose(farms, mults, probs, market, num_workers=num_workers)
+        t0 = time.perf_counter()
+        mono = solve_monolithic(farms, mults, probs, market)
+        rows.append({
+            'farms': F,
+            'iterations': result['iterations'],
+            'seconds': result['seconds'],
+            'per_iteration_ms': result['oracle_seconds'] / result['oracle_calls'] * 1000,
+            'upper_bound': result['upper_bound'],
+            'lower_bound': result['lower_bound'],
+            'gap': result['gap'],
+            'monolithic': None if mono is None else mono[0],
+            'monolithic_seconds': None if mono is None else time.perf_counter() - t0,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    F = 10
+    farms = synthetic_farms(F, seed=34)
+    mults = farm_multipliers(F, seed=34)
+    probs = np.array([sc['probability'] for sc in scenarios])
+    market = default_market(F)
+
+    print("="*70)
+    print(f"{F} 個農場共用市場：小麥 ≤ {market['wheat_cap']:,} 噸、玉米 ≤ {market['corn_cap']:,} 噸、"
+          f"甜菜配額 {market['quota']:,.0f} 噸")
+    print("="*70)
+    independent = solve_farms(build_farm_models(farms, mults, probs), np.zeros((3, 3)))[0]
+    result = decompose(farms, mults, probs, market)
+    mono = solve_monolithic(farms, mults, probs, market)
+    print(f"不受市場容量與配額限制時的總利潤: ${independent:,.2f}")
+    print(f"價格分解: 上界 ${result['upper_bound']:,.2f}，下界 ${result['lower_bound']:,.2f}，"
+          f"間隙 {result['gap']:.2e}，{result['iterations']} 次迭代，{result['seconds']:.2f} 秒")
+    print(f"擴展式直接求解: ${mono[0]:,.2f}")
+    print("\n市場容量的影子價格（$/噸）:")
+    for s, sc in enumerate(scenarios):
+        prices = ', '.join(f"{k}={v:6.2f}" for k, v in zip(RESOURCES, result['prices'][s]))
+        print(f"  {sc['name']:<10} {prices}")
+    print("\n前 5 個農場的種植面積（小麥/玉米/甜菜）:")
+    for f in range(5):
+        print(f"  農場 {f}（{farms['land'][f]:6.1f} 英畝）: 分解 {np.round(result['acres'][f], 1)}，"
+              f"擴展式 {np.round(mono[1][f], 1)}")
+
+    workers = min(os.cpu_count() or 1, 4)
+    print("\n" + "="*70)
+    print(f"規模測試（{workers} 個 worker，3 個情境，各農場產量另有 5% 雜訊）")
+    print("="*70)
+    print(f"{'農場數':>6} {'迭代':>6} {'總時間(秒)':>10} {'每次迭代(ms)':>12} {'間隙':>10} {'擴展式':>16}")
+    for row in scaling_benchmark(num_workers=workers):
+        mono_text = "超過授權規模" if row['monolithic'] is None else f"${row['monolithic']:,.0f}"
+        print(f"{row['farms']:>6} {row['iterations']:>6} {row['seconds']:>10.2f} "
+              f"{row['per_iteration_ms']:>12.1f} {row['gap']:>10.2e} {mono_text:>16}")
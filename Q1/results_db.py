@@ -0,0 +1,234 @@
+"""
+實驗結果資料庫（SQLite，WAL 模式）
+
+e.py、g.py 的結果只存在於終端輸出與記憶體中的 dict（ev_solution、rp_solution、saa_solutions），
+要比較數百次執行只能重跑或翻 log。這裡把每次執行存成一列：
+  runs    方法、參數雜湊（參數 JSON 正規化後的 SHA-256）、參數、亂數種子、時間、目標值、種植面積
+  series  每次執行附帶的數列（例如 SAA 各批目標值、驗證各批平均），以 float64 BLOB 存放
+runs 在 param_hash、seed、method、created 上建索引；插入以單一交易批次執行，
+查詢回傳 pandas DataFrame 或 NumPy 陣列。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from farmer import scenarios, build_rp_model, total_profit
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    method TEXT NOT NULL,
+    param_hash TEXT NOT NULL,
+    params TEXT NOT NULL,
+    seed INTEGER,
+    created REAL NOT NULL,
+    objective REAL,
+    wheat REAL,
+    corn REAL,
+    beet REAL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_param_hash ON runs (param_hash);
+CREATE INDEX IF NOT EXISTS idx_runs_seed ON runs (seed);
+CREATE INDEX IF NOT EXISTS idx_runs_method ON runs (method, created);
+CREATE INDEX IF NOT EXISTS idx_runs_created ON runs (created);
+CREATE TABLE IF NOT EXISTS series (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    kind TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (run_id, kind)
+);
+"""
+
+
+def param_hash(params):
+    canonical = json.dumps(params, sort_keys=True, separators=(',', ':'), default=float)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+class ResultsDB:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def insert_runs(self, records):
+        """
+        在單一交易內插入多筆執行結果，回傳各筆的 id。每筆 record 為 dict：
+          method、params（dict）、seed、objective、acres（3 個值，可省略）、
+          extra（可 JSON 序列化的 dict）、series（{名稱: 陣列}）
+        """
+        now = time.time()
+        ids = []
+        with self.conn:
+            cur = self.conn.cursor()
+            series_rows = []
+            for r in records:
+                acres = r.get('acres')
+                acres = [None] * 3 if acres is None else list(acres)
+                seed, objective = r.get('seed'), r.get('objective')
+                # id 交給 SQLite 在寫入鎖內配發，多個行程同時寫入也不會重複
+                cur.execute("INSERT INTO runs VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (r['method'], param_hash(r.get('params', {})),
+                             json.dumps(r.get('params', {}), sort_keys=True, default=float),
+                             None if seed is None else int(seed), r.get('created', now),
+                             None if objective is None else float(objective),
+                             *[None if a is None else float(a) for a in acres],
+                             json.dumps(r['extra'], default=float) if r.get('extra') else None))
+                run_id = cur.lastrowid
+                for kind, values in r.get('series', {}).items():
+                    series_rows.append((run_id, kind, np.asarray(values, dtype=np.float64).tobytes()))
+                ids.append(run_id)
+            cur.executemany("INSERT INTO series VALUES (?, ?, ?)", series_rows)
+        return ids
+
+    def query(self, method=None, params=None, param_hash_value=None, seed=None, since=None, until=None,
+              columns="*"):
+        """依條件查詢 runs，回傳 DataFrame；params 會先換算成雜湊再以索引查詢"""
+        conditions, args = [], []
+        if params is not None:
+            param_hash_value = param_hash(params)
+        for column, value in (('method', method), ('param_hash', param_hash_value), ('seed', seed)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                args.append(value)
+        if since is not None:
+            conditions.append("created >= ?")
+            args.append(since)
+        if until is not None:
+            conditions.append("created < ?")
+            args.append(until)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return pd.read_sql_query(f"SELECT {columns} FROM runs{where} ORDER BY id", self.conn, params=args)
+
+    def series(self, run_ids, kind):
+        """多筆執行的同名數列；長度相同時回傳 2 維陣列，否則回傳陣列清單"""
+        run_ids = [int(i) for i in np.atleast_1d(run_ids)]
+        placeholders = ','.join('?' * len(run_ids))
+        rows = dict(self.conn.execute(
+            f"SELECT run_id, data FROM series WHERE kind = ? AND run_id IN ({placeholders})",
+            [kind, *run_ids]).fetchall())
+        arrays = [np.frombuffer(rows[i], dtype=np.float64) for i in run_ids if i in rows]
+        if arrays and all(len(a) == len(arrays[0]) for a in arrays):
+            return np.vstack(arrays)
+        return arrays
+
+    def summary(self, method):
+        """依參數雜湊彙總同一方法的多次執行（次數、目標值平均與標準差）"""
+        return pd.read_sql_query(
+            """SELECT param_hash, params, COUNT(*) AS runs, AVG(objective) AS mean,
+                      SQRT(MAX(AVG(objective * objective) - AVG(objective) * AVG(objective), 0)) AS std,
+                      MIN(created) AS first, MAX(created) AS last
+               FROM runs WHERE method = ? GROUP BY param_hash ORDER BY mean DESC""",
+            self.conn, params=[method])
+
+
+def value_of_information_records():
+    """(e)小題的 EV / EEV / RP / WS / EVPI / VSS，每項一筆紀錄"""
+    mults = [sc['multiplier'] for sc in scenarios]
+    probs = np.array([sc['probability'] for sc in scenarios])
+    params = {'scenarios': mults, 'probabilities': probs.tolist()}
+
+    ev = build_rp_model([1.0], name="EV")
+    ev['model'].optimize()
+    ev_acres = [ev['x'][i].X for i in range(3)]
+    rp = build_rp_model(mults, probs)
+    rp['model'].optimize()
+    rp_acres = [rp['x'][i].X for i in range(3)]
+    ws_values = []
+    for m in mults:
+        ws = build_rp_model([m], name="WS")
+        ws['model'].optimize()
+        ws_values.append(ws['model'].objVal)
+
+    EEV = float(probs @ total_profit(ev_acres, mults))
+    WS = float(probs @ ws_values)
+    RP = rp['model'].objVal
+    return [
+        {'method': 'EV', 'params': params, 'objective': ev['model'].objVal, 'acres': ev_acres},
+        {'method': 'EEV', 'params': params, 'objective': EEV, 'acres': ev_acres},
+        {'method': 'RP', 'params': params, 'objective': RP, 'acres': rp_acres},
+        {'method': 'WS', 'params': params, 'objective': WS, 'series': {'scenario_objectives': ws_values}},
+        {'method': 'EVPI', 'params': params, 'objective': WS - RP},
+        {'method': 'VSS', 'params': params, 'objective': RP - EEV},
+    ]
+
+
+def saa_record(M, N, N_bar, T, sigma, seed):
+    """一次 SAA（同 g.py 的流程，驗證用封閉解）"""
+    rng = np.random.default_rng(seed)
+    objectives, solutions = [], []
+    for m in range(M):
+        rp = build_rp_model(rng.normal(1.0, sigma, N), name=f"SAA_batch_{m+1}")
+        rp['model'].optimize()
+        objectives.append(rp['model'].objVal)
+        solutions.append([rp['x'][i].X for i in range(3)])
+    best = solutions[int(np.argmax(objectives))]
+    validation = [total_profit(best, rng.normal(1.0, sigma, N_bar)).mean() for _ in range(T)]
+    return {
+        'method': 'SAA',
+        'params': {'M': M, 'N': N, 'N_bar': N_bar, 'T': T, 'SIGMA': sigma},
+        'seed': seed,
+        'objective': float(np.mean(validation)),
+        'acres': best,
+        'extra': {'train_mean': float(np.mean(objectives))},
+        'series': {'train_objectives': objectives, 'validation_averages': validation}
+    }
+
+
+if __name__ == "__main__":
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.sqlite")
+    with ResultsDB(path) as db:
+        print("="*70)
+        print("寫入 (e) 小題的 EVPI / VSS 與 SAA 執行結果")
+        print("="*70)
+        db.insert_runs(value_of_information_records())
+
+        records = [saa_record(M=5, N=N, N_bar=1000, T=10, sigma=sigma, seed=seed)
+                   for N in (10, 30, 100) for sigma in (0.1, 0.2) for seed in range(40)]
+        start = time.perf_counter()
+        ids = db.insert_runs(records)
+        print(f"批次插入 {len(ids)} 筆 SAA 執行: {(time.perf_counter() - start) * 1000:.1f} ms")
+        total = db.conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        print(f"資料庫共 {total:,} 筆執行（{path}）")
+
+        print("\n" + "="*70)
+        print("查詢")
+        print("="*70)
+        latest = db.query(method='EVPI').iloc[-1]
+        print(f"最新 EVPI = ${latest['objective']:,.2f}，VSS = ${db.query(method='VSS').iloc[-1]['objective']:,.2f}")
+
+        start = time.perf_counter()
+        frame = db.query(method='SAA', params={'M': 5, 'N': 30, 'N_bar': 1000, 'T': 10, 'SIGMA': 0.1})
+        batches = db.series(frame['id'], 'validation_averages')
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"N=30, σ=0.1 的 SAA: {len(frame)} 次執行，驗證批平均陣列 {batches.shape}，"
+              f"查詢 {elapsed:.2f} ms")
+
+        start = time.perf_counter()
+        summary = db.summary('SAA')
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"\n各參數組彙總（{elapsed:.2f} ms）:")
+        for _, row in summary.iterrows():
+            params = json.loads(row['params'])
+            print(f"  N={params['N']:>4}, σ={params['SIGMA']:.1f}: {row['runs']:>5} 次，"
+                  f"驗證期望利潤 ${row['mean']:,.2f}（標準差 ${row['std']:,.2f}）")
+
+        plan = db.conn.execute("EXPLAIN QUERY PLAN SELECT * FROM runs WHERE param_hash = ?", ['x']).fetchall()
+        print(f"\n查詢計畫: {plan[0][-1]}")
@@ -0,0 +1,179 @@
+"""
+產量樣本的記憶體映射（memory-mapped）存放區
+
+(g)小題每次執行都在行程記憶體內重新產生訓練與驗證樣本，不同實驗無法共用或重播同一組樣本。
+這裡把產生好的產量倍數寫成 .npy 檔（np.lib.format.open_memmap 分段寫入，不需整批放在記憶體），
+旁邊附一個 .json 記錄分佈、參數、亂數種子與抽樣器。
+訓練、驗證與 gap 估計作業用 mmap_mode='r' 開啟同一個檔案，
+切片都是零複製的 view，多個 worker 行程共用作業系統的 page cache，不會在 RAM 中各存一份。
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from farmer import MU, SIGMA, build_rp_model, total_profit
+from distributions import make
+
+SAMPLERS = {
+    'normal': lambda rng, size, mean=MU, std=SIGMA: rng.normal(mean, std, size),
+    'uniform': lambda rng, size, low=0.8, high=1.2: rng.uniform(low, high, size),
+}
+
+CHUNK_SIZE = 1_000_000
+
+
+def _registry_sampler(distribution, params):
+    """SAMPLERS 以外的名稱改用 distributions 登錄表（截斷常態、對數常態、beta、混合等）"""
+    dist = make(distribution, **params)
+
+    def sampler(rng, size, **_):
+        return dist.sample(int(np.prod(size)), rng).reshape(size)
+    return sampler
+
+
+class SampleStore:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.root, f"{name}.npy")
+
+    def meta_path(self, name):
+        return os.path.join(self.root, f"{name}.json")
+
+    def exists(self, name):
+        return os.path.exists(self.path(name)) and os.path.exists(self.meta_path(name))
+
+    def write(self, name, distribution, shape, seed, dtype=np.float64, chunk_size=CHUNK_SIZE, **params):
+        """
+        分段產生樣本並直接寫入 .npy 檔。shape 的第一維是樣本數，例如 (M*N,) 或 (S, 3)。
+        亂數串流由 SeedSequence(seed) 決定，分段大小不影響結果。
+        """
+        shape = tuple(int(d) for d in np.atleast_1d(shape))
+        rng = np.random.Generator(np.random.PCG64(np.random.SeedSequence(seed)))
+        sampler = SAMPLERS.get(distribution) or _registry_sampler(distribution, params)
+
+        out = np.lib.format.open_memmap(self.path(name), mode='w+', dtype=dtype, shape=shape)
+        row_size = int(np.prod(shape[1:])) if len(shape) > 1 else 1
+        rows_per_chunk = max(1, chunk_size // row_size)
+        for start in range(0, shape[0], rows_per_chunk):
+            stop = min(start + rows_per_chunk, shape[0])
+            out[start:stop] = sampler(rng, (stop - start,) + shape[1:], **params)
+        out.flush()
+        del out
+
+        meta = {
+            'name': name,
+            'distribution': distribution,
+            'params': params,
+            'seed': seed,
+            'sampler': 'numpy.random.Generator(PCG64(SeedSequence(seed)))',
+            'shape': list(shape),
+            'dtype': np.dtype(dtype).str,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }
+        with open(self.meta_path(name), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        return meta
+
+    def save(self, name, data, distribution, seed=None, **params):
+        """存入已產生好的情境陣列（例如由歷史資料擬合或重抽樣而得），中繼資料格式同 write"""
+        data = np.asarray(data)
+        np.save(self.path(name), data)
+        meta = {
+            'name': name,
+            'distribution': distribution,
+            'params': params,
+            'seed': seed,
+            'sampler': None,
+            'shape': [int(d) for d in data.shape],
+            'dtype': data.dtype.str,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }
+        with open(self.meta_path(name), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        return meta
+
+    def get_or_create(self, name, distribution, shape, seed, **params):
+        """已存在且參數相同時直接重用，否則重新產生"""
+        if self.exists(name):
+            meta = self.metadata(name)
+            if (meta['distribution'] == distribution and meta['seed'] == seed and
+                    meta['shape'] == [int(d) for d in np.atleast_1d(shape)] and meta['params'] == params):
+                return meta
+        return self.write(name, distribution, shape, seed, **params)
+
+    def metadata(self, name):
+        with open(self.meta_path(name), encoding='utf-8') as f:
+            return json.load(f)
+
+    def open(self, name):
+        """唯讀記憶體映射，不把資料讀進行程記憶體"""
+        return np.load(self.path(name), mmap_mode='r')
+
+    def batches(self, name, batch_size):
+        """依序切出 batch_size 大小的零複製 view，例如 M 個訓練批或 T 個驗證批"""
+        data = self.open(name)
+        for start in range(0, len(data) - batch_size + 1, batch_size):
+            yield data[start:start + batch_size]
+
+    def list(self):
+        return sorted(f[:-5] for f in os.listdir(self.root) if f.endswith('.json'))
+
+
+def _validate_slice(args):
+    """worker：只收到檔名與範圍，自行映射檔案後計算該段的平均利潤"""
+    path, start, stop, acres = args
+    data = np.load(path, mmap_mode='r')
+    return float(total_profit(acres, data[start:stop]).mean())
+
+
+def parallel_validate(store, name, acres, batch_size, max_workers=4):
+    total = len(store.open(name))
+    tasks = [(store.path(name), s, s + batch_size, acres)
+             for s in range(0, total - batch_size + 1, batch_size)]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_validate_slice, tasks))
+
+
+if __name__ == "__main__":
+    N, M = 30, 15
+    N_bar, T = 10_000, 64
+
+    store = SampleStore(os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples"))
+    train_meta = store.get_or_create("train_normal", "normal", (M * N,), seed=34, mean=MU, std=SIGMA)
+    val_meta = store.get_or_create("validation_normal", "normal", (T * N_bar,), seed=35, mean=MU, std=SIGMA)
+
+    print("="*70)
+    print("樣本存放區")
+    print("="*70)
+    for name in store.list():
+        meta = store.metadata(name)
+        print(f"  {name:<20} {meta['distribution']:<8} seed={meta['seed']:<4} shape={meta['shape']}")
+
+    print(f"\n訓練階段：{M} 批 × N={N}（讀取映射檔）")
+    saa_solutions = []
+    for m, batch in enumerate(store.batches("train_normal", N)):
+        rp = build_rp_model(batch, name=f"SAA_batch_{m+1}", tuned=True)
+        rp['model'].optimize()
+        saa_solutions.append({
+            'batch': m + 1,
+            'acres': [rp['x'][i].X for i in range(3)],
+            'objective': rp['model'].objVal
+        })
+    best = max(saa_solutions, key=lambda s: s['objective'])
+    print(f"  最佳批次 {best['batch']}: 小麥={best['acres'][0]:.2f}, "
+          f"玉米={best['acres'][1]:.2f}, 甜菜={best['acres'][2]:.2f}，目標值 ${best['objective']:,.2f}")
+
+    print(f"\n驗證階段：{T} 批 × N̄={N_bar:,}，4 個 worker 共用同一個映射檔")
+    validation_objectives = parallel_validate(store, "validation_normal", best['acres'], N_bar)
+    print(f"  期望利潤估計: ${np.mean(validation_objectives):,.2f} "
+          f"（標準誤 ${np.std(validation_objectives, ddof=1) / np.sqrt(T):,.2f}）")
+
+    data = store.open("validation_normal")
+    view = data[:N_bar]
+    print(f"\n切片是否為零複製 view: {np.shares_memory(view, data)}；型別 {type(data).__name__}")
@@ -0,0 +1,240 @@
+"""
+多年期農夫問題的隨機對偶動態規劃（SDDP, Stochastic Dual Dynamic Programming）
+
+每一季沿用單期模型的購買 / 銷售 / 甜菜配額結構，再加上：
+  - 狀態變數：本季已種的面積 a（3）與上季留下的小麥、玉米庫存 I（2）
+  - 收成後決定本季交易、留存庫存（每噸每季 HOLD_COST）以及下一季的種植面積
+  - 各季產量倍數 ξ_t 彼此獨立（stagewise independent），以 K 個等機率分位點離散化
+
+第 t 季問題（收成 ξ_t 已知）:
+  max  銷售 - 購買 - 庫存成本 - 下季種植成本 + θ_{t+1}
+  s.t. ξ_t·Y_小麥·a_小麥 + I_小麥 + w_小麥 - y_小麥 - I'_小麥 ≥ 200
+       ξ_t·Y_玉米·a_玉米 + I_玉米 + w_玉米 - y_玉米 - I'_玉米 ≥ 240
+       ξ_t·Y_甜菜·a_甜菜 = y_甜菜低 + y_甜菜高,  y_甜菜低 ≤ 6000
+       x'_小麥 + x'_玉米 + x'_甜菜 ≤ 500
+       θ_{t+1} ≤ α_k + β_k·(x', I')   （第 t+1 季期望價值函數的切平面）
+
+前向回合抽樣產生狀態軌跡，後向回合在每個狀態對 K 個實現值求解下一季、
+以固定狀態限制式的對偶值平均產生切平面。
+最大化問題下，第 0 季含切平面的目標值是確定性上界，前向模擬的平均利潤是統計下界估計；
+上界落入模擬平均的信賴區間時停止。季數多時完整情境樹有 K^T 個節點，無法建擴展式。
+"""
+import time
+
+import gurobipy as gp
+from gurobipy import GRB
+import numpy as np
+from scipy import stats
+
+from farmer import (TOTAL_LAND, PLANT_COST, DEMAND, SELL_PRICE, BUY_PRICE, AVG_YIELD,
+                    BEET_QUOTA, MU, SIGMA, build_rp_model)
+
+HOLD_COST = [10, 10]  # 小麥、玉米庫存成本（$/噸/季）
+THETA_UB = 1e6  # 每季價值上限，切平面尚未建立前的 θ 上界
+
+NUM_STATES = 5  # 種植面積 3 + 庫存 2
+
+
+def discretize_yield(K, mu=MU, sigma=SIGMA):
+    """以 N(mu, sigma) 的 K 個等機率分位點中點離散化單季產量倍數"""
+    return stats.norm.ppf((np.arange(K) + 0.5) / K, mu, sigma)
+
+
+def build_stage_model(t, T):
+    """
+    建立第 t 季的 LP（t=0 為第一季開始前的種植決策）。
+    state_in 以等式限制固定，其對偶值即為價值函數對狀態的斜率。
+    """
+    model = gp.Model(f"SDDP_stage_{t}")
+    model.setParam('OutputFlag', 0)
+
+    a_in = model.addVars(3, name="acres_in", lb=0)
+    inv_in = model.addVars(2, name="inv_in", lb=0)
+    x_next = model.addVars(3, name="acres_next", lb=0, ub=0 if t == T else GRB.INFINITY)
+    inv_out = model.addVars(2, name="inv_out", lb=0, ub=0 if t in (0, T) else GRB.INFINITY)
+    w = model.addVars(2, name="buy", lb=0)
+    y = model.addVars(4, name="sell", lb=0)
+    theta = model.addVar(name="theta", lb=-GRB.INFINITY, ub=0 if t == T else THETA_UB * (T - t))
+
+    fix = []
+    for i in range(3):
+        fix.append(model.addConstr(a_in[i] == 0, f"fix_acres_{i}"))
+    for j in range(2):
+        fix.append(model.addConstr(inv_in[j] == 0, f"fix_inv_{j}"))
+
+    balance = []
+    if t == 0:
+        # 第一季之前沒有收成與交易
+        for v in list(w.values()) + list(y.values()):
+            v.UB = 0
+    else:
+        balance.append(model.addConstr(
+            AVG_YIELD[0]*a_in[0] + inv_in[0] + w[0] - y[0] - inv_out[0] >= DEMAND[0], "wheat"))
+        balance.append(model.addConstr(
+            AVG_YIELD[1]*a_in[1] + inv_in[1] + w[1] - y[1] - inv_out[1] >= DEMAND[1], "corn"))
+        balance.append(model.addConstr(
+            AVG_YIELD[2]*a_in[2] == y[2] + y[3], "beet"))
+        model.addConstr(y[2] <= BEET_QUOTA, "beet_threshold")
+
+    model.addConstr(x_next[0] + x_next[1] + x_next[2] <= TOTAL_LAND, "land")
+
+    stage_profit = (SELL_PRICE[0]*y[0] + SELL_PRICE[1]*y[1] +
+                    SELL_PRICE[2]*y[2] + SELL_PRICE[3]*y[3] -
+                    BUY_PRICE[0]*w[0] - BUY_PRICE[1]*w[1] -
+                    HOLD_COST[0]*inv_out[0] - HOLD_COST[1]*inv_out[1] -
+                    PLANT_COST[0]*x_next[0] - PLANT_COST[1]*x_next[1] - PLANT_COST[2]*x_next[2])
+    model.setObjective(stage_profit + theta, GRB.MAXIMIZE)
+
+    return {
+        'stage': t,
+        'model': model,
+        'a_in': a_in,
+        'fix': fix,
+        'balance': balance,
+        'state_out': [x_next[0], x_next[1], x_next[2], inv_out[0], inv_out[1]],
+        'theta': theta,
+        'stage_profit': stage_profit,
+        'cuts': []  # 切平面庫：(α, β)，θ ≤ α + β·state_out
+    }
+
+
+def set_state_and_yield(stage, state_in, mult):
+    for k in range(NUM_STATES):
+        stage['fix'][k].RHS = state_in[k]
+    if stage['balance']:
+        model = stage['model']
+        model.chgCoeff(stage['balance'][0], stage['a_in'][0], AVG_YIELD[0] * mult)
+        model.chgCoeff(stage['balance'][1], stage['a_in'][1], AVG_YIELD[1] * mult)
+        model.chgCoeff(stage['balance'][2], stage['a_in'][2], AVG_YIELD[2] * mult)
+
+
+def add_cut(stage, alpha, beta):
+    stage['cuts'].append((alpha, beta))
+    stage['model'].addConstr(
+        stage['theta'] <= alpha + gp.quicksum(beta[k] * stage['state_out'][k] for k in range(NUM_STATES)),
+        f"cut_{len(stage['cuts'])}"
+    )
+
+
+def solve_stage(stage, state_in, mult):
+    set_state_and_yield(stage, state_in, mult)
+    model = stage['model']
+    model.optimize()
+    if model.status != GRB.OPTIMAL:
+        raise RuntimeError(f"第 {stage['stage']} 季求解失敗，狀態碼: {model.status}")
+    return {
+        'objective': model.objVal,
+        'stage_profit': stage['stage_profit'].getValue(),
+        'state_out': np.array([v.X for v in stage['state_out']]),
+        'duals': np.array([c.Pi for c in stage['fix']])
+    }
+
+
+def forward_pass(stages, support, rng, num_paths):
+    """抽樣產量路徑並沿用目前的切平面決策，回傳各季的狀態與每條路徑的總利潤"""
+    T = len(stages) - 1
+    states = np.zeros((num_paths, T + 1, NUM_STATES))  # states[p, t] = 進入第 t+1 季的狀態
+    profits = np.zeros(num_paths)
+    for p in range(num_paths):
+        state = np.zeros(NUM_STATES)
+        for t in range(T + 1):
+            mult = 1.0 if t == 0 else support[rng.integers(len(support))]
+            sol = solve_stage(stages[t], state, mult)
+            profits[p] += sol['stage_profit']
+            state = sol['state_out']
+            states[p, t] = state
+    return states, profits
+
+
+def backward_pass(stages, support, probs, states):
+    """由最後一季往前，在每個前向狀態對所有實現值求解並加入期望切平面"""
+    T = len(stages) - 1
+    for t in range(T, 0, -1):
+        for state in np.unique(states[:, t - 1], axis=0):
+            value = 0.0
+            slope = np.zeros(NUM_STATES)
+            for k, mult in enumerate(support):
+                sol = solve_stage(stages[t], state, mult)
+                value += probs[k] * sol['objective']
+                slope += probs[k] * sol['duals']
+            add_cut(stages[t - 1], value - slope @ state, slope)
+
+
+def sddp(T, K=10, num_paths=20, max_iterations=100, min_iterations=5,
+         confidence_level=0.95, seed=None, verbose=True):
+    """
+    執行 SDDP。回傳確定性上界、最後一次統計估計、第一季種植決策與迭代紀錄。
+    """
+    rng = np.random.default_rng(seed)
+    support = discretize_yield(K)
+    probs = np.full(K, 1 / K)
+    stages = [build_stage_model(t, T) for t in range(T + 1)]
+    z = stats.norm.ppf(1 - (1 - confidence_level) / 2)
+
+    history = []
+    start = time.perf_counter()
+    for it in range(1, max_iterations + 1):
+        states, profits = forward_pass(stages, support, rng, num_paths)
+        backward_pass(stages, support, probs, states)
+
+        first = solve_stage(stages[0], np.zeros(NUM_STATES), 1.0)
+        upper = first['objective']
+        mean = float(np.mean(profits))
+        half_width = z * float(np.std(profits, ddof=1)) / np.sqrt(num_paths)
+        history.append({'iteration': it, 'upper_bound': upper, 'mean': mean,
+                        'half_width': half_width, 'time': time.perf_counter() - start})
+
+        if verbose:
+            print(f"  迭代 {it:>3}: 上界 ${upper:>12,.2f}   "
+                  f"模擬 ${mean:>12,.2f} ± {half_width:>10,.2f}   "
+                  f"切平面 {sum(len(s['cuts']) for s in stages):>5}")
+
+        if it >= min_iterations and upper <= mean + half_width:
+            break
+
+    return {
+        'upper_bound': history[-1]['upper_bound'],
+        'mean': history[-1]['mean'],
+        'half_width': history[-1]['half_width'],
+        'first_acres': first['state_out'][:3],
+        'iterations': len(history),
+        'history': history,
+        'stages': stages
+    }
+
+
+def simulate_policy(stages, num_paths, K=10, seed=None):
+    """以獨立抽樣評估最終策略的期望利潤（不加入新切平面）"""
+    rng = np.random.default_rng(seed)
+    _, profits = forward_pass(stages, discretize_yield(K), rng, num_paths)
+    return profits
+
+
+if __name__ == "__main__":
+    K = 10
+
+    print("="*70)
+    print("驗證：單季 SDDP 應等於相同離散化下的 RP")
+    print("="*70)
+    result_1 = sddp(T=1, K=K, seed=34, min_iterations=20, verbose=False)
+    rp = build_rp_model(discretize_yield(K))
+    rp['model'].optimize()
+    print(f"  SDDP 上界: ${result_1['upper_bound']:,.2f}")
+    print(f"  RP 目標值: ${rp['model'].objVal:,.2f}")
+
+    T = 8
+    print("\n" + "="*70)
+    print(f"{T} 季規劃（每季 {K} 個實現值，完整情境樹 {K**T:,} 個葉節點）")
+    print("="*70)
+    result = sddp(T=T, K=K, seed=34)
+
+    print(f"\n迭代次數: {result['iterations']}")
+    print(f"確定性上界: ${result['upper_bound']:,.2f}")
+    print(f"第一季種植: 小麥={result['first_acres'][0]:.2f}, "
+          f"玉米={result['first_acres'][1]:.2f}, 甜菜={result['first_acres'][2]:.2f}")
+
+    profits = simulate_policy(result['stages'], 500, K=K, seed=35)
+    half_width = 1.96 * np.std(profits, ddof=1) / np.sqrt(len(profits))
+    print(f"\n獨立模擬 500 條路徑:")
+    print(f"  期望總利潤: ${np.mean(profits):,.2f} ± {half_width:,.2f}")
+    print(f"  與上界差距: ${result['upper_bound'] - np.mean(profits):,.2f}")
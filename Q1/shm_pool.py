@@ -0,0 +1,176 @@
+"""
+行程池（process pool）的共享記憶體傳輸層
+
+把 SAA 訓練或驗證迴圈分散到多個行程時，若每個任務都把樣本陣列當參數傳遞、
+再把每樣本的利潤與第二階段決策當回傳值傳回來，序列化（pickle）會成為瓶頸。
+這裡用 multiprocessing.shared_memory：
+  - 產量倍數只發佈一次，每個 worker 在初始化時附加（attach）並取得 ndarray view
+  - 任務只傳 (start, stop) 與種植面積，worker 直接讀取自己的切片
+  - 利潤與第二階段決策直接寫進共享的結果陣列，回傳值只有很小的摘要
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from farmer import MU, SIGMA, DECISION_PRICES, build_rp_model, recourse_decisions, planting_cost
+
+# 第二階段決策欄位順序（同 farmer.recourse_decisions）
+DECISION_COLUMNS = ['buy_wheat', 'buy_corn', 'sell_wheat', 'sell_corn', 'sell_beet_low', 'sell_beet_high']
+
+
+class SharedArray:
+    """包裝 SharedMemory 與 ndarray view；spec 可傳給其他行程再 attach"""
+
+    def __init__(self, shm, shape, dtype, owner):
+        self.shm = shm
+        self.array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        self.owner = owner
+
+    @classmethod
+    def create(cls, shape, dtype=np.float64, data=None):
+        nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        shared = cls(shm, shape, dtype, owner=True)
+        if data is not None:
+            shared.array[...] = data
+        return shared
+
+    @classmethod
+    def attach(cls, spec):
+        name, shape, dtype = spec
+        return cls(shared_memory.SharedMemory(name=name), shape, dtype, owner=False)
+
+    @property
+    def spec(self):
+        return (self.shm.name, self.array.shape, self.array.dtype.str)
+
+    def close(self):
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# worker 行程內的共享陣列（由 _init_worker 設定）
+_shared = {}
+
+
+def _init_worker(specs):
+    for key, spec in specs.items():
+        _shared[key] = SharedArray.attach(spec)
+
+
+def _validate_task(args):
+    """讀取 yields[start:stop]，把利潤與決策寫回共享結果陣列，只回傳該段的平均"""
+    start, stop, acres = args
+    mults = _shared['yields'].array[start:stop]
+    decisions = recourse_decisions(acres, mults)
+    profits = decisions @ DECISION_PRICES - planting_cost(acres)
+    _shared['decisions'].array[start:stop] = decisions
+    _shared['profits'].array[start:stop] = profits
+    return float(profits.mean())
+
+
+def _saa_task(args):
+    """以 yields[start:stop] 求解一個 SAA 批次，種植面積與目標值寫入共享陣列第 m 列"""
+    m, start, stop = args
+    rp = build_rp_model(_shared['yields'].array[start:stop], name=f"SAA_batch_{m+1}", tuned=True)
+    rp['model'].optimize()
+    _shared['saa'].array[m, :3] = [rp['x'][i].X for i in range(3)]
+    _shared['saa'].array[m, 3] = rp['model'].objVal
+    return m
+
+
+def shared_validate(yields, acres, batch_size, max_workers=4):
+    """
+    共享記憶體版驗證。回傳 (各批平均, 每樣本利潤, 每樣本決策)；
+    後兩者複製出共享區塊後才釋放。
+    """
+    n = len(yields)
+    with SharedArray.create(yields.shape, yields.dtype, yields) as y_shared, \
+            SharedArray.create((n,)) as p_shared, \
+            SharedArray.create((n, len(DECISION_COLUMNS))) as d_shared:
+        specs = {'yields': y_shared.spec, 'profits': p_shared.spec, 'decisions': d_shared.spec}
+        tasks = [(s, min(s + batch_size, n), acres) for s in range(0, n, batch_size)]
+        with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(specs,)) as pool:
+            batch_means = list(pool.map(_validate_task, tasks))
+        return batch_means, p_shared.array.copy(), d_shared.array.copy()
+
+
+def shared_saa(yields, N, max_workers=4):
+    """共享記憶體版 SAA 訓練：每批結果為 [小麥, 玉米, 甜菜, 目標值]"""
+    M = len(yields) // N
+    with SharedArray.create(yields.shape, yields.dtype, yields) as y_shared, \
+            SharedArray.create((M, 4)) as s_shared:
+        specs = {'yields': y_shared.spec, 'saa': s_shared.spec}
+        with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(specs,)) as pool:
+            list(pool.map(_saa_task, [(m, m * N, (m + 1) * N) for m in range(M)]))
+        return s_shared.array.copy()
+
+
+def _pickled_validate_task(args):
+    mults, acres = args
+    decisions = recourse_decisions(acres, mults)
+    profits = decisions @ DECISION_PRICES - planting_cost(acres)
+    return float(profits.mean()), profits, decisions
+
+
+def pickled_validate(yields, acres, batch_size, max_workers=4):
+    """對照組：樣本切片當參數傳入、結果陣列當回傳值傳回（都經過 pickle）"""
+    tasks = [(yields[s:s + batch_size], acres) for s in range(0, len(yields), batch_size)]
+    with ProcessPoolExecutor(max_workers) as pool:
+        results = list(pool.map(_pickled_validate_task, tasks))
+    return ([r[0] for r in results],
+            np.concatenate([r[1] for r in results]),
+            np.concatenate([r[2] for r in results]))
+
+
+def benchmark(n, batch_size, acres, max_workers=4, seed=None):
+    rng = np.random.default_rng(seed)
+    yields = rng.normal(MU, SIGMA, n)
+
+    start = time.perf_counter()
+    shared_result = shared_validate(yields, acres, batch_size, max_workers)
+    shared_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pickled_result = pickled_validate(yields, acres, batch_size, max_workers)
+    pickled_time = time.perf_counter() - start
+
+    return {
+        'n': n,
+        'batch_size': batch_size,
+        'shared_time': shared_time,
+        'pickled_time': pickled_time,
+        'max_abs_diff': float(np.max(np.abs(shared_result[1] - pickled_result[1])))
+    }
+
+
+if __name__ == "__main__":
+    N, M = 30, 15
+    rng = np.random.default_rng(34)
+
+    print("="*70)
+    print(f"共享記憶體 SAA：{M} 批 × N={N}")
+    print("="*70)
+    saa = shared_saa(rng.normal(MU, SIGMA, M * N), N)
+    best = saa[np.argmax(saa[:, 3])]
+    print(f"最佳解: 小麥={best[0]:.2f}, 玉米={best[1]:.2f}, 甜菜={best[2]:.2f}，目標值 ${best[3]:,.2f}")
+
+    print("\n" + "="*70)
+    print("驗證：共享記憶體 vs pickle 傳參數（4 個 worker）")
+    print("="*70)
+    print(f"\n{'樣本數':>12} {'批大小':>10} {'共享記憶體':>12} {'pickle':>12} {'加速':>8}")
+    for n, batch_size in [(1_000_000, 10_000), (4_000_000, 10_000), (4_000_000, 1_000)]:
+        r = benchmark(n, batch_size, best[:3], seed=35)
+        print(f"{n:>12,} {batch_size:>10,} {r['shared_time']:>11.3f}s {r['pickled_time']:>11.3f}s "
+              f"{r['pickled_time'] / r['shared_time']:>7.2f}x")
+    print(f"\n兩種方式結果最大差異: {r['max_abs_diff']}")
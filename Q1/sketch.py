@@ -0,0 +1,215 @@
+"""
+驗證階段每樣本利潤分佈的串流分位數摘要（merging t-digest）
+
+(g)小題只報告各批平均的平均、標準差、最小與最大值。樣本數達到數十億時無法保留全部利潤再排序，
+這裡以 t-digest 維護一組 (平均值, 權重) 的中心點：
+  - 新資料先放入緩衝區，滿了之後與既有中心點一起排序並壓縮（向量化）
+  - 尺度函數 k1 讓尾端的中心點很小、中間的中心點較大，P1 / P99 等尾端分位數特別準
+  - 兩個摘要可直接合併，適合每個平行 worker 各自維護再彙總
+記憶體只和壓縮參數 delta 有關，與樣本數無關。
+"""
+import time
+
+import numpy as np
+
+from farmer import MU, SIGMA, scenarios, build_rp_model, total_profit
+
+DEFAULT_DELTA = 200
+REPORT_QUANTILES = [0.01, 0.05, 0.5, 0.95]
+
+
+def _k1(q, delta):
+    return delta / (2 * np.pi) * np.arcsin(2 * q - 1)
+
+
+class TDigest:
+    """可合併的 t-digest；means / weights 為排序後的中心點"""
+
+    def __init__(self, delta=DEFAULT_DELTA, buffer_size=None):
+        self.delta = delta
+        self.buffer_size = buffer_size or 20 * delta
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self._buffer = []
+        self._buffered = 0
+        self.count = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values, weights=None):
+        """加入一批樣本（可附權重，例如重要性抽樣的似然比）"""
+        values = np.asarray(values, dtype=float).ravel()
+        if weights is None:
+            weights = np.ones_like(values)
+        else:
+            weights = np.asarray(weights, dtype=float).ravel()
+        if len(values) == 0:
+            return
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._buffer.append((values, weights))
+        self._buffered += len(values)
+        if self._buffered >= self.buffer_size:
+            self._compress()
+
+    def merge(self, other):
+        """合併另一個摘要（例如另一個 worker 的結果）"""
+        other._compress()
+        if other.count == 0:
+            return self
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._buffer.append((other.means, other.weights))
+        self._buffered += len(other.means)
+        self._compress()
+        return self
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        means = np.concatenate([self.means] + [v for v, _ in self._buffer])
+        weights = np.concatenate([self.weights] + [w for _, w in self._buffer])
+        self._buffer = []
+        self._buffered = 0
+
+        order = np.argsort(means, kind='mergesort')
+        means = means[order]
+        weights = weights[order]
+        total = weights.sum()
+        self.count = total
+
+        # 依累積權重換算 k1 尺度，同一個整數 k 區間內的點合併成一個中心點
+        cum_right = np.cumsum(weights) / total
+        cum_left = cum_right - weights / total
+        q_mid = np.clip((cum_left + cum_right) / 2, 0, 1)
+        groups = np.floor(_k1(q_mid, self.delta) - _k1(0.0, self.delta)).astype(np.int64)
+        boundaries = np.flatnonzero(np.diff(groups)) + 1
+        starts = np.concatenate(([0], boundaries))
+
+        merged_weights = np.add.reduceat(weights, starts)
+        merged_means = np.add.reduceat(weights * means, starts) / merged_weights
+        self.means = merged_means
+        self.weights = merged_weights
+
+    def quantile(self, q):
+        """以中心點之間的線性內插估計分位數；q 可為純量或陣列"""
+        self._compress()
+        q = np.atleast_1d(np.asarray(q, dtype=float))
+        if self.count == 0:
+            return np.full(q.shape, np.nan)
+        cum = np.cumsum(self.weights) - self.weights / 2
+        xs = np.concatenate(([self.min], self.means, [self.max]))
+        ps = np.concatenate(([0.0], cum, [self.count])) / self.count
+        return np.interp(q, ps, xs)
+
+    def cdf(self, x):
+        """P(利潤 ≤ x) 的估計；空摘要沒有資料，回傳 0"""
+        self._compress()
+        if self.count == 0:
+            return np.zeros(np.shape(x))
+        cum = np.cumsum(self.weights) - self.weights / 2
+        xs = np.concatenate(([self.min], self.means, [self.max]))
+        ps = np.concatenate(([0.0], cum, [self.count])) / self.count
+        return np.interp(x, xs, ps)
+
+    @property
+    def nbytes(self):
+        self._compress()
+        return self.means.nbytes + self.weights.nbytes
+
+    def __len__(self):
+        self._compress()
+        return len(self.means)
+
+
+def validate_stream(acres, num_batches, batch_size, rng=None, digest=None):
+    """
+    串流驗證：每批抽樣後以封閉解計算利潤並餵入摘要，只保留批平均。
+    回傳 (摘要, 各批平均利潤)。
+    """
+    rng = np.random.default_rng(rng)
+    if digest is None:  # 空的 TDigest 長度為 0，不能用 or 判斷
+        digest = TDigest()
+    batch_means = np.empty(num_batches)
+    for t in range(num_batches):
+        profits = total_profit(acres, rng.normal(MU, SIGMA, batch_size))
+        digest.update(profits)
+        batch_means[t] = profits.mean()
+    return digest, batch_means
+
+
+def summarize(digest, alphas=(0.01, 0.05)):
+    """P1 / P5 / P50 / P95 與左尾 VaR"""
+    values = digest.quantile(REPORT_QUANTILES)
+    summary = {f"P{int(q * 100)}": float(v) for q, v in zip(REPORT_QUANTILES, values)}
+    for alpha in alphas:
+        summary[f"VaR{int(alpha * 100)}"] = float(digest.quantile(alpha)[0])
+    return summary
+
+
+def accuracy_report(acres, n, num_parts=4, delta=DEFAULT_DELTA, seed=None):
+    """
+    小規模下與排序法的精確分位數比較。樣本切成 num_parts 段，在同一個行程內依序
+    各自建摘要再合併（模擬平行 worker 的合併路徑，並未真的使用多個行程）。
+    誤差以排名誤差 |F_exact(估計值) - q| 表示。
+    """
+    rng = np.random.default_rng(seed)
+    samples = rng.normal(MU, SIGMA, n)
+    profits = total_profit(acres, samples)
+
+    digests = []
+    for chunk in np.array_split(profits, num_parts):
+        d = TDigest(delta)
+        for part in np.array_split(chunk, 10):
+            d.update(part)
+        digests.append(d)
+    merged = digests[0]
+    for d in digests[1:]:
+        merged.merge(d)
+
+    qs = np.array([0.001, 0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99, 0.999])
+    estimate = merged.quantile(qs)
+    exact = np.quantile(profits, qs)
+    sorted_profits = np.sort(profits)
+    rank_error = np.abs(np.searchsorted(sorted_profits, estimate) / n - qs)
+    return {
+        'quantiles': qs,
+        'estimate': estimate,
+        'exact': exact,
+        'rank_error': rank_error,
+        'centroids': len(merged),
+        'sketch_bytes': merged.nbytes,
+        'exact_bytes': profits.nbytes
+    }
+
+
+if __name__ == "__main__":
+    rp = build_rp_model([sc['multiplier'] for sc in scenarios],
+                        [sc['probability'] for sc in scenarios])
+    rp['model'].optimize()
+    acres = [rp['x'][i].X for i in range(3)]
+
+    print("="*70)
+    print("串流驗證：每樣本利潤分佈")
+    print("="*70)
+
+    num_batches = 200
+    batch_size = 50_000
+    start = time.perf_counter()
+    digest, batch_means = validate_stream(acres, num_batches, batch_size, rng=34)
+    elapsed = time.perf_counter() - start
+
+    print(f"樣本數: {num_batches * batch_size:,}（{num_batches} 批 × {batch_size:,}），{elapsed:.2f} 秒")
+    print(f"摘要大小: {len(digest)} 個中心點，{digest.nbytes:,} bytes")
+    print(f"批平均: ${batch_means.mean():,.2f}（標準差 ${batch_means.std(ddof=1):,.2f}）")
+    for key, value in summarize(digest).items():
+        print(f"  {key:>6}: ${value:>12,.2f}")
+
+    print("\n" + "="*70)
+    print("精度與記憶體：4 段摘要依序建立後合併 vs 排序法")
+    print("="*70)
+    report = accuracy_report(acres, 1_000_000, num_parts=4, seed=35)
+    print(f"\n{'分位數':>8} {'摘要估計':>14} {'精確值':>14} {'排名誤差':>10}")
+    for q, est, ex, err in zip(report['quantiles'], report['estimate'], report['exact'], report['rank_error']):
+        print(f"{q:>8.3f} ${est:>13,.2f} ${ex:>13,.2f} {err:>10.2e}")
+    print(f"\n記憶體: 摘要 {report['sketch_bytes']:,} bytes vs 全部樣本 {report['exact_bytes']:,} bytes")
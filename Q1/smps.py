@@ -0,0 +1,478 @@
+"""
+兩階段農夫問題的 SMPS 匯入與匯出（core / time / stoch 三個檔案）
+
+原本的實例只以 Python 常數與 addConstr 存在於 d.py、g.py 中，無法交給其他求解工具，
+也無法不改程式就載入別的實例。這裡：
+  - write_core / write_time：把確定性模型（平均產量情境）寫成 MPS 核心檔與階段劃分
+  - write_stoch：BLOCKS DISCRETE 格式，一個區塊（三種作物的產量係數）一個實現值
+  - write_stoch_stream：從分段產生的樣本直接寫檔，10^6 個情境也不需整批放在記憶體
+  - read_smps：讀回三個檔案（支援 BLOCKS / INDEP DISCRETE，多個區塊取笛卡兒積）
+  - extensive_form：以 scipy.sparse 直接組出擴展式 min c'x, A x (sense) b
+  - decomposition：L-shaped 分解所需的第一階段資料與各情境的 T、W、h、q
+
+MPS 慣例為最小化，因此目標列是「成本 = 種植成本 + 購買成本 - 銷售收入」，最佳值為負的期望利潤。
+"""
+import itertools
+import os
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from farmer import MU, SIGMA, scenarios, default_params, crop_multipliers
+
+PROBLEM_NAME = 'FARMER'
+OBJ_ROW = 'PROFIT'
+PERIODS = ['STAGE1', 'STAGE2']
+CROP_COLUMNS = ['X_WHEAT', 'X_CORN', 'X_BEET']
+RECOURSE_COLUMNS = ['W_WHEAT', 'W_CORN', 'Y_WHEAT', 'Y_CORN', 'Y_BEETLO', 'Y_BEETHI']
+BALANCE_ROWS = ['WHEAT', 'CORN', 'BEET']
+SENSE_CHARS = {'L': '<', 'G': '>', 'E': '='}
+CHUNK_SIZE = 100_000
+
+
+def _core_entries(params):
+    """核心模型的 (欄, 列, 係數)，依階段排序"""
+    p = params
+    entries = [(CROP_COLUMNS[i], OBJ_ROW, p['PLANT_COST'][i]) for i in range(3)]
+    entries += [(CROP_COLUMNS[i], 'LAND', 1.0) for i in range(3)]
+    entries += [(CROP_COLUMNS[i], BALANCE_ROWS[i], p['AVG_YIELD'][i]) for i in range(3)]
+    entries += [
+        ('W_WHEAT', OBJ_ROW, p['BUY_PRICE'][0]), ('W_WHEAT', 'WHEAT', 1.0),
+        ('W_CORN', OBJ_ROW, p['BUY_PRICE'][1]), ('W_CORN', 'CORN', 1.0),
+        ('Y_WHEAT', OBJ_ROW, -p['SELL_PRICE'][0]), ('Y_WHEAT', 'WHEAT', -1.0),
+        ('Y_CORN', OBJ_ROW, -p['SELL_PRICE'][1]), ('Y_CORN', 'CORN', -1.0),
+        ('Y_BEETLO', OBJ_ROW, -p['SELL_PRICE'][2]), ('Y_BEETLO', 'BEET', -1.0), ('Y_BEETLO', 'QUOTA', 1.0),
+        ('Y_BEETHI', OBJ_ROW, -p['SELL_PRICE'][3]), ('Y_BEETHI', 'BEET', -1.0)
+    ]
+    return entries
+
+
+def write_core(path, params=None):
+    """確定性核心模型（平均產量）寫成 MPS"""
+    p = {**default_params(), **params} if params else default_params()
+    rows = [('N', OBJ_ROW), ('L', 'LAND'), ('G', 'WHEAT'), ('G', 'CORN'), ('E', 'BEET'), ('L', 'QUOTA')]
+    rhs = [('LAND', p['TOTAL_LAND']), ('WHEAT', p['DEMAND'][0]), ('CORN', p['DEMAND'][1]),
+           ('QUOTA', p['BEET_QUOTA'])]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"NAME          {PROBLEM_NAME}\n")
+        f.write("ROWS\n")
+        for sense, name in rows:
+            f.write(f" {sense}  {name}\n")
+        f.write("COLUMNS\n")
+        for col, row, value in _core_entries(p):
+            f.write(f"    {col:<8}  {row:<8}  {value:>12.12g}\n")
+        f.write("RHS\n")
+        for row, value in rhs:
+            f.write(f"    {'RHS':<8}  {row:<8}  {value:>12.12g}\n")
+        f.write("ENDATA\n")
+
+
+def write_time(path):
+    """PERIODS IMPLICIT：每個階段的第一個欄與第一個列"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"TIME          {PROBLEM_NAME}\n")
+        f.write("PERIODS       IMPLICIT\n")
+        f.write(f"    {CROP_COLUMNS[0]:<8}  {OBJ_ROW:<8}  {PERIODS[0]}\n")
+        f.write(f"    {RECOURSE_COLUMNS[0]:<8}  {'WHEAT':<8}  {PERIODS[1]}\n")
+        f.write("ENDATA\n")
+
+
+def _block_template():
+    lines = [f" BL BLOCK1    {PERIODS[1]:<8}  %.17g"]
+    lines += [f"    {CROP_COLUMNS[i]:<8}  {BALANCE_ROWS[i]:<8}  %.17g" for i in range(3)]
+    return '\n'.join(lines) + '\n'
+
+
+def _stoch_chunk(multipliers, probabilities, avg_yield):
+    """一段情境的 BLOCKS 文字：每個情境一行 BL 加三個產量係數"""
+    values = crop_multipliers(multipliers) * np.asarray(avg_yield, dtype=float)
+    table = np.column_stack([probabilities, values])
+    template = _block_template()
+    return ''.join(template % tuple(row) for row in table.tolist())
+
+
+def write_stoch(path, multipliers, probabilities=None, params=None):
+    """以 BLOCKS DISCRETE 寫出所有情境；multipliers 為 (S,) 或 (S, 3)"""
+    multipliers = np.asarray(multipliers, dtype=float)
+    if probabilities is None:
+        probabilities = np.full(len(multipliers), 1 / len(multipliers))
+    return write_stoch_stream(path, [(multipliers, probabilities)], params)
+
+
+def write_stoch_stream(path, chunks, params=None):
+    """
+    串流寫出 stoch 檔。chunks 可為任何產生 (倍數, 機率) 的 iterable，
+    一次只處理一段，記憶體用量與情境總數無關。回傳寫出的情境數。
+    """
+    avg_yield = (params or {}).get('AVG_YIELD', default_params()['AVG_YIELD'])
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"STOCH         {PROBLEM_NAME}\n")
+        f.write("BLOCKS        DISCRETE\n")
+        for multipliers, probabilities in chunks:
+            f.write(_stoch_chunk(multipliers, probabilities, avg_yield))
+            count += len(multipliers)
+        f.write("ENDATA\n")
+    return count
+
+
+def sampled_chunks(num_scenarios, seed=None, chunk_size=CHUNK_SIZE, mean=MU, std=SIGMA):
+    """常態產量倍數的分段產生器，每個情境機率 1/num_scenarios"""
+    rng = np.random.default_rng(seed)
+    for start in range(0, num_scenarios, chunk_size):
+        n = min(chunk_size, num_scenarios - start)
+        yield rng.normal(mean, std, n), np.full(n, 1 / num_scenarios)
+
+
+def write_smps(basename, multipliers, probabilities=None, params=None):
+    write_core(basename + '.cor', params)
+    write_time(basename + '.tim')
+    write_stoch(basename + '.sto', multipliers, probabilities, params)
+
+
+def _sections(path):
+    """逐行讀檔，產生 (區段名稱, 欄位串列, 是否為區段標題行)"""
+    section = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip() or line.startswith('*'):
+                continue
+            fields = line.split()
+            if not line[0].isspace():
+                section = fields[0]
+                yield section, fields[1:], True
+            else:
+                yield section, fields, False
+
+
+def read_core(path):
+    rows, senses, obj_row = [], [], None
+    cols, col_index = [], {}
+    entries = []
+    rhs = {}
+    bounds = {}
+    for section, fields, header in _sections(path):
+        if header:
+            if section == 'RANGES':
+                raise NotImplementedError("不支援 RANGES 區段")
+            continue
+        if section == 'ROWS':
+            sense, name = fields
+            if sense == 'N':
+                if obj_row is None:
+                    obj_row = name
+                continue
+            rows.append(name)
+            senses.append(sense)
+        elif section == 'COLUMNS':
+            col = fields[0]
+            if col not in col_index:
+                col_index[col] = len(cols)
+                cols.append(col)
+            for row, value in zip(fields[1::2], fields[2::2]):
+                entries.append((col, row, float(value)))
+        elif section == 'RHS':
+            for row, value in zip(fields[1::2], fields[2::2]):
+                rhs[row] = float(value)
+        elif section == 'BOUNDS':
+            kind, col = fields[0], fields[2]
+            value = float(fields[3]) if len(fields) > 3 else None
+            bounds.setdefault(col, []).append((kind, value))
+
+    row_index = {name: i for i, name in enumerate(rows)}
+    c = np.zeros(len(cols))
+    A = sp.dok_matrix((len(rows), len(cols)))
+    for col, row, value in entries:
+        if row == obj_row:
+            c[col_index[col]] = value
+        else:
+            A[row_index[row], col_index[col]] = value
+
+    lb = np.zeros(len(cols))
+    ub = np.full(len(cols), np.inf)
+    for col, items in bounds.items():
+        j = col_index[col]
+        for kind, value in items:
+            if kind == 'UP':
+                ub[j] = value
+            elif kind == 'LO':
+                lb[j] = value
+            elif kind == 'FX':
+                lb[j] = ub[j] = value
+            elif kind == 'FR':
+                lb[j], ub[j] = -np.inf, np.inf
+            elif kind == 'MI':
+                lb[j] = -np.inf
+            elif kind == 'PL':
+                ub[j] = np.inf
+
+    return {
+        'name': obj_row,
+        'rows': rows,
+        'cols': cols,
+        'row_index': row_index,
+        'col_index': col_index,
+        'c': c,
+        'A': A.tocsr(),
+        'rhs': np.array([rhs.get(r, 0.0) for r in rows]),
+        'sense': np.array([SENSE_CHARS[s] for s in senses]),
+        'lb': lb,
+        'ub': ub
+    }
+
+
+def read_time(path, core):
+    """回傳第二階段的第一個欄索引與第一個列索引"""
+    starts = []
+    for section, fields, header in _sections(path):
+        if not header and section == 'PERIODS':
+            col, row, _ = fields
+            starts.append((core['col_index'][col], core['row_index'].get(row, 0)))
+    if len(starts) != 2:
+        raise ValueError(f"{path} 需要恰好兩個階段，讀到 {len(starts)} 個")
+    return starts[1]
+
+
+def read_stoch(path):
+    """
+    讀取 BLOCKS DISCRETE / INDEP DISCRETE。每個區塊回傳 positions（(欄, 列) 串列）、
+    values（(R, k) 陣列）與 probabilities（(R,)）；同一區塊的每個實現值必須列出相同位置。
+    """
+    blocks = {}
+    mode = None
+    current = None
+    for section, fields, header in _sections(path):
+        if header:
+            if section in ('BLOCKS', 'INDEP'):
+                mode = section
+                if fields and fields[0] != 'DISCRETE':
+                    raise NotImplementedError(f"只支援 DISCRETE 分佈，讀到 {fields[0]}")
+            elif section not in ('STOCH', 'ENDATA'):
+                raise NotImplementedError(f"不支援 {section} 區段")
+            continue
+        if mode == 'BLOCKS':
+            if fields[0] == 'BL':
+                name, prob = fields[1], float(fields[-1])
+                current = blocks.setdefault(name, {'positions': [], 'values': [], 'probabilities': []})
+                current['values'].append([])
+                current['probabilities'].append(prob)
+            else:
+                col, row, value = fields[0], fields[1], float(fields[2])
+                k = len(current['values'][-1])
+                if len(current['values']) == 1:
+                    current['positions'].append((col, row))
+                elif k >= len(current['positions']) or current['positions'][k] != (col, row):
+                    raise ValueError(f"區塊的實現值位置與第一個實現值不一致: {(col, row)}")
+                current['values'][-1].append(value)
+        elif mode == 'INDEP':
+            col, row, value, prob = fields[0], fields[1], float(fields[2]), float(fields[-1])
+            block = blocks.setdefault(f"{col}/{row}", {'positions': [(col, row)], 'values': [],
+                                                       'probabilities': []})
+            block['values'].append([value])
+            block['probabilities'].append(prob)
+
+    for name, b in blocks.items():
+        if any(len(v) != len(b['positions']) for v in b['values']):
+            raise ValueError(f"區塊 {name} 的實現值項目數不一致")
+    return [{'name': name,
+             'positions': b['positions'],
+             'values': np.array(b['values'], dtype=float),
+             'probabilities': np.array(b['probabilities'])}
+            for name, b in blocks.items()]
+
+
+def read_smps(basename):
+    core = read_core(basename + '.cor')
+    stage2_col, stage2_row = read_time(basename + '.tim', core)
+    return {'core': core, 'stage2_col': stage2_col, 'stage2_row': stage2_row,
+            'blocks': read_stoch(basename + '.sto')}
+
+
+def scenario_table(instance, max_scenarios=None):
+    """
+    各區塊取笛卡兒積得到情境。回傳 (positions, values (S, k), probabilities (S,))；
+    只有一個區塊時直接沿用其陣列，不做複製。
+    """
+    blocks = instance['blocks']
+    if len(blocks) == 1:
+        b = blocks[0]
+        return b['positions'], b['values'][:max_scenarios], b['probabilities'][:max_scenarios]
+    positions = [p for b in blocks for p in b['positions']]
+    combos = itertools.islice(itertools.product(*(range(len(b['probabilities'])) for b in blocks)),
+                              max_scenarios)
+    combos = np.array(list(combos))
+    values = np.hstack([b['values'][combos[:, i]] for i, b in enumerate(blocks)])
+    probabilities = np.prod([b['probabilities'][combos[:, i]] for i, b in enumerate(blocks)], axis=0)
+    return positions, values, probabilities
+
+
+def decomposition(instance, max_scenarios=None):
+    """
+    L-shaped 分解的資料：第一階段 (c, A, b, sense, lb, ub)，
+    第二階段共同稀疏樣式 T（技術矩陣）與 W（補償矩陣），各情境的數值 T_values / W_values、
+    右手邊 h、成本 q 與機率 p。情境 s 的第二階段為 min q_s'y, W_s y (sense) h_s - T_s x。
+    """
+    core = instance['core']
+    n1, m1 = instance['stage2_col'], instance['stage2_row']
+    A = core['A'].tocoo()
+    positions, values, probabilities = scenario_table(instance, max_scenarios)
+    num_scenarios = len(probabilities)
+
+    stage2 = A.row >= m1
+    is_T = stage2 & (A.col < n1)
+    is_W = stage2 & (A.col >= n1)
+    T_rows, T_cols = A.row[is_T] - m1, A.col[is_T]
+    W_rows, W_cols = A.row[is_W] - m1, A.col[is_W] - n1
+
+    T_values = np.tile(A.data[is_T], (num_scenarios, 1))
+    W_values = np.tile(A.data[is_W], (num_scenarios, 1))
+    h = np.tile(core['rhs'][m1:], (num_scenarios, 1))
+    q = np.tile(core['c'][n1:], (num_scenarios, 1))
+
+    T_lookup = {(r, c): k for k, (r, c) in enumerate(zip(T_rows, T_cols))}
+    W_lookup = {(r, c): k for k, (r, c) in enumerate(zip(W_rows, W_cols))}
+    for k, (col, row) in enumerate(positions):
+        if row == core['name']:
+            j = core['col_index'][col]
+            if j < n1:
+                raise NotImplementedError("不支援隨機的第一階段成本")
+            q[:, j - n1] = values[:, k]
+            continue
+        i = core['row_index'][row] - m1
+        if i < 0:
+            raise NotImplementedError("不支援隨機的第一階段限制式")
+        if col == 'RHS':
+            h[:, i] = values[:, k]
+            continue
+        j = core['col_index'][col]
+        lookup, target, key = (T_lookup, T_values, (i, j)) if j < n1 else (W_lookup, W_values, (i, j - n1))
+        if key not in lookup:
+            raise ValueError(f"隨機係數 ({col}, {row}) 不在核心模型的稀疏樣式中")
+        target[:, lookup[key]] = values[:, k]
+
+    return {
+        'c': core['c'][:n1],
+        'A': core['A'][:m1, :n1],
+        'b': core['rhs'][:m1],
+        'sense': core['sense'][:m1],
+        'lb': core['lb'][:n1],
+        'ub': core['ub'][:n1],
+        'T_pattern': (T_rows, T_cols),
+        'T_values': T_values,
+        'W_pattern': (W_rows, W_cols),
+        'W_values': W_values,
+        'h': h,
+        'q': q,
+        'sense2': core['sense'][m1:],
+        'lb2': core['lb'][n1:],
+        'ub2': core['ub'][n1:],
+        'p': probabilities,
+        'shape': (len(core['rows']) - m1, len(core['cols']) - n1)
+    }
+
+
+def extensive_form(instance, max_scenarios=None):
+    """
+    以向量化方式組出擴展式 min c'z, A z (sense) b，z = [x, y_1, ..., y_S]。
+    每個情境的 T、W 都以 COO 三元組一次平移組裝，建構時間與 S × 非零元素數成正比。
+    """
+    d = decomposition(instance, max_scenarios)
+    S = len(d['p'])
+    m1, n1 = d['A'].shape
+    m2, n2 = d['shape']
+    offsets = np.arange(S)
+
+    A1 = d['A'].tocoo()
+    T_rows, T_cols = d['T_pattern']
+    W_rows, W_cols = d['W_pattern']
+    rows = np.concatenate([
+        A1.row,
+        (m1 + offsets[:, None] * m2 + T_rows).ravel(),
+        (m1 + offsets[:, None] * m2 + W_rows).ravel()
+    ])
+    cols = np.concatenate([
+        A1.col,
+        np.tile(T_cols, S),
+        (n1 + offsets[:, None] * n2 + W_cols).ravel()
+    ])
+    data = np.concatenate([A1.data, d['T_values'].ravel(), d['W_values'].ravel()])
+    A = sp.csr_matrix((data, (rows, cols)), shape=(m1 + S * m2, n1 + S * n2))
+
+    return {
+        'c': np.concatenate([d['c'], (d['p'][:, None] * d['q']).ravel()]),
+        'A': A,
+        'rhs': np.concatenate([d['b'], d['h'].ravel()]),
+        'sense': np.concatenate([d['sense'], np.tile(d['sense2'], S)]),
+        'lb': np.concatenate([d['lb'], np.tile(d['lb2'], S)]),
+        'ub': np.concatenate([d['ub'], np.tile(d['ub2'], S)]),
+        'num_first_stage': n1,
+        'num_scenarios': S
+    }
+
+
+def solve_extensive_form(ef):
+    import gurobipy as gp
+    from gurobipy import GRB
+
+    model = gp.Model("SMPS_EF")
+    model.setParam('OutputFlag', 0)
+    z = model.addMVar(len(ef['c']), lb=ef['lb'], ub=ef['ub'])
+    model.addMConstr(ef['A'], z, ef['sense'], ef['rhs'])
+    model.setObjective(ef['c'] @ z, GRB.MINIMIZE)
+    model.optimize()
+    return {'objective': model.objVal, 'acres': z.X[:ef['num_first_stage']]}
+
+
+if __name__ == "__main__":
+    import resource  # 僅 Unix 提供，只有示範的記憶體量測用到
+
+    from farmer import build_rp_model
+
+    out_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "smps")
+    os.makedirs(out_dir, exist_ok=True)
+
+    print("="*70)
+    print("SMPS 匯出與匯入：三情境 RP")
+    print("="*70)
+    base = os.path.join(out_dir, "farmer3")
+    write_smps(base, [sc['multiplier'] for sc in scenarios], [sc['probability'] for sc in scenarios])
+    result = solve_extensive_form(extensive_form(read_smps(base)))
+    acres = result['acres']
+    print(f"讀回後求解擴展式: 小麥={acres[0]:.2f}, 玉米={acres[1]:.2f}, 甜菜={acres[2]:.2f}，"
+          f"期望利潤 ${-result['objective']:,.2f}")
+
+    print("\n" + "="*70)
+    print("抽樣情境：SMPS 擴展式 vs build_rp_model")
+    print("="*70)
+    samples = np.random.default_rng(34).normal(MU, SIGMA, 200)
+    base = os.path.join(out_dir, "farmer200")
+    write_smps(base, samples)
+    result = solve_extensive_form(extensive_form(read_smps(base)))
+    rp = build_rp_model(samples)
+    rp['model'].optimize()
+    print(f"SMPS 擴展式: ${-result['objective']:,.4f}")
+    print(f"build_rp_model: ${rp['model'].objVal:,.4f}")
+
+    print("\n" + "="*70)
+    print("串流寫出 10^6 個抽樣情境")
+    print("="*70)
+    base = os.path.join(out_dir, "farmer1m")
+    write_core(base + '.cor')
+    write_time(base + '.tim')
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    count = write_stoch_stream(base + '.sto', sampled_chunks(1_000_000, seed=34))
+    elapsed = time.perf_counter() - start
+    rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+    print(f"情境數 {count:,}，{elapsed:.2f} 秒，檔案 {os.path.getsize(base + '.sto') / 2**20:,.1f} MiB，"
+          f"尖峰常駐記憶體增加 {rss_growth / 1024:,.1f} MiB")
+
+    start = time.perf_counter()
+    instance = read_smps(base)
+    read_time_s = time.perf_counter() - start
+    start = time.perf_counter()
+    ef = extensive_form(instance)
+    build_time = time.perf_counter() - start
+    print(f"讀取 {read_time_s:.2f} 秒；組出擴展式 {build_time:.2f} 秒，"
+          f"{ef['A'].shape[0]:,} 列 × {ef['A'].shape[1]:,} 欄，{ef['A'].nnz:,} 個非零元素")
@@ -0,0 +1,75 @@
+"""
+依模型規模快取的 Gurobi 參數（由 autotune.py 量測後寫入）
+
+規模鍵為（模型族, 作物數, 價格級距數, 情境數級距），情境數以 10 的次方向上取整分桶，
+例如 30 個情境屬於「<=1e2」；模型族區分 farmer 的擴展式與 multicrop 的向量化模型，
+即使作物數相同也不共用項目。
+套用是選擇性的：build_rp_model 等建構函式只有在 tuned=True 時才呼叫 apply_tuned_params，
+預設一律使用 Gurobi 預設值，結果不受未納入版本控制的快取檔影響。
+只求解一次的大模型（SAA 批次、擴展式）才應開啟；之後要暖啟動的模型不要開啟，
+Crossover=0 不產生基底，暖啟動會失效（farmer.apply_params 會把 Crossover 恢復為預設）。
+快取檔預設為本目錄的 solver_cache.json，可用環境變數 FARMER_SOLVER_CACHE 指定。
+"""
+import json
+import math
+import os
+import time
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "solver_cache.json")
+
+# 依檔案修改時間快取讀入的內容，避免每次建構模型都重新讀檔
+_loaded = {}
+
+
+def cache_path():
+    return os.environ.get('FARMER_SOLVER_CACHE', DEFAULT_PATH)
+
+
+def scenario_bucket(num_scenarios):
+    return f"<=1e{max(0, math.ceil(math.log10(max(num_scenarios, 1))))}"
+
+
+def shape_key(crops, tiers, num_scenarios, family='farmer'):
+    return f"{family}:crops={crops},tiers={tiers},scenarios{scenario_bucket(num_scenarios)}"
+
+
+def load_cache(path=None):
+    path = path or cache_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    cached = _loaded.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding='utf-8') as f:
+            _loaded[path] = (mtime, json.load(f))
+    return _loaded[path][1]
+
+
+def save_entry(key, entry, path=None):
+    """寫入（覆蓋）一個規模的調校結果，並附加到該規模的量測紀錄"""
+    path = path or cache_path()
+    cache = dict(load_cache(path))
+    history = cache.get(key, {}).get('history', [])
+    entry = {**entry, 'updated': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    history = history + [{k: entry[k] for k in ('params', 'default_seconds', 'best_seconds', 'speedup', 'updated')}]
+    cache[key] = {**entry, 'history': history}
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return cache[key]
+
+
+def lookup(crops, tiers, num_scenarios, path=None, family='farmer'):
+    entry = load_cache(path).get(shape_key(crops, tiers, num_scenarios, family))
+    return entry['params'] if entry else None
+
+
+def apply_tuned_params(model, crops, tiers, num_scenarios, path=None, family='farmer'):
+    """有快取項目時把參數設到模型上，回傳套用的參數（沒有時為 None）"""
+    params = lookup(crops, tiers, num_scenarios, path, family)
+    if params:
+        for name, value in params.items():
+            model.setParam(name, value)
+    return params
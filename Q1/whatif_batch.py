@@ -0,0 +1,252 @@
+"""
+價格、成本與土地參數格點的批次 what-if
+
+(d)小題的 RP 常需要對數百組 SELL_PRICE、BUY_PRICE、PLANT_COST、TOTAL_LAND 與甜菜配額重新求解，
+原本是手動修改常數。這裡：
+  - 讀取格點規格（JSON，每個參數一串候選值，展開成笛卡兒積）或參數組 CSV（每列一組）
+  - 以 Hilbert 空間填充曲線排序，相鄰兩次求解的參數盡量接近，暖啟動的基底變動較少
+  - 依曲線順序切成連續區段分給行程池，每個 worker 只建一次模型，以 apply_params 就地修改係數
+  - 每完成一個區段就把結果附加寫入 CSV（或安裝了 pyarrow 時寫 Parquet）
+
+參數名稱：純量直接用 TOTAL_LAND、BEET_QUOTA；串列參數用「名稱.索引」，
+例如 SELL_PRICE.1 是玉米售價、PLANT_COST.2 是甜菜種植成本。
+
+用法:
+  python whatif_batch.py --grid grid.json --out results.csv
+  python whatif_batch.py --csv params.csv --out results.parquet --workers 4
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from farmer import scenarios, build_rp_model, default_params, apply_params
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+CHUNK_SIZE = 64
+RESULT_COLUMNS = ['run', 'wheat', 'corn', 'beet', 'objective', 'iterations']
+
+
+def expand_grid(spec):
+    """格點規格 {參數: [候選值...]} 展開成參數組 list"""
+    keys = list(spec)
+    return [dict(zip(keys, values)) for values in itertools.product(*(spec[k] for k in keys))]
+
+
+def read_param_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return [{k: float(v) for k, v in row.items()} for row in csv.DictReader(f)]
+
+
+def to_params(flat):
+    """{'SELL_PRICE.1': 140, 'TOTAL_LAND': 450} → apply_params 用的完整參數"""
+    params = default_params()
+    for key, value in flat.items():
+        name, _, index = key.partition('.')
+        if name not in params:
+            raise KeyError(f"未知的參數: {key}")
+        if index:
+            params[name][int(index)] = value
+        else:
+            params[name] = value
+    return params
+
+
+def hilbert_index(coords, bits):
+    """
+    d 維 Hilbert 曲線上的位置（Skilling 2004 的轉置演算法，逐列向量化）。
+    coords: (n, d) 非負整數，每維小於 2**bits。
+    """
+    x = np.array(coords, dtype=np.int64)
+    n, d = x.shape
+    # 反向 Gray 編碼的座標轉換
+    q = 1 << (bits - 1)
+    while q > 1:
+        p = q - 1
+        for i in range(d):
+            high = (x[:, i] & q) != 0
+            x[high, 0] ^= p
+            t = (x[~high, 0] ^ x[~high, i]) & p
+            x[~high, 0] ^= t
+            x[~high, i] ^= t
+        q >>= 1
+    for i in range(1, d):
+        x[:, i] ^= x[:, i - 1]
+    t = np.zeros(n, dtype=np.int64)
+    q = 1 << (bits - 1)
+    while q > 1:
+        t[(x[:, d - 1] & q) != 0] ^= q - 1
+        q >>= 1
+    x ^= t[:, None]
+
+    # 轉置形式交錯成單一整數：位元由高到低、維度由 0 到 d-1
+    index = np.zeros(n, dtype=object if bits * d > 62 else np.int64)
+    for b in range(bits - 1, -1, -1):
+        for i in range(d):
+            index = index * 2 + ((x[:, i] >> b) & 1)
+    return index
+
+
+def hilbert_order(runs, bits=None):
+    """依各參數的排名（而非原始值）映射到整數格點後，回傳 Hilbert 曲線上的執行順序"""
+    keys = sorted({k for run in runs for k in run})
+    if not runs or not keys:
+        return list(range(len(runs)))
+    values = np.array([[run.get(k, np.nan) for k in keys] for run in runs], dtype=float)
+    ranks = np.column_stack([np.unique(col, return_inverse=True)[1] for col in values.T])
+    if bits is None:
+        bits = max(1, int(np.ceil(np.log2(ranks.max() + 1))))
+    return list(np.argsort(hilbert_index(ranks, bits), kind='stable'))
+
+
+# worker 行程內的暖模型
+_rp = {}
+
+
+def _init_worker():
+    _rp['model'] = build_rp_model([sc['multiplier'] for sc in scenarios],
+                                  [sc['probability'] for sc in scenarios])
+
+
+def _solve_chunk(chunk):
+    """依序求解一段連續的參數組；每組只修改係數，從上一組的基底暖啟動"""
+    rp = _rp['model']
+    rows = []
+    for run_id, flat in chunk:
+        apply_params(rp, to_params(flat))
+        rp['model'].optimize()
+        rows.append({
+            'run': run_id,
+            **flat,
+            'wheat': rp['x'][0].X,
+            'corn': rp['x'][1].X,
+            'beet': rp['x'][2].X,
+            'objective': rp['model'].objVal,
+            'iterations': int(rp['model'].IterCount)
+        })
+    return rows
+
+
+class ResultWriter:
+    """邊求解邊寫出；副檔名 .parquet 且可匯入 pyarrow 時寫 Parquet，否則寫 CSV"""
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        self.parquet = path.endswith('.parquet')
+        if self.parquet and pq is None:
+            raise ImportError("寫入 Parquet 需要 pyarrow；請改用 .csv 輸出")
+        self._writer = None
+        self._file = None
+
+    def write(self, rows):
+        if self.parquet:
+            table = pa.Table.from_pylist(rows).select(self.columns)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            if self._writer is None:
+                self._file = open(self.path, 'w', newline='', encoding='utf-8')
+                self._writer = csv.DictWriter(self._file, fieldnames=self.columns)
+                self._writer.writeheader()
+            self._writer.writerows(rows)
+            self._file.flush()
+
+    def close(self):
+        if self._writer is not None and self.parquet:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_batch(runs, out_path, max_workers=4, chunk_size=CHUNK_SIZE, order='hilbert', verbose=True):
+    """
+    求解所有參數組並串流寫出結果。order 為 'hilbert'、'given' 或 'random'（對照用）。
+    回傳摘要（執行數、總單形法迭代數、耗時）。
+    """
+    if order == 'hilbert':
+        sequence = hilbert_order(runs)
+    elif order == 'random':
+        sequence = list(np.random.default_rng(0).permutation(len(runs)))
+    else:
+        sequence = list(range(len(runs)))
+    ordered = [(int(i), runs[i]) for i in sequence]
+    chunks = [ordered[s:s + chunk_size] for s in range(0, len(ordered), chunk_size)]
+
+    param_columns = sorted({k for run in runs for k in run})
+    columns = ['run'] + param_columns + RESULT_COLUMNS[1:]
+
+    start = time.perf_counter()
+    total_iterations = 0
+    done = 0
+    with ResultWriter(out_path, columns) as writer, \
+            ProcessPoolExecutor(max_workers, initializer=_init_worker) as pool:
+        futures = [pool.submit(_solve_chunk, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            rows = future.result()
+            writer.write(rows)
+            total_iterations += sum(r['iterations'] for r in rows)
+            done += len(rows)
+            if verbose:
+                print(f"  完成 {done}/{len(runs)}")
+    return {'runs': len(runs), 'iterations': total_iterations, 'elapsed': time.perf_counter() - start}
+
+
+DEFAULT_GRID = {
+    'SELL_PRICE.0': [150, 160, 170, 180, 190],
+    'SELL_PRICE.1': [120, 135, 150, 165],
+    'PLANT_COST.2': [220, 260, 300],
+    'TOTAL_LAND': [400, 450, 500, 550, 600],
+    'BEET_QUOTA': [5000, 6000, 7000]
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="農夫問題 RP 的批次 what-if")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--grid', help="格點規格 JSON：{參數: [候選值...]}")
+    source.add_argument('--csv', help="參數組 CSV：每欄一個參數、每列一組")
+    parser.add_argument('--out', default='whatif_results.csv', help="輸出 .csv 或 .parquet")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--compare', action='store_true', help="另以隨機順序執行一次，比較暖啟動迭代數")
+    args = parser.parse_args()
+
+    if args.csv:
+        runs = read_param_csv(args.csv)
+    elif args.grid:
+        with open(args.grid, encoding='utf-8') as f:
+            runs = expand_grid(json.load(f))
+    else:
+        runs = expand_grid(DEFAULT_GRID)
+
+    print("="*70)
+    print(f"批次 what-if：{len(runs)} 組參數，{args.workers} 個 worker")
+    print("="*70)
+    summary = run_batch(runs, args.out, args.workers, args.chunk_size, verbose=False)
+    print(f"Hilbert 順序: {summary['elapsed']:.2f} 秒，總迭代數 {summary['iterations']:,}"
+          f"（平均 {summary['iterations'] / summary['runs']:.2f}），結果寫入 {args.out}")
+
+    if args.compare:
+        root, ext = os.path.splitext(args.out)
+        for order in ['given', 'random']:
+            s = run_batch(runs, f"{root}_{order}{ext}", args.workers, args.chunk_size, order=order, verbose=False)
+            print(f"{order:>7} 順序: {s['elapsed']:.2f} 秒，總迭代數 {s['iterations']:,}"
+                  f"（平均 {s['iterations'] / s['runs']:.2f}）")
@@ -0,0 +1,334 @@
+"""
+本機 what-if 求解服務：常駐暖模型、期限內回傳目前最佳答案
+
+規劃人員想即時知道「玉米價格降到 140 時 RP 的種植面積是多少」，
+原本每次都要冷啟動執行(d)小題的腳本。這個服務：
+  - 在 worker 行程中常駐 EV、RP 與第二階段（recourse）模型，
+    每種模型固定交給同一個 worker，參數變動以 apply_params 就地修改係數後暖啟動
+  - 每個請求可指定延遲預算 budget_ms，以 Gurobi TimeLimit 控制；
+    時間不夠時回傳目前最佳可行解（上一個最佳種植面積縮到新土地上限內，在新參數下的利潤）
+    與上界（EV 的 Jensen 上界，只在剩餘預算內求解）；不可行或無界時回傳 error
+  - 參數完全相同、且進行中求解的預算不大於本請求預算的並行請求合併成一次求解
+  - 記錄每個請求的延遲，stats 請求回傳 p50 / p99
+
+通訊協定：每行一個 JSON。
+  {"kind": "rp", "params": {"SELL_PRICE": [170, 140, 36, 10]}, "budget_ms": 50}
+  {"kind": "recourse", "acres": [170, 80, 250], "multiplier": 0.8}
+  {"op": "stats"}
+
+用法:
+  python whatif_service.py --serve --port 8765       # localhost TCP
+  python whatif_service.py --serve --unix /tmp/farmer.sock
+  python whatif_service.py                           # 啟動服務並執行示範請求
+"""
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from gurobipy import GRB
+
+from farmer import scenarios, build_rp_model, apply_params, default_params, total_profit
+
+KINDS = ['ev', 'rp', 'recourse']
+RP_MULTS = [sc['multiplier'] for sc in scenarios]
+RP_PROBS = [sc['probability'] for sc in scenarios]
+
+# worker 行程內的暖模型與上一次的最佳解
+_models = {}
+_incumbents = {}
+
+
+def _init_worker():
+    _models['ev'] = build_rp_model([1.0], name="EV")
+    _models['rp'] = build_rp_model(RP_MULTS, RP_PROBS, name="RP")
+    _models['recourse'] = build_rp_model([1.0], name="Recourse")
+    for kind, rp in _models.items():
+        rp['model'].optimize()
+        _incumbents[kind] = [rp['x'][i].X for i in range(3)]
+
+
+def _set_recourse(rp, acres, multiplier):
+    """第二階段模型：固定種植面積，只改產量倍數"""
+    for i in range(3):
+        rp['x'][i].LB = rp['x'][i].UB = acres[i]
+    rp['multipliers'] = np.array([multiplier])
+
+
+def _expected_profit(kind, acres, params, request):
+    if kind == 'ev':
+        mults, probs = [1.0], [1.0]
+    elif kind == 'rp':
+        mults, probs = RP_MULTS, RP_PROBS
+    else:
+        mults, probs = [request.get('multiplier', 1.0)], [1.0]
+    return float(np.dot(probs, total_profit(acres, mults, params)))
+
+
+def _fit_to_land(acres, params):
+    """上一個最佳解若超過新的土地上限，等比例縮到上限內（第二階段對任何面積都有解）"""
+    land = params.get('TOTAL_LAND', default_params()['TOTAL_LAND'])
+    total = sum(acres)
+    if total <= land + 1e-9:
+        return list(acres)
+    return [a * land / total for a in acres]
+
+
+def solve_request(request):
+    """
+    在 worker 中執行：就地套用參數、暖啟動求解。
+    超過延遲預算（TIME_LIMIT）時回傳目前最佳可行解與上界；不可行、無界等狀態回傳錯誤。
+    """
+    start = time.perf_counter()
+    kind = request['kind']
+    params = request.get('params', {})
+    rp = _models[kind]
+    model = rp['model']
+
+    if kind == 'recourse':
+        _set_recourse(rp, request['acres'], request.get('multiplier', 1.0))
+    apply_params(rp, params)
+
+    budget = request.get('budget_s')
+    model.setParam('TimeLimit', max(budget, 0.0) if budget is not None else GRB.INFINITY)
+    model.optimize()
+
+    response = {'kind': kind, 'status': model.status}
+    if model.status == GRB.OPTIMAL:
+        acres = [rp['x'][i].X for i in range(3)]
+        _incumbents[kind] = acres
+        response.update({'exact': True, 'acres': acres, 'objective': model.objVal, 'bound': model.objVal})
+    elif model.status == GRB.TIME_LIMIT:
+        if model.SolCount > 0:
+            acres = [rp['x'][i].X for i in range(3)]
+        elif kind == 'recourse':
+            acres = list(request['acres'])
+        else:
+            acres = _fit_to_land(_incumbents[kind], params)
+        incumbent = _expected_profit(kind, acres, params, request)
+        bound = None
+        remaining = budget - (time.perf_counter() - start)
+        if kind == 'rp' and remaining > 0:
+            # EV 的 Jensen 上界，只用剩下的延遲預算
+            ev = _models['ev']
+            apply_params(ev, params)
+            ev['model'].setParam('TimeLimit', remaining)
+            ev['model'].optimize()
+            if ev['model'].status == GRB.OPTIMAL:
+                bound = ev['model'].objVal
+        response.update({'exact': False, 'acres': acres, 'objective': incumbent, 'bound': bound})
+    else:
+        reasons = {GRB.INFEASIBLE: "不可行", GRB.INF_OR_UNBD: "不可行或無界", GRB.UNBOUNDED: "無界"}
+        response['error'] = f"模型{reasons.get(model.status, '求解失敗')}（狀態碼 {model.status}）"
+
+    response['iterations'] = model.IterCount
+    response['solve_ms'] = (time.perf_counter() - start) * 1000
+    return response
+
+
+class WhatIfService:
+    def __init__(self, num_workers=len(KINDS)):
+        # 每個 executor 只有一個行程，同一種模型永遠送到同一個 worker，保持暖啟動
+        self.executors = [ProcessPoolExecutor(1, initializer=_init_worker) for _ in range(num_workers)]
+        self.inflight = {}
+        self.latencies = []
+        self.coalesced = 0
+
+    def close(self):
+        for ex in self.executors:
+            ex.shutdown()
+
+    def _executor_for(self, kind):
+        return self.executors[KINDS.index(kind) % len(self.executors)]
+
+    @staticmethod
+    def request_key(request):
+        return json.dumps({k: request.get(k) for k in ('kind', 'params', 'acres', 'multiplier')},
+                          sort_keys=True)
+
+    @staticmethod
+    def budget_s(request):
+        """延遲預算（秒）；未指定為無限"""
+        if request.get('budget_ms') is not None:
+            return float(request['budget_ms']) / 1000
+        if request.get('budget_s') is not None:
+            return float(request['budget_s'])
+        return float('inf')
+
+    @staticmethod
+    def validate(request):
+        """送進 worker 前先檢查請求格式，錯誤以 ValueError 回報"""
+        if not isinstance(request, dict):
+            raise ValueError(f"請求必須是 JSON 物件，收到 {type(request).__name__}")
+        if request.get('kind') == 'recourse':
+            acres = request.get('acres')
+            if not isinstance(acres, list) or len(acres) != 3:
+                raise ValueError("recourse 請求需要 acres（三種作物的面積）")
+
+    async def handle(self, request):
+        received = time.perf_counter()
+        self.validate(request)
+        if request.get('op') == 'stats':
+            return self.stats()
+        if request.get('kind') not in KINDS:
+            return {'error': f"未知的模型種類: {request.get('kind')}"}
+
+        # 只合併到預算不大於本請求的進行中求解，避免短期限的請求等待沒有期限的求解
+        key = self.request_key(request)
+        budget = self.budget_s(request)
+        entries = self.inflight.setdefault(key, [])
+        task = next((t for b, t in entries if b <= budget), None)
+        if task is None:
+            job = dict(request)
+            job['budget_s'] = None if budget == float('inf') else budget
+            loop = asyncio.get_running_loop()
+            task = asyncio.ensure_future(loop.run_in_executor(self._executor_for(request['kind']), solve_request, job))
+            entry = (budget, task)
+            entries.append(entry)
+            task.add_done_callback(lambda _: self._finish(key, entry))
+            coalesced = False
+        else:
+            self.coalesced += 1
+            coalesced = True
+
+        response = dict(await task)
+        latency = (time.perf_counter() - received) * 1000
+        self.latencies.append(latency)
+        response.update({'id': request.get('id'), 'coalesced': coalesced, 'latency_ms': latency})
+        return response
+
+    def _finish(self, key, entry):
+        entries = self.inflight.get(key, [])
+        if entry in entries:
+            entries.remove(entry)
+        if not entries:
+            self.inflight.pop(key, None)
+
+    def stats(self):
+        if not self.latencies:
+            return {'requests': 0}
+        lat = np.array(self.latencies)
+        return {
+            'requests': len(lat),
+            'coalesced': self.coalesced,
+            'p50_ms': float(np.percentile(lat, 50)),
+            'p99_ms': float(np.percentile(lat, 99)),
+            'max_ms': float(lat.max())
+        }
+
+    async def serve_connection(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    response = {'error': f"JSON 格式錯誤: {e}"}
+                else:
+                    try:
+                        response = await self.handle(request)
+                    except Exception as e:
+                        request_id = request.get('id') if isinstance(request, dict) else None
+                        response = {'id': request_id, 'error': str(e)}
+                writer.write((json.dumps(response, ensure_ascii=False) + '\n').encode())
+                await writer.drain()
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+async def start_server(service, host='127.0.0.1', port=8765, unix_path=None):
+    if unix_path:
+        return await asyncio.start_unix_server(service.serve_connection, path=unix_path)
+    return await asyncio.start_server(service.serve_connection, host, port)
+
+
+async def send_requests(requests, host='127.0.0.1', port=8765, unix_path=None):
+    """簡單的客戶端：每個請求各開一條連線並行送出"""
+    async def one(request):
+        if unix_path:
+            reader, writer = await asyncio.open_unix_connection(unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        writer.write((json.dumps(request) + '\n').encode())
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        writer.close()
+        await writer.wait_closed()
+        return response
+    return await asyncio.gather(*(one(r) for r in requests))
+
+
+async def demo(port):
+    service = WhatIfService()
+    server = await start_server(service, port=port)
+    try:
+        # 暖機：讓每個 worker 建好模型
+        await send_requests([{'kind': k, 'acres': [170, 80, 250]} for k in KINDS], port=port)
+        service.latencies.clear()
+
+        print("="*70)
+        print("What-if 查詢：玉米售價變動下的 RP 種植面積")
+        print("="*70)
+        for corn_price in [150, 140, 120, 100]:
+            params = {'SELL_PRICE': [170, corn_price, 36, 10]}
+            r, = await send_requests([{'kind': 'rp', 'params': params, 'budget_ms': 50}], port=port)
+            print(f"  玉米 ${corn_price}: 小麥={r['acres'][0]:.2f}, 玉米={r['acres'][1]:.2f}, "
+                  f"甜菜={r['acres'][2]:.2f}，期望利潤 ${r['objective']:,.2f}（{r['latency_ms']:.2f} ms）")
+
+        print("\n並行送出 40 個請求（其中大量重複）:")
+        rng = np.random.default_rng(34)
+        batch = []
+        for i in range(40):
+            corn_price = int(rng.choice([150, 140, 130]))
+            batch.append({'id': i, 'kind': str(rng.choice(KINDS)), 'acres': [170, 80, 250], 'multiplier': 0.8,
+                          'params': {'SELL_PRICE': [170, corn_price, 36, 10]}, 'budget_ms': 100})
+        responses = await send_requests(batch, port=port)
+        print(f"  合併的請求數: {sum(r['coalesced'] for r in responses)}")
+
+        r, = await send_requests([{'kind': 'rp', 'params': {'TOTAL_LAND': 400}, 'budget_ms': 0}], port=port)
+        print(f"\n土地 400 英畝、延遲預算 0 ms 的請求: exact={r['exact']}，"
+              f"目前最佳（縮到土地上限）{np.round(r['acres'], 1)} ${r['objective']:,.2f}，"
+              f"上界 {'$' + format(r['bound'], ',.2f') if r['bound'] is not None else '無（預算已用完）'}")
+
+        r, = await send_requests([{'kind': 'recourse', 'acres': [170, 80, 250],
+                                   'params': {'TOTAL_LAND': 400}}], port=port)
+        print(f"固定面積超過土地上限的第二階段請求: {r['error']}")
+
+        stats, = await send_requests([{'op': 'stats'}], port=port)
+        print(f"\n延遲統計（{stats['requests']} 個請求）: p50 = {stats['p50_ms']:.2f} ms，"
+              f"p99 = {stats['p99_ms']:.2f} ms，合併 {stats['coalesced']} 次")
+    finally:
+        server.close()
+        await server.wait_closed()
+        service.close()
+
+
+async def serve_forever(args):
+    service = WhatIfService(args.workers)
+    server = await start_server(service, port=args.port, unix_path=args.unix)
+    print(f"服務啟動於 {args.unix or f'127.0.0.1:{args.port}'}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="農夫問題 what-if 求解服務")
+    parser.add_argument('--serve', action='store_true', help="持續提供服務")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None, help="改用 Unix socket 路徑")
+    parser.add_argument('--workers', type=int, default=len(KINDS))
+    args = parser.parse_args()
+
+    if args.serve:
+        asyncio.run(serve_forever(args))
+    else:
+        asyncio.run(demo(args.port))
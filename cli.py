@@ -0,0 +1,177 @@
+"""
+作業程式的統一命令列入口
+
+Q1、Q_2 的每一題都是獨立腳本，直接執行時才會載入 gurobipy、numpy、scipy。
+這裡提供兩個指令，子指令對應到原本的腳本：
+  farmer   ev | eev | rp | ws | saa          （Q1 農夫問題：a / b / d / e / g 小題）
+  decision ev | bayes | evpi | eve | survey  （Q_2 決策分析：d / g / i / j / k 小題）
+本模組頂層只匯入標準函式庫；選定子指令後才以 runpy 執行對應腳本，
+所以 decision 的子指令完全不會載入 gurobipy / numpy / scipy。
+加上 --format console|json|markdown 時不執行腳本，改由 reports 計算結構化結果後輸出。
+安裝時 Q1、Q_2 目錄與 reports 一起放在 cli.py 旁邊（見 pyproject.toml），路徑解析與原始碼目錄相同。
+
+用法:
+  pip install .           （安裝 farmer、decision 兩個指令；讀 Parquet 需 pip install .[parquet]）
+  farmer rp
+  decision survey
+  python cli.py farmer saa
+  farmer ws --format json
+  python cli.py --startup （量測各子指令的冷啟動時間：直譯器、匯入 cli、分派與載入依賴，不含計算）
+"""
+import argparse
+import os
+import runpy
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+COMMANDS = {
+    'farmer': {
+        'ev': ('Q1', 'a.py', "平均情境（EV）解"),
+        'eev': ('Q1', 'b.py', "EV 解在三個情境下的期望利潤（EEV）"),
+        'rp': ('Q1', 'd.py', "二階段隨機規劃（RP）"),
+        'ws': ('Q1', 'e.py', "Wait-and-See、EVPI 與 VSS"),
+        'saa': ('Q1', 'g.py', "樣本平均近似（SAA）"),
+    },
+    'decision': {
+        'ev': ('Q_2', 'd.py', "期望值準則"),
+        'bayes': ('Q_2', 'g.py', "貝氏定理後驗機率"),
+        'evpi': ('Q_2', 'i.py', "完全資訊期望值（EVPI）"),
+        'eve': ('Q_2', 'j.py', "實驗期望值（EVE）與 EVSI"),
+        'survey': ('Q_2', 'k.py', "是否雇用市場調查"),
+    },
+}
+
+# --format 時各子指令要輸出的結果物件（ws 另外需要 RP 與 EEV 才能算 EVPI、VSS）
+STRUCTURED = {
+    'farmer': {
+        'ev': lambda r: [r.solve_ev()],
+        'eev': lambda r: [r.evaluate_eev()],
+        'rp': lambda r: [r.solve_rp()],
+        'ws': lambda r: _value_of_information(r),
+        'saa': lambda r: [r.solve_saa()],
+    },
+    'decision': {
+        'ev': lambda r: [r.expected_value_decision()],
+        'bayes': lambda r: [r.bayes_update()],
+        'evpi': lambda r: [r.perfect_information()],
+        'eve': lambda r: [r.sample_information()],
+        'survey': lambda r: [r.survey_decision()],
+    },
+}
+
+
+def _value_of_information(reports):
+    ws, rp, eev = reports.wait_and_see(), reports.solve_rp(), reports.evaluate_eev()
+    return [ws, reports.evpi(ws, rp), reports.vss(rp, eev)]
+
+
+def script_path(group, command):
+    folder, filename, _ = COMMANDS[group][command]
+    return os.path.join(ROOT, folder, filename)
+
+
+def run(group, command):
+    """以 __main__ 身分執行腳本；腳本目錄放到 sys.path 最前面，讓同目錄的 import 照常運作"""
+    path = script_path(group, command)
+    sys.path.insert(0, os.path.dirname(path))
+    try:
+        runpy.run_path(path, run_name="__main__")
+    finally:
+        sys.path.remove(os.path.dirname(path))
+
+
+def load_imports(group, command):
+    """只執行腳本頂層的 import 敘述，載入子指令的依賴而不做任何計算（冷啟動量測用）"""
+    import ast
+    path = script_path(group, command)
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    imports = ast.Module([node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))],
+                         type_ignores=[])
+    sys.path.insert(0, os.path.dirname(path))
+    try:
+        exec(compile(imports, path, 'exec'), {'__name__': '__cold_start__'})
+    finally:
+        sys.path.remove(os.path.dirname(path))
+
+
+def build_parser(group):
+    parser = argparse.ArgumentParser(prog=group, description=f"執行 {COMMANDS[group]['ev'][0]} 的各小題")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for command, (folder, filename, help_text) in COMMANDS[group].items():
+        command_parser = sub.add_parser(command, help=f"{help_text}（{folder}/{filename}）")
+        command_parser.add_argument('--format', choices=['console', 'json', 'markdown'], default=None,
+                                    help="輸出結構化結果而不執行原腳本")
+        command_parser.add_argument('--imports-only', action='store_true', help=argparse.SUPPRESS)
+    return parser
+
+
+def main(group, argv=None):
+    args = build_parser(group).parse_args(argv)
+    if args.imports_only:
+        load_imports(group, args.command)
+        return
+    if args.format is None:
+        run(group, args.command)
+        return
+    import reports
+    results = STRUCTURED[group][args.command](reports)
+    if args.format == 'json':
+        print('[' + ', '.join(r.to_json() for r in results) + ']')
+    else:
+        print('\n\n'.join(r.render(args.format) for r in results))
+
+
+def farmer(argv=None):
+    main('farmer', argv)
+
+
+def decision(argv=None):
+    main('decision', argv)
+
+
+def _wall_time(argv, repeats):
+    """子行程的最短牆鐘時間（秒）；輸出丟棄"""
+    import subprocess
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True, cwd=ROOT)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def startup_times(repeats=3):
+    """
+    量測冷啟動時間：空的直譯器、只匯入本模組（不選子指令），以及每個子指令從啟動到
+    解析參數、分派並載入該子指令依賴為止的時間（--imports-only，不執行計算）。
+    回傳 {名稱: 秒}，每項取 repeats 次中的最短時間。
+    """
+    cli = os.path.join(ROOT, 'cli.py')
+    times = {
+        'python（空的直譯器）': _wall_time([sys.executable, '-c', 'pass'], repeats),
+        'import cli': _wall_time([sys.executable, '-c', 'import cli'], repeats),
+    }
+    for group, commands in COMMANDS.items():
+        for command in commands:
+            times[f'{group} {command}'] = _wall_time([sys.executable, cli, group, command, '--imports-only'],
+                                                     repeats)
+    return times
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--startup':
+        print("="*70)
+        print("各子指令的冷啟動時間（取 3 次最短）")
+        print("="*70)
+        times = startup_times()
+        base = times['python（空的直譯器）']
+        for name, seconds in times.items():
+            print(f"  {name:<22} {seconds * 1000:8.1f} ms（扣除直譯器 {(seconds - base) * 1000:8.1f} ms）")
+    elif len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        main(sys.argv[1], sys.argv[2:])
+    else:
+        print(f"用法: python cli.py {{{'|'.join(COMMANDS)}}} <子指令> 或 python cli.py --startup")
+        sys.exit(2)
@@ -0,0 +1,429 @@
+"""
+結構化的結果物件與延後的報表輸出
+
+原本的腳本在計算途中就組出大段 f-string（逐情境的明細、ASCII 框線圖），
+即使是批次或平行執行、沒有人看輸出，也要付出格式化的成本。
+這裡把 Q1 的 EV / EEV / RP / WS / SAA / EVPI / VSS 與 Q_2 的期望值決策、後驗機率、EVSI、
+市場調查決策都表示成 dataclass(slots=True)；計算函式只回傳物件，
+to_console() / to_json() / to_markdown() 在呼叫時才格式化。
+
+本模組頂層只匯入標準函式庫；Q1 的計算函式第一次呼叫時才載入 farmer（gurobipy、numpy）。
+"""
+import json
+import math
+import os
+import sys
+from dataclasses import dataclass, fields
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+# ============================================================================
+# 格式化
+# ============================================================================
+def _money(value):
+    return f"${value:,.2f}"
+
+
+def _acres(values):
+    return ' / '.join(f"{v:.2f}" for v in values)
+
+
+def _money_list(values):
+    return ', '.join(_money(v) for v in values)
+
+
+def _money_dict(values):
+    return ', '.join(f"{k}: {_money(v)}" for k, v in values.items())
+
+
+def _prob_dict(values):
+    return ', '.join(f"{k}: {v:.4f}" for k, v in values.items())
+
+
+def _nested_prob(values):
+    return '; '.join(f"{k} → {_prob_dict(v)}" for k, v in values.items())
+
+
+def _interval(values):
+    return f"[{_money(values[0])}, {_money(values[1])}]"
+
+
+def _percent(value):
+    return f"{value:.2f}%"
+
+
+def _yes_no(value):
+    return "是" if value else "否"
+
+
+def _plain(value):
+    """轉成可 JSON 序列化的內建型別（numpy 純量、tuple、dict 的鍵）"""
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (tuple, list)):
+        return [_plain(v) for v in value]
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+class Report:
+    """結果物件的共同基底：LABELS 為 (欄位, 中文名稱, 格式化函式)，只在輸出時使用"""
+    __slots__ = ()
+    TITLE = ""
+    LABELS = ()
+
+    def to_dict(self):
+        return {'type': type(self).__name__, **{f.name: _plain(getattr(self, f.name)) for f in fields(self)}}
+
+    def rows(self):
+        return [(label, fmt(getattr(self, name))) for name, label, fmt in self.LABELS]
+
+    def to_console(self):
+        rows = self.rows()
+        width = max(len(label) for label, _ in rows)
+        lines = ["="*70, self.TITLE, "="*70]
+        lines += [f"  {label:<{width}}  {value}" for label, value in rows]
+        return '\n'.join(lines)
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), ensure_ascii=False, **kwargs)
+
+    def to_markdown(self):
+        lines = [f"### {self.TITLE}", "", "| 項目 | 數值 |", "|---|---|"]
+        lines += [f"| {label} | {value} |" for label, value in self.rows()]
+        return '\n'.join(lines)
+
+    def render(self, fmt='console'):
+        return {'console': self.to_console, 'json': self.to_json, 'markdown': self.to_markdown}[fmt]()
+
+
+# ============================================================================
+# Q1：農夫問題
+# ============================================================================
+@dataclass(slots=True)
+class EVResult(Report):
+    TITLE = "EV（平均情境）解"
+    LABELS = (('acres', '種植面積（小麥/玉米/甜菜）', _acres),
+              ('objective', '平均情境利潤', _money),
+              ('purchases', '購買量（小麥/玉米）', _acres),
+              ('sales', '銷售量（小麥/玉米/甜菜/超額甜菜）', _acres))
+    acres: tuple
+    objective: float
+    purchases: tuple
+    sales: tuple
+
+
+@dataclass(slots=True)
+class EEVResult(Report):
+    TITLE = "EEV（EV 解的期望利潤）"
+    LABELS = (('acres', '種植面積（小麥/玉米/甜菜）', _acres),
+              ('scenario_profits', '各情境利潤', _money_list),
+              ('probabilities', '情境機率', _acres),
+              ('eev', 'EEV', _money))
+    acres: tuple
+    scenario_profits: tuple
+    probabilities: tuple
+    eev: float
+
+
+@dataclass(slots=True)
+class RPResult(Report):
+    TITLE = "RP（二階段隨機規劃）解"
+    LABELS = (('acres', '種植面積（小麥/玉米/甜菜）', _acres),
+              ('scenario_profits', '各情境利潤', _money_list),
+              ('probabilities', '情境機率', _acres),
+              ('objective', 'RP（期望利潤）', _money))
+    acres: tuple
+    scenario_profits: tuple
+    probabilities: tuple
+    objective: float
+
+
+@dataclass(slots=True)
+class WSResult(Report):
+    TITLE = "WS（Wait-and-See）"
+    LABELS = (('scenario_acres', '各情境最佳面積', lambda v: '; '.join(_acres(a) for a in v)),
+              ('scenario_profits', '各情境最佳利潤', _money_list),
+              ('probabilities', '情境機率', _acres),
+              ('ws', 'WS（期望利潤）', _money))
+    scenario_acres: tuple
+    scenario_profits: tuple
+    probabilities: tuple
+    ws: float
+
+
+@dataclass(slots=True)
+class EVPIResult(Report):
+    TITLE = "EVPI（完全資訊期望值）"
+    LABELS = (('with_information', '完全資訊下的期望值', _money),
+              ('without_information', '無完全資訊的期望值', _money),
+              ('evpi', 'EVPI', _money))
+    with_information: float
+    without_information: float
+    evpi: float
+
+
+@dataclass(slots=True)
+class VSSResult(Report):
+    TITLE = "VSS（隨機解的價值）"
+    LABELS = (('rp', 'RP', _money), ('eev', 'EEV', _money), ('vss', 'VSS = RP - EEV', _money))
+    rp: float
+    eev: float
+    vss: float
+
+
+@dataclass(slots=True)
+class SAAResult(Report):
+    TITLE = "SAA（樣本平均近似）"
+    LABELS = (('sample_sizes', '樣本數（N, M, N̄, T）', lambda v: ', '.join(str(n) for n in v)),
+              ('seed', '亂數種子', str),
+              ('best_acres', '最佳批次面積（小麥/玉米/甜菜）', _acres),
+              ('train_mean', '訓練目標值平均', _money),
+              ('train_ci', '訓練 95% 信賴區間', _interval),
+              ('validation_mean', '驗證期望利潤', _money),
+              ('validation_ci', '驗證 95% 信賴區間', _interval),
+              ('gap', '訓練 - 驗證', _money))
+    sample_sizes: tuple
+    seed: object
+    batch_objectives: tuple
+    best_acres: tuple
+    train_mean: float
+    train_ci: tuple
+    validation_mean: float
+    validation_ci: tuple
+    gap: float
+
+
+def _farmer():
+    """第一次呼叫時才把 Q1 放進 sys.path 並載入 farmer（連帶 gurobipy、numpy）"""
+    q1 = os.path.join(ROOT, 'Q1')
+    if q1 not in sys.path:
+        sys.path.insert(0, q1)
+    import farmer
+    return farmer
+
+
+def _solve_acres(farmer, multipliers, probabilities=None, name="RP"):
+    rp = farmer.build_rp_model(multipliers, probabilities, name=name)
+    rp['model'].optimize()
+    return tuple(rp['x'][i].X for i in range(3)), rp['model'].objVal
+
+
+def _scenario_data(farmer):
+    return ([sc['multiplier'] for sc in farmer.scenarios],
+            tuple(sc['probability'] for sc in farmer.scenarios))
+
+
+def solve_ev():
+    farmer = _farmer()
+    acres, objective = _solve_acres(farmer, [1.0], name="EV")
+    decisions = farmer.recourse_decisions(acres, [1.0])[0]
+    return EVResult(acres, objective, tuple(map(float, decisions[:2])), tuple(map(float, decisions[2:])))
+
+
+def evaluate_eev(acres=None):
+    farmer = _farmer()
+    acres = solve_ev().acres if acres is None else tuple(acres)
+    mults, probs = _scenario_data(farmer)
+    profits = tuple(float(p) for p in farmer.total_profit(acres, mults))
+    return EEVResult(acres, profits, probs, sum(p * v for p, v in zip(probs, profits)))
+
+
+def solve_rp():
+    farmer = _farmer()
+    mults, probs = _scenario_data(farmer)
+    acres, objective = _solve_acres(farmer, mults, probs)
+    profits = tuple(float(p) for p in farmer.total_profit(acres, mults))
+    return RPResult(acres, profits, probs, objective)
+
+
+def wait_and_see():
+    farmer = _farmer()
+    mults, probs = _scenario_data(farmer)
+    solved = [_solve_acres(farmer, [m], name="WS") for m in mults]
+    profits = tuple(obj for _, obj in solved)
+    return WSResult(tuple(a for a, _ in solved), profits, probs, sum(p * v for p, v in zip(probs, profits)))
+
+
+def evpi(ws, rp):
+    """Q1：EVPI = WS - RP"""
+    return EVPIResult(ws.ws, rp.objective, ws.ws - rp.objective)
+
+
+def vss(rp, eev):
+    return VSSResult(rp.objective, eev.eev, rp.objective - eev.eev)
+
+
+def _t_interval(values, confidence=0.95):
+    from scipy.special import stdtrit
+    n = len(values)
+    mean = sum(values) / n
+    se = math.sqrt(sum((v - mean) ** 2 for v in values) / (n - 1) / n)
+    half = stdtrit(n - 1, 1 - (1 - confidence) / 2) * se
+    return mean, (mean - half, mean + half)
+
+
+def solve_saa(N=30, M=15, N_bar=30, T=15, sigma=None, seed=None):
+    """同 g.py 的流程：M 批訓練取最佳解，再以 T 批各 N̄ 個新樣本（封閉解）驗證"""
+    import numpy as np
+    farmer = _farmer()
+    sigma = farmer.SIGMA if sigma is None else sigma
+    rng = np.random.default_rng(seed)
+    solved = [_solve_acres(farmer, rng.normal(farmer.MU, sigma, N), name=f"SAA_batch_{m+1}")
+              for m in range(M)]
+    objectives = tuple(obj for _, obj in solved)
+    best_acres = max(solved, key=lambda s: s[1])[0]
+    validation = [float(farmer.total_profit(best_acres, rng.normal(farmer.MU, sigma, N_bar)).mean())
+                  for _ in range(T)]
+    train_mean, train_ci = _t_interval(objectives)
+    validation_mean, validation_ci = _t_interval(validation)
+    return SAAResult((N, M, N_bar, T), seed, objectives, best_acres, train_mean, train_ci,
+                     validation_mean, validation_ci, train_mean - validation_mean)
+
+
+# ============================================================================
+# Q_2：決策分析（純算術，不需任何第三方套件）
+# ============================================================================
+PAYOFFS = {
+    'A': {'H': 1_000_000, 'L': -400_000},
+    'B': {'H': 600_000, 'L': 300_000},
+    'C': {'H': 100_000, 'L': 400_000}
+}
+PRIOR = {'H': 0.41, 'L': 0.59}
+LIKELIHOOD = {'X1': {'H': 0.8, 'L': 0.3}, 'X0': {'H': 0.2, 'L': 0.7}}  # P(X|θ)
+SURVEY_COST = 50_000
+
+
+@dataclass(slots=True)
+class DecisionResult(Report):
+    TITLE = "期望值準則"
+    LABELS = (('expected_values', '各策略期望值', _money_dict),
+              ('best', '最佳策略', str),
+              ('value', '最佳期望值', _money))
+    expected_values: dict
+    best: str
+    value: float
+
+
+@dataclass(slots=True)
+class PosteriorResult(Report):
+    TITLE = "貝氏定理：後驗機率"
+    LABELS = (('prior', '先驗機率', _prob_dict),
+              ('marginals', '邊際機率 P(X)', _prob_dict),
+              ('posteriors', '後驗機率 P(θ|X)', _nested_prob))
+    prior: dict
+    marginals: dict
+    posteriors: dict
+
+
+@dataclass(slots=True)
+class EVSIResult(Report):
+    TITLE = "EVSI（樣本資訊期望值）"
+    LABELS = (('policy', '各調查結果的最佳策略', lambda v: ', '.join(f"{k} → {s}" for k, s in v.items())),
+              ('conditional_values', '各調查結果的期望值', _money_dict),
+              ('ev_with_information', '依調查結果決策的期望值（未扣成本）', _money),
+              ('ev_without_information', '不調查的期望值', _money),
+              ('evsi', 'EVSI', _money),
+              ('evpi', 'EVPI', _money),
+              ('efficiency', 'EVSI / EVPI', _percent))
+    policy: dict
+    conditional_values: dict
+    ev_with_information: float
+    ev_without_information: float
+    evsi: float
+    evpi: float
+    efficiency: float
+
+
+@dataclass(slots=True)
+class SurveyDecision(Report):
+    TITLE = "是否雇用市場調查"
+    LABELS = (('hire', '雇用', _yes_no),
+              ('survey_cost', '調查成本', _money),
+              ('ev_no_survey', '不雇用的期望值', _money),
+              ('ev_with_survey', '雇用的期望值（已扣成本）', _money),
+              ('net_benefit', '淨效益', _money),
+              ('breakeven_cost', '損益平衡成本', _money),
+              ('policy', '雇用時的決策', lambda v: ', '.join(f"{k} → {s}" for k, s in v.items())))
+    hire: bool
+    survey_cost: float
+    ev_no_survey: float
+    ev_with_survey: float
+    net_benefit: float
+    breakeven_cost: float
+    policy: dict
+
+
+def _expected(payoff, prob):
+    return sum(payoff[state] * p for state, p in prob.items())
+
+
+def expected_value_decision(payoffs=PAYOFFS, prior=PRIOR):
+    values = {s: _expected(payoffs[s], prior) for s in payoffs}
+    best = max(values, key=values.get)
+    return DecisionResult(values, best, values[best])
+
+
+def perfect_information(payoffs=PAYOFFS, prior=PRIOR):
+    """Q_2：EVPI = EVwPI - EVwoPI"""
+    with_info = sum(max(payoffs[s][state] for s in payoffs) * p for state, p in prior.items())
+    without = expected_value_decision(payoffs, prior).value
+    return EVPIResult(with_info, without, with_info - without)
+
+
+def bayes_update(prior=PRIOR, likelihood=LIKELIHOOD):
+    marginals = {x: sum(likelihood[x][state] * p for state, p in prior.items()) for x in likelihood}
+    posteriors = {x: {state: likelihood[x][state] * p / marginals[x] for state, p in prior.items()}
+                  for x in likelihood}
+    return PosteriorResult(dict(prior), marginals, posteriors)
+
+
+def sample_information(payoffs=PAYOFFS, prior=PRIOR, likelihood=LIKELIHOOD):
+    """對每個調查結果以後驗機率選最佳策略；EVSI = 依結果決策的期望值 - 不調查的期望值"""
+    bayes = bayes_update(prior, likelihood)
+    decisions = {x: expected_value_decision(payoffs, post) for x, post in bayes.posteriors.items()}
+    with_info = sum(decisions[x].value * bayes.marginals[x] for x in decisions)
+    without = expected_value_decision(payoffs, prior).value
+    evpi_value = perfect_information(payoffs, prior).evpi
+    evsi_value = with_info - without
+    return EVSIResult({x: d.best for x, d in decisions.items()}, {x: d.value for x, d in decisions.items()},
+                      with_info, without, evsi_value, evpi_value,
+                      evsi_value / evpi_value * 100 if evpi_value > 0 else 0.0)
+
+
+def survey_decision(payoffs=PAYOFFS, prior=PRIOR, likelihood=LIKELIHOOD, survey_cost=SURVEY_COST):
+    info = sample_information(payoffs, prior, likelihood)
+    with_survey = info.ev_with_information - survey_cost
+    net = with_survey - info.ev_without_information
+    return SurveyDecision(net > 0, survey_cost, info.ev_without_information, with_survey, net,
+                          info.evsi, info.policy)
+
+
+if __name__ == "__main__":
+    import time
+
+    rp, ws, eev = solve_rp(), wait_and_see(), evaluate_eev()
+    for result in (solve_ev(), eev, rp, ws, evpi(ws, rp), vss(rp, eev),
+                   bayes_update(), sample_information(), survey_decision()):
+        print(result.to_console() + "\n")
+
+    print(survey_decision().to_markdown())
+    print("\n" + solve_saa(seed=34).to_json())
+
+    print("\n" + "="*70)
+    print("格式化成本：1 萬種調查成本的敏感度分析")
+    print("="*70)
+    costs = range(0, 100_000, 10)
+    start = time.perf_counter()
+    decisions = [survey_decision(survey_cost=c) for c in costs]
+    compute = time.perf_counter() - start
+    start = time.perf_counter()
+    for d in decisions:
+        d.to_console()
+    render = time.perf_counter() - start
+    print(f"  只計算（回傳物件）      {compute:6.2f} 秒")
+    print(f"  另外輸出成主控台文字    {render:6.2f} 秒（批次執行時可完全略過）")
+    print(f"  損益平衡成本 ${decisions[0].breakeven_cost:,.2f}，"
+          f"會雇用的最高成本 ${max(d.survey_cost for d in decisions if d.hire):,}")
@@ -0,0 +1,57 @@
+"""
+測試共用設定：把專案根目錄與 Q1 放進 sys.path（同 cli.py 執行腳本時的做法），
+並提供執行原腳本擷取輸出的 run_script，以及檢查時間與記憶體上限的 budget。
+"""
+import contextlib
+import io
+import os
+import runpy
+import sys
+import time
+import tracemalloc
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+Q1 = os.path.join(ROOT, 'Q1')
+for path in (ROOT, Q1):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# 在負載高或較慢的機器（例如共用 CI）上設定 FARMER_SKIP_TIMING=1，只檢查記憶體不檢查耗時
+SKIP_TIMING = os.environ.get('FARMER_SKIP_TIMING', '') not in ('', '0')
+
+
+@pytest.fixture
+def run_script():
+    """以 __main__ 執行 Q1/ 或 Q_2/ 的腳本，回傳標準輸出的文字"""
+    def run(relative_path):
+        path = os.path.join(ROOT, relative_path)
+        buffer = io.StringIO()
+        with contextlib.redirect_stdout(buffer):
+            runpy.run_path(path, run_name="__main__")
+        return buffer.getvalue()
+    return run
+
+
+@contextlib.contextmanager
+def _budget(seconds, mib):
+    """
+    區塊內的牆鐘時間與 Python / NumPy 配置的記憶體峰值（tracemalloc）不得超過上限。
+    Gurobi 在 C 端配置的記憶體不在 tracemalloc 的統計內。設定 FARMER_SKIP_TIMING 時略過時間上限。
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    assert SKIP_TIMING or elapsed <= seconds, f"耗時 {elapsed:.3f} 秒，超過上限 {seconds} 秒"
+    assert peak <= mib, f"記憶體峰值 {peak:.1f} MiB，超過上限 {mib} MiB"
+
+
+@pytest.fixture
+def budget():
+    return _budget
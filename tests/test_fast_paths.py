@@ -0,0 +1,317 @@
+"""
+快速路徑的正確性與效能上限：向量化封閉解、解析期望、串流情境、SMPS、資料驅動模型、
+多農場分解、交叉評估矩陣、Wasserstein DRO、暖啟動快取與結構化結果，以及 CVaR、上下界、分位數摘要、
+樣本存放區、共享記憶體與續跑記錄。每個案例都和較慢的參考做法比對數值，
+並以 budget 限制牆鐘時間與記憶體峰值（上限約為目前量測值的 3~10 倍，容許機器差異；
+負載高的機器可設定 FARMER_SKIP_TIMING=1 只檢查記憶體）。
+"""
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from conftest import ROOT
+from farmer import (MU, SIGMA, scenarios, build_rp_model, apply_params, total_profit, recourse_decisions,
+                    DECISION_PRICES)
+
+RP_ACRES = (170, 80, 250)
+
+
+def _lp_recourse(acres, multiplier):
+    """參考做法：固定面積後逐樣本求解第二階段 LP"""
+    rp = build_rp_model([multiplier], name="Recourse")
+    for i in range(3):
+        rp['x'][i].LB = rp['x'][i].UB = acres[i]
+    rp['model'].optimize()
+    return rp['model'].objVal
+
+
+def test_vectorized_recourse_matches_lp():
+    samples = np.random.default_rng(34).normal(MU, 0.3, 50)
+    lp = [_lp_recourse(RP_ACRES, m) for m in samples]
+    assert total_profit(RP_ACRES, samples) == pytest.approx(lp, abs=1e-6)
+    decisions = recourse_decisions(RP_ACRES, samples)
+    assert decisions @ DECISION_PRICES - total_profit(RP_ACRES, samples) == pytest.approx(
+        np.full(50, 150 * 170 + 230 * 80 + 260 * 250), abs=1e-6)
+
+
+def test_vectorized_recourse_budget(budget):
+    samples = np.random.default_rng(34).normal(MU, SIGMA, 1_000_000)
+    with budget(seconds=1.0, mib=100):
+        profits = total_profit(RP_ACRES, samples)
+    assert profits.mean() == pytest.approx(108_700, rel=0.01)
+
+
+def test_exact_expectation_matches_monte_carlo(budget):
+    from distributions import make, expected_profit
+    dist = make('normal')
+    with budget(seconds=0.1, mib=4):
+        exact = expected_profit(RP_ACRES, dist)
+    samples = total_profit(RP_ACRES, dist.sample(1_000_000, np.random.default_rng(34)))
+    assert exact == pytest.approx(samples.mean(), abs=4 * samples.std() / 1000)
+
+
+def test_streamed_scenarios_match_materialized(budget):
+    from joint_scenarios import DiscreteSource, ScenarioProduct, validate_stream, chunk_profit, normal_levels
+    product = ScenarioProduct([
+        DiscreteSource('yield', normal_levels(50, MU, SIGMA)),
+        DiscreteSource('SELL_PRICE', [150, 170, 190], columns=[0]),
+        DiscreteSource('SELL_PRICE', [130, 150, 170], columns=[1]),
+        DiscreteSource('BUY_PRICE', [220, 238, 260], columns=[0]),
+    ])
+    streamed = validate_stream(RP_ACRES, product.chunks(chunk_size=1_000))
+    full = product.materialize()
+    chunk = {'yield': np.array([sc['multiplier'] for sc in full]),
+             'SELL_PRICE': np.array([sc['sell_price'] for sc in full]),
+             'BUY_PRICE': np.array([sc['buy_price'] for sc in full])}
+    expected = np.array([sc['probability'] for sc in full]) @ chunk_profit(RP_ACRES, chunk)
+    assert streamed['scenarios'] == len(full) == 1350
+    assert streamed['mean'] == pytest.approx(expected, rel=1e-12)
+
+
+def test_overlapping_prices_are_clipped_to_match_lp():
+    from joint_scenarios import DiscreteSource, ScenarioProduct, validate_stream, solve_joint_rp
+    product = ScenarioProduct([
+        DiscreteSource('SELL_PRICE', [170, 250], columns=[0]),
+        DiscreteSource('BUY_PRICE', [[238, 210], [200, 230]]),
+    ])
+    chunk = next(product.chunks())
+    assert (chunk['SELL_PRICE'][:, :2] <= chunk['BUY_PRICE']).all()
+    result = solve_joint_rp(product.chunks())
+    assert validate_stream(result['acres'], product.chunks())['mean'] == pytest.approx(result['objective'], abs=1e-6)
+
+
+def test_streamed_million_scenarios_budget(budget):
+    from joint_scenarios import DiscreteSource, ScenarioProduct, validate_stream, normal_levels
+    product = ScenarioProduct([
+        DiscreteSource('yield', normal_levels(100, MU, SIGMA)),
+        DiscreteSource('SELL_PRICE', np.linspace(150, 190, 20), columns=[0]),
+        DiscreteSource('SELL_PRICE', np.linspace(130, 170, 20), columns=[1]),
+        DiscreteSource('BUY_PRICE', np.linspace(220, 260, 25), columns=[0]),
+    ])
+    # 展開成清單約需 700 MiB；串流只保留單段
+    with budget(seconds=0.6, mib=48):
+        streamed = validate_stream(RP_ACRES, product.chunks())
+    assert streamed['scenarios'] == 1_000_000
+    assert streamed['probability'] == pytest.approx(1.0)
+    assert streamed['mean'] == pytest.approx(108_680.04, abs=0.01)
+
+
+def test_smps_round_trip(tmp_path, budget):
+    from smps import write_smps, read_smps, extensive_form, solve_extensive_form
+    basename = str(tmp_path / "farmer")
+    with budget(seconds=0.1, mib=4):
+        write_smps(basename, [sc['multiplier'] for sc in scenarios])
+        solved = solve_extensive_form(extensive_form(read_smps(basename)))
+    assert -solved['objective'] == pytest.approx(108_390, abs=1e-6)
+    assert solved['acres'] == pytest.approx(RP_ACRES, abs=1e-6)
+
+
+def test_data_driven_model_matches_farmer(budget):
+    import multicrop
+    instance = multicrop.load_instance(os.path.join(ROOT, 'Q1', 'data', 'farmer3.json'))
+    mults = np.repeat([[sc['multiplier']] for sc in scenarios], len(instance['crops']), axis=1)
+    with budget(seconds=0.1, mib=4):
+        rp = multicrop.rp_solution(instance, mults)
+    assert rp['objective'] == pytest.approx(108_390, abs=1e-6)
+
+
+def test_decomposition_matches_extensive_form(budget):
+    import multifarm
+    farms = multifarm.synthetic_farms(10, seed=34)
+    mults = multifarm.farm_multipliers(10, seed=34)
+    probs = np.full(len(mults), 1 / len(mults))
+    market = multifarm.default_market(10)
+    with budget(seconds=3.0, mib=8):
+        result = multifarm.decompose(farms, mults, probs, market)
+    objective, _ = multifarm.solve_monolithic(farms, mults, probs, market)
+    assert result['lower_bound'] <= objective + 1e-6 <= result['upper_bound'] + 2e-6
+    assert result['upper_bound'] == pytest.approx(objective, rel=1e-4)
+    assert multifarm.primal_value(farms, result['acres'], mults, probs, market) == pytest.approx(
+        result['lower_bound'])
+
+
+def test_cross_evaluation_matches_per_pair(budget):
+    import cross_eval
+    from distributions import DEMO_DISTRIBUTIONS, expected_profit
+    plans = np.random.default_rng(34).dirichlet(np.ones(3), 100) * 500
+    sources = {**DEMO_DISTRIBUTIONS, '三情境': cross_eval.scenario_set(
+        [sc['multiplier'] for sc in scenarios], [sc['probability'] for sc in scenarios])}
+    with budget(seconds=1.5, mib=60):
+        result = cross_eval.cross_evaluate(plans, sources, n=10_000, seed=34, plan_chunk=50)
+    assert result['mean'].shape == (100, len(sources)) and result['quantiles'].shape == (100, len(sources), 3)
+    name = '三情境'
+    d = result['names'].index(name)
+    assert result['mean'][:, d] == pytest.approx(
+        [total_profit(p, sources[name]['values']) @ sources[name]['probabilities'] for p in plans])
+    d = result['names'].index(next(iter(DEMO_DISTRIBUTIONS)))
+    exact = np.array([expected_profit(p, DEMO_DISTRIBUTIONS[result['names'][d]]) for p in plans[:10]])
+    assert np.all(np.abs(result['mean'][:10, d] - exact) < 2 * result['half_width'][:10, d])
+
+
+def test_wasserstein_dro_reduces_to_saa(budget):
+    import dro
+    samples = np.random.default_rng(34).normal(MU, SIGMA, 100)
+    model = dro.build_dro_model(samples)
+    with budget(seconds=0.5, mib=8):
+        sweep = [dro.solve_dro(model, eps) for eps in dro.EPSILONS]
+    assert (model['model'].NumVars, model['model'].NumConstrs) == (112, 809)
+    rp = build_rp_model(samples)
+    rp['model'].optimize()
+    assert sweep[0]['objective'] == pytest.approx(rp['model'].objVal, rel=1e-9)
+    objectives = [r['objective'] for r in sweep]
+    assert all(a >= b - 1e-6 for a, b in zip(objectives, objectives[1:]))
+    assert all(r['objective'] <= r['empirical_profit'] + 1e-6 for r in sweep)
+    custom = dro.solve_dro(dro.build_dro_model(samples, params={'SELL_PRICE': [150, 140, 30, 8]}), 0.0)
+    assert custom['objective'] == pytest.approx(custom['empirical_profit'], rel=1e-9)
+    with pytest.raises(ValueError):
+        dro.cross_validate(samples[:1])
+    assert dro.cross_validate(samples[:2], folds=1, seed=34)['scores'].shape == (len(dro.EPSILONS),)
+
+
+def test_decomposition_gap_at_scale(budget):
+    import multifarm
+    farms = multifarm.synthetic_farms(100, seed=34)
+    mults = multifarm.farm_multipliers(100, seed=34)
+    probs = np.full(len(mults), 1 / len(mults))
+    with budget(seconds=6.0, mib=32):
+        result = multifarm.decompose(farms, mults, probs, multifarm.default_market(100))
+    assert 0 <= result['gap'] <= 1e-5
+    assert result['oracle_calls'] == result['iterations'] - 1
+    assert multifarm.primal_value(farms, result['acres'], mults, probs, multifarm.default_market(100)) == pytest.approx(
+        result['lower_bound'])
+
+
+def test_tuned_parameters_keep_objective(tmp_path, monkeypatch):
+    import solver_cache
+    monkeypatch.setenv('FARMER_SOLVER_CACHE', str(tmp_path / "cache.json"))
+    solver_cache.save_entry(solver_cache.shape_key(3, 2, 3), {
+        'params': {'Method': 2, 'Crossover': 0}, 'default_seconds': 1.0, 'best_seconds': 0.5, 'speedup': 2.0})
+    mults = [sc['multiplier'] for sc in scenarios]
+    assert build_rp_model(mults)['model'].getParamInfo('Method')[2] == -1
+    assert solver_cache.lookup(3, 2, 3, family='multicrop') is None
+    rp = build_rp_model(mults, tuned=True)
+    assert rp['model'].getParamInfo('Method')[2] == 2
+    rp['model'].optimize()
+    assert rp['model'].objVal == pytest.approx(108_390, rel=1e-6)
+    apply_params(rp, {})
+    assert rp['model'].getParamInfo('Crossover')[2] == -1
+
+
+def test_result_objects_are_slotted_and_serializable(budget):
+    import reports
+    with budget(seconds=2.0, mib=4):
+        decisions = [reports.survey_decision(survey_cost=c) for c in range(0, 20_000, 10)]
+    assert not hasattr(decisions[0], '__dict__')
+    assert sum(d.hire for d in decisions) == 760
+    payload = json.loads(decisions[0].to_json())
+    assert payload['type'] == 'SurveyDecision' and payload['policy'] == {'X1': 'A', 'X0': 'C'}
+    assert decisions[0].to_markdown().startswith("### ")
+
+
+def test_cli_startup_is_lazy():
+    code = "import sys, cli; print(sorted(m for m in ('numpy', 'gurobipy', 'scipy') if m in sys.modules))"
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
+
+
+def test_cli_imports_only_dispatch_runs_no_computation():
+    output = subprocess.run([sys.executable, 'cli.py', 'decision', 'survey', '--imports-only'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout == ""
+
+
+def test_risk_measures_match_sorted_reference():
+    from cvar import risk_measures
+    rng = np.random.default_rng(34)
+    profits = rng.normal(100_000, 15_000, 200)
+    # 等機率、α = k/n：VaR 為第 k 小的值，CVaR 為最小 k 個的平均
+    r = risk_measures(profits, np.full(200, 1 / 200), 0.05)
+    assert r['var'] == pytest.approx(np.sort(profits)[9])
+    assert r['cvar'] == pytest.approx(np.sort(profits)[:10].mean())
+    # 不等機率：把每個情境複製成機率的整數倍後，與等機率的結果相同
+    counts = rng.integers(1, 5, 200)
+    weighted = risk_measures(profits, counts / counts.sum(), 0.1)
+    expanded = np.repeat(profits, counts)
+    reference = risk_measures(expanded, np.full(len(expanded), 1 / len(expanded)), 0.1)
+    assert weighted['var'] == pytest.approx(reference['var'])
+    assert weighted['cvar'] == pytest.approx(reference['cvar'])
+
+
+def test_jensen_and_edmundson_madansky_bracket_exact_profit():
+    from bounds import bracket
+    from distributions import make, expected_profit
+    dist = make('beta', a=5, b=3, low=0.5, high=1.3)
+    history = bracket(max_partitions=6, dist=dist)
+    for h in history:
+        # EM 值 ≤ 該解的真實期望利潤 ≤ 最佳值 ≤ Jensen 值
+        assert h['lower'] <= expected_profit(h['lower_acres'], dist) + 1e-6
+        assert expected_profit(h['upper_acres'], dist) <= h['upper'] + 1e-6
+    widths = [h['width'] for h in history]
+    assert all(a >= b - 1e-6 for a, b in zip(widths, widths[1:]))
+
+
+def test_digest_merge_matches_sorted_quantiles():
+    from sketch import TDigest
+    profits = total_profit(RP_ACRES, np.random.default_rng(34).normal(MU, SIGMA, 200_000))
+    merged = TDigest()
+    for chunk in np.array_split(profits, 4):
+        part = TDigest()
+        part.update(chunk)
+        merged.merge(part)
+    single = TDigest()
+    single.update(profits)
+    q = np.array([0.01, 0.05, 0.5, 0.95])
+    exact = np.sort(profits)
+    for digest in (merged, single):
+        rank = np.searchsorted(exact, digest.quantile(q)) / len(exact)
+        assert np.abs(rank - q).max() < 0.002
+    assert merged.count == pytest.approx(len(profits))
+    assert TDigest().cdf([0.0, 1.0]) == pytest.approx([0.0, 0.0])
+
+
+def test_sample_store_memmap_matches_in_memory(tmp_path):
+    from sample_store import SampleStore, parallel_validate
+    store = SampleStore(str(tmp_path))
+    store.write("small_chunks", "normal", (5_000,), seed=34, chunk_size=777)
+    store.write("one_chunk", "normal", (5_000,), seed=34)
+    data = store.open("small_chunks")
+    assert isinstance(data, np.memmap)
+    reference = np.random.Generator(np.random.PCG64(np.random.SeedSequence(34))).normal(MU, SIGMA, 5_000)
+    assert np.array_equal(data, reference)
+    assert np.array_equal(store.open("one_chunk"), reference)
+    batches = list(store.batches("small_chunks", 1_000))
+    assert np.array_equal(np.concatenate(batches), reference)
+    means = parallel_validate(store, "small_chunks", RP_ACRES, 1_000, max_workers=2)
+    assert means == pytest.approx([total_profit(RP_ACRES, b).mean() for b in reference.reshape(5, 1_000)],
+                                  rel=1e-12)
+
+
+def test_shared_memory_matches_pickled_arguments():
+    from shm_pool import shared_validate, pickled_validate
+    yields = np.random.default_rng(34).normal(MU, SIGMA, 10_000)
+    shared = shared_validate(yields, RP_ACRES, 2_500, max_workers=2)
+    pickled = pickled_validate(yields, RP_ACRES, 2_500, max_workers=2)
+    assert shared[0] == pytest.approx(pickled[0], rel=1e-12)
+    assert np.array_equal(shared[1], pickled[1])
+    assert np.array_equal(shared[2], pickled[2])
+    assert shared[1] == pytest.approx(total_profit(RP_ACRES, yields), abs=1e-6)
+
+
+def test_checkpoint_resume_matches_uninterrupted_run(tmp_path):
+    from checkpoint import run_campaign
+    kwargs = dict(M=4, N=20, T=4, N_bar=200, seed=34, verbose=False)
+    full = run_campaign(str(tmp_path / "full.jsonl"), **kwargs)
+    path = str(tmp_path / "resumed.jsonl")
+    assert run_campaign(path, max_new_batches=3, **kwargs) is None
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"type": "replic')  # 模擬寫到一半中斷
+    assert run_campaign(path, resume=True, max_new_batches=3, **kwargs) is None
+    resumed = run_campaign(path, resume=True, **kwargs)
+    assert resumed['best_acres'] == full['best_acres']
+    for key in ('train', 'validation'):
+        assert resumed[key]['mean'] == full[key]['mean']
+        assert resumed[key]['se'] == full[key]['se']
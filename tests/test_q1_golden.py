@@ -0,0 +1,63 @@
+"""Q1 農夫問題的基準數值：EV、EEV、RP、WS、EVPI、VSS 與固定種子的 SAA"""
+import numpy as np
+import pytest
+
+import reports
+from farmer import scenarios, build_rp_model, total_profit
+
+MULTS = [sc['multiplier'] for sc in scenarios]
+PROBS = [sc['probability'] for sc in scenarios]
+
+
+def test_ev_solution():
+    ev = reports.solve_ev()
+    assert ev.objective == pytest.approx(118_600, abs=1e-6)
+    assert ev.acres == pytest.approx((120, 80, 300), abs=1e-6)
+    assert ev.sales == pytest.approx((100, 0, 6000, 0), abs=1e-6)
+
+
+def test_eev():
+    eev = reports.evaluate_eev()
+    assert eev.scenario_profits == pytest.approx((55_120, 118_600, 148_000), abs=1e-6)
+    assert eev.eev == pytest.approx(107_240, abs=1e-6)
+
+
+def test_rp_solution():
+    rp = reports.solve_rp()
+    assert rp.objective == pytest.approx(108_390, abs=1e-6)
+    assert rp.acres == pytest.approx((170, 80, 250), abs=1e-6)
+    assert rp.scenario_profits == pytest.approx((48_820, 109_350, 167_000), abs=1e-6)
+
+
+def test_wait_and_see_evpi_vss():
+    rp, ws, eev = reports.solve_rp(), reports.wait_and_see(), reports.evaluate_eev()
+    assert ws.ws == pytest.approx(115_405.5556, abs=1e-3)
+    assert reports.evpi(ws, rp).evpi == pytest.approx(7_015.5556, abs=1e-3)
+    assert reports.vss(rp, eev).vss == pytest.approx(1_150, abs=1e-6)
+
+
+def test_closed_form_matches_lp_objective():
+    rp = build_rp_model(MULTS, PROBS)
+    rp['model'].optimize()
+    acres = [rp['x'][i].X for i in range(3)]
+    assert np.dot(PROBS, total_profit(acres, MULTS)) == pytest.approx(rp['model'].objVal, rel=1e-9)
+
+
+def test_saa_fixed_seed():
+    saa = reports.solve_saa(seed=34)
+    assert saa.train_mean == pytest.approx(110_809.4518, rel=1e-6)
+    assert saa.validation_mean == pytest.approx(112_150.6376, rel=1e-6)
+    assert saa.best_acres == pytest.approx((133.0635, 80.3678, 286.5687), abs=1e-3)
+
+
+@pytest.mark.parametrize("script, expected", [
+    ('Q1/a.py', ["最大利潤: $118,600.00"]),
+    ('Q1/b.py', ["期望總利潤: $107,240.00"]),
+    ('Q1/d.py', ["期望總利潤: $108,390.00"]),
+    ('Q1/e.py', ["EVPI = EEV - RP = $115,405.56 - $108,390.00 = $7,015.56",
+                 "VSS = RP - EEV(EV解) = $108,390.00 - $107,240.00 = $1,150.00"]),
+])
+def test_script_output(run_script, script, expected):
+    output = run_script(script)
+    for line in expected:
+        assert line in output
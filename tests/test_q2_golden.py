@@ -0,0 +1,47 @@
+"""Q_2 決策分析的基準數值：期望值決策、EVPI、後驗機率、EVSI 與市場調查決策"""
+import pytest
+
+import reports
+
+
+def test_expected_value_decision():
+    decision = reports.expected_value_decision()
+    assert decision.expected_values == pytest.approx({'A': 174_000, 'B': 423_000, 'C': 277_000})
+    assert decision.best == 'B'
+
+
+def test_perfect_information():
+    evpi = reports.perfect_information()
+    assert evpi.with_information == pytest.approx(646_000)
+    assert evpi.evpi == pytest.approx(223_000)
+
+
+def test_posteriors():
+    bayes = reports.bayes_update()
+    assert bayes.marginals == pytest.approx({'X1': 0.505, 'X0': 0.495})
+    assert bayes.posteriors['X1']['H'] == pytest.approx(0.6495, abs=5e-5)
+    assert bayes.posteriors['X0']['H'] == pytest.approx(0.1657, abs=5e-5)
+
+
+def test_evsi_and_survey_decision():
+    evsi = reports.sample_information()
+    assert evsi.policy == {'X1': 'A', 'X0': 'C'}
+    assert evsi.evsi == pytest.approx(7_600)
+    survey = reports.survey_decision()
+    assert not survey.hire
+    assert survey.net_benefit == pytest.approx(-42_400)
+    # k.py 使用四捨五入到小數第四位的後驗機率，差異在 $10 左右
+    assert survey.net_benefit == pytest.approx(-42_409.95, abs=20)
+
+
+@pytest.mark.parametrize("script, expected", [
+    ('Q_2/d.py', ["最佳策略: Strategy B"]),
+    ('Q_2/g.py', ["= 0.6495"]),
+    ('Q_2/i.py', ["EVPI = $223,000.00"]),
+    ('Q_2/j.py', ["EVE = $380,600.00", "= $-42,400.00"]),
+    ('Q_2/k.py', ["不建議雇用市場調查公司", "損益平衡點: $7,590.05", "淨效益: $-42,409.95"]),
+])
+def test_script_output(run_script, script, expected):
+    output = run_script(script)
+    for line in expected:
+        assert line in output